@@ -12,7 +12,7 @@
 --DDL_Hub:
 CREATE TABLE <name>_h (
 <sur_key.name> <sur_key.format>,
-<nat_keys.name> <nat_keys.format> NOT NULL,
+<nat_key.name> <nat_key.format> NOT NULL,
 <extras.name> <extras.format>,
 load_dts DATE NOT NULL,
 last_seen_date DATE,
@@ -20,7 +20,7 @@ process_id NUMBER(9),
 rec_src VARCHAR2(200),
 UNIQUE (<unique_key>),
 CONSTRAINT <name>_pk PRIMARY_KEY (<primary_key.name>)
-);
+)<physical_clause>;
 
 --DDL_Link:
 CREATE TABLE <name>_l (
@@ -34,7 +34,7 @@ rec_src VARCHAR2(200),
 UNIQUE (<unique_key>),
 CONSTRAINT <name>_<hubs.name>_fk FOREIGN KEY (<for_keys.name>) REFERENCE <hubs.name>_h,
 CONSTRAINT <name>_pk PRIMARY_KEY (<sur_key.name>)
-);
+)<physical_clause>;
 
 -- support multi-version Sat using oth_key attribute 
 --DDL_Sat:
@@ -44,13 +44,14 @@ CREATE TABLE <name>_s (
 <lfc.name> <lfc.format>,
 <lfc.exp> <lfc.format> NOT NULL DEFAULT to_date('40000101','YYYYMMDD'),
 <atts.name> <atts.format>,
+<hashdiff.name> <hashdiff.format>,
 load_dts NOT NULL,
 process_id NUMBER(9),
 update_process_id NUMBER(9),
 rec_src VARCHAR2(200),
 CONSTRAINT <name>_pk PRIMARY_KEY (<primary_key>),
 CONSTRAINT <name>_<hub.name>_fk FOREIGN KEY (<for_key.name>) REFERENCE <hub.name>_h 
-);
+)<physical_clause>;
 
 --DDL_Satlink:
 CREATE TABLE <name>_sl (
@@ -64,7 +65,7 @@ update_process_id NUMBER(9),
 rec_src VARCHAR2(200),
 CONSTRAINT <name>_pk PRIMARY_KEY (<primary_key>),
 CONSTRAINT <name>_<link.name>_fk FOREIGN KEY (<for_key.name>) REFERENCE <link.name>_l 
-);
+)<physical_clause>;
     
 
 
@@ -76,66 +77,130 @@ CONSTRAINT <name>_<link.name>_fk FOREIGN KEY (<for_key.name>) REFERENCE <link.na
 
 --DML_Hub(1):
 merge into <name>_h t using 
-    select <nat_keys.src>, <lfc.src>, <rec_src>
-    from <src> s on (<keys_join>)
-when matched then update set t.last_seen_date = s.<lfc.src>
-when not matched then insert(<sur_key.name>, <nat_keys.name>, <lfc.name>, last_seen_date, process_id, rec_src)
-values (<sur_key.seq>, <nat_keys.src>, <lfc.src>, <lfc.src>, -111111, <rec_src>)
+    (select distinct <nat_key.src>
+     from <src> s
+    ) s on (<keys_join>)
+when matched then update set t.last_seen_date = sysdate
+when not matched then insert(<sur_key.name>, <nat_key.name>, load_dts, last_seen_date, process_id, rec_src)
+values (<sur_key.seq>.nextval, s.<nat_key.src>, sysdate, sysdate, -111111, '<src>')
 ;
 
 --DML_Hub-withdupes(1):
 merge into <name>_h t using 
-    (select <nat_keys.src>, min(<lfc.src>) as <lfc.src>, min(<rec_src>) as <rec_src>
-     from {src}
-     group by <nat_keys.src>
+    (select <nat_key.src>
+     from <src>
+     group by <nat_key.src>
+    ) s on (<keys_join>)
+when matched then update set t.last_seen_date = sysdate
+when not matched then insert(<sur_key.name>, <nat_key.name>, load_dts, last_seen_date, process_id, rec_src)
+values (<sur_key.seq>.nextval, s.<nat_key.src>, sysdate, sysdate, -111111, '<src>')
+;
+
+
+-- hash key version: key computed from staging nat_key (no sequence), see key_type: hash
+--DML_Hub-hashkey(1):
+merge into <name>_h t using 
+    (select distinct <keys_select>
+     from <src> s
     ) s on (<keys_join>)
-when matched then update set t.last_seen_date = s.<lfc.src>
-when not matched then insert(<sur_key.name>, <nat_keys.name>, <lfc.name>, last_seen_date, process_id, rec_src)
-values (<sur_key.seq>, <nat_keys.src>, <lfc.src>, <lfc.src>, -111111, <rec_src>)
+when matched then update set t.last_seen_date = sysdate
+when not matched then insert(<sur_key.name>, <nat_key.name>, load_dts, last_seen_date, process_id, rec_src)
+values (s.<sur_key.name>, s.<nat_key.src>, sysdate, sysdate, -111111, '<src>')
 ;
 
 
--- same version whether nat_keys correspond to hubs's sur_key or nat_key
+-- same version whether hubs' primary key is their sur_key or nat_key
 --DML_Link(1):
 merge into <name>_l t using 
-	select <hubs.primary_key.name>, <lfc.src>, <rec_src> 
-	from
-    (select 
-			<hubs.primary_key.name>,
-			<lfc.src>
-     from <src> 
-	 join <hubs.name> on (<nat_keys_join>) 
-	) s on (<keys_join>)
-when matched then update set t.last_seen_date = s.<lfc.src>
-when not matched then insert(<sur_key.name>, <for_keys.name>, <lfc.name>, last_seen_date, process_id, rec_src)
-values (<sur_key.seq>, <hubs.primary_key.name>, <lfc.src>, <lfc.src>, -111111, <rec_src>)
+    (select distinct <hubs_keys>
+     from <src> s <hubs_join>
+    ) s on (<keys_join>)
+when matched then update set t.last_seen_date = sysdate
+when not matched then insert(<sur_key.name>, <for_keys.name>, load_dts, last_seen_date, process_id, rec_src)
+values (<sur_key.seq>.nextval, s.<for_keys.name>, sysdate, sysdate, -111111, '<src>')
 ;
 
 
 
--- what about the case, where only one hub has surrogate
+-- hash key version: all keys computed from staging, so no join to hubs (see key_type: hash)
+--DML_Link-hashkey(1):
+merge into <name>_l t using 
+    (select distinct <keys_select>
+     from <src> s
+    ) s on (<keys_join>)
+when matched then update set t.last_seen_date = sysdate
+when not matched then insert(<sur_key.name>, <for_keys.name>, load_dts, last_seen_date, process_id, rec_src)
+values (s.<sur_key.name>, s.<for_keys.name>, sysdate, sysdate, -111111, '<src>')
+;
+
+
 
---DML_Sat(1)
-insert into <name>_s (<primary_key.name>, <lfc.exp>, <atts.name>, <rec_src>, process_id)
-    select <nat_keys.src>, <lfc.src>, <lfc.exp>,
-           <atts.src>, 'N', <rec_src>, -111111
+-- hashdiff version (Sat with hashdiff): current version is expired when its hashdiff differs from staging, 
+-- then new version is inserted for keys without current version
+--DML_Sat-hashdiff(1):
+merge into <name>_s t using 
+    (select <key_exp> as <for_key.name>, <hashdiff.exp> as <hashdiff.name>, s.<lfc.src>
+     from <src> s
+     <hub_join>
+    ) s on (t.<for_key.name> = s.<for_key.name> and t.<lfc.exp> = to_date('40000101','YYYYMMDD'))
+when matched then update set t.<lfc.exp> = s.<lfc.src>, t.update_process_id = -111111
+    where t.<hashdiff.name> <> s.<hashdiff.name>
+;
+
+--DML_Sat-hashdiff(2):
+insert into <name>_s (<for_key.name>, <lfc.name>, <atts.name>, <hashdiff.name>, load_dts, process_id, rec_src)
+    select <key_exp>, s.<lfc.src>, s.<atts.src>, <hashdiff.exp>, sysdate, -111111, '<src>'
     from <src> s
-    left join <name>_s t on (<nat_keys_join> and t.<lfc.exp> = to_date('40000101','YYYYMMDD'))
-    where 
-        <key_null>
-        or <atts_comp>
+    <hub_join>
+    left join <name>_s t on (<keys_join> and t.<lfc.exp> = to_date('40000101','YYYYMMDD'))
+    where <key_null>
+;
 
 
 
---DML_Sat-withdupes(1)
-insert into <name>_s (<primary_key.name>, <lfc.exp>, <atts.name>, <rec_src>, process_id)
-    select s.* from  
-        (select {keys_source}, min({effective_date_source}), {expiration_date},
-                {atts_source}, 'N', min(xml_filename), -111111
-        from <src>
-        group by {keys_source}) s
-        left join {table_target} t on ({keys_join} and t.expiration_date = {expiration_date} )
-        where 
-            {key_null} 
-            or t.deleted = 'Y' {atts_comp}
+-- current version is expired when any att changed (see atts_comp), then new version is inserted for keys
+-- without current version
+--DML_Sat(1):
+merge into <name>_s t using 
+    (select <key_exp> as <for_key.name>, s.<lfc.src>, s.<atts.src>
+     from <src> s
+     <hub_join>
+    ) s on (t.<for_key.name> = s.<for_key.name> and t.<lfc.exp> = to_date('40000101','YYYYMMDD'))
+when matched then update set t.<lfc.exp> = s.<lfc.src>, t.update_process_id = -111111
+    where <atts_comp>
+;
 
+--DML_Sat(2):
+insert into <name>_s (<for_key.name>, <lfc.name>, <atts.name>, load_dts, process_id, rec_src)
+    select distinct <key_exp>, s.<lfc.src>, s.<atts.src>, sysdate, -111111, '<src>'
+    from <src> s
+    <hub_join>
+    left join <name>_s t on (<keys_join> and t.<lfc.exp> = to_date('40000101','YYYYMMDD'))
+    where <key_null>
+;
+
+
+-- staging with several rows per key: only the first one (by lfc.src) is loaded
+--DML_Sat-withdupes(1):
+merge into <name>_s t using 
+    (select <for_key.name>, <lfc.src>, <atts.src>
+     from (select <key_exp> as <for_key.name>, s.<lfc.src>, s.<atts.src>,
+                  row_number() over (partition by <key_exp> order by s.<lfc.src>) as dup_rn
+           from <src> s
+           <hub_join>)
+     where dup_rn = 1
+    ) s on (t.<for_key.name> = s.<for_key.name> and t.<lfc.exp> = to_date('40000101','YYYYMMDD'))
+when matched then update set t.<lfc.exp> = s.<lfc.src>, t.update_process_id = -111111
+    where <atts_comp>
+;
+
+--DML_Sat-withdupes(2):
+insert into <name>_s (<for_key.name>, <lfc.name>, <atts.name>, load_dts, process_id, rec_src)
+    select s.<for_key.name>, s.<lfc.src>, s.<atts.src>, sysdate, -111111, '<src>'
+    from (select <key_exp> as <for_key.name>, s.<lfc.src>, s.<atts.src>,
+                 row_number() over (partition by <key_exp> order by s.<lfc.src>) as dup_rn
+          from <src> s
+          <hub_join>) s
+    left join <name>_s t on (t.<for_key.name> = s.<for_key.name> and t.<lfc.exp> = to_date('40000101','YYYYMMDD'))
+    where s.dup_rn = 1 and <key_null>
+;
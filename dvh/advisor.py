@@ -0,0 +1,300 @@
+# coding: utf-8
+import argparse
+import re
+import sys
+import zlib
+
+
+####################################################################################################################
+# Index advisor: the rendered DML of each table is read for the columns it looks rows up by, per table alias
+# and clause (on, where..): equality joins such as keys_join, nat_keys_join or hub_join, then the equality
+# filters on a literal joined with them such as the Sat current version t.<lfc.exp> = '4000-01-01' (a filter
+# alone is not selective enough to look rows up by).  An index is recommended for
+# each such lookup not served by the leading columns of an existing primary key, unique constraint or index
+# of the DDL, and for each foreign key (Link for_keys, Sat for_key) not served either.  Lookups into src
+# tables are reported as staging indexes, src tables not being created from the model.
+# The advice can be checked on a local SQLite deployment (sqlite template pack): each DML statement is
+# explained before and after creating the advised indexes, listing the full scans removed.
+####################################################################################################################
+
+
+SQL_KEYWORDS = {'where', 'join', 'left', 'right', 'inner', 'outer', 'full', 'cross', 'on', 'using', 'set', 'group',
+                'order', 'union', 'select', 'when', 'values', 'as', 'natural', 'limit', 'having'}
+
+rx_alias = re.compile(r'\b(?:from|join|update|into|using)\s+([\w.$#]+)\s+(?:as\s+)?(\w+)', re.I)
+rx_literal = r"(?:'[^']*'|(?:to_date|to_timestamp)\s*\(\s*'[^']*'[^)]*\)|(?:date|timestamp)\s*'[^']*'|-?\d+(?:\.\d+)?)"
+rx_join = re.compile(r'(?<![\w.])(\w+)\.(\w+)\s*=\s*(\w+)\.(\w+)(?![\w.(])')
+rx_filter = re.compile(r"(?<![\w.])(\w+)\.(\w+)\s*=\s*{}".format(rx_literal), re.I)
+rx_filter_rev = re.compile(r"{}\s*=\s*(\w+)\.(\w+)(?![\w.(])".format(rx_literal), re.I)
+rx_set = re.compile(r'\bset\b', re.I)
+rx_set_end = re.compile(r'\b(?:where|when|from|returning)\b', re.I)
+rx_assignment = re.compile(r'\s*(?:\w+\.)?\w+\s*=(?!=)')
+
+
+def strip_assignments(stmt):
+    """Remove the targets of set clause assignments (col = / t.col =) so they are not read as predicates"""
+    out, pos = [], 0
+    for match in rx_set.finditer(stmt):
+        if match.start() < pos:
+            continue
+        out.append(stmt[pos:match.end()])
+        i, depth, start_item = match.end(), 0, True
+        while i < len(stmt):
+            if depth == 0 and start_item:
+                target = rx_assignment.match(stmt, i)
+                if target:
+                    out.append(" ")
+                    i = target.end()
+                start_item = False
+                continue
+            c = stmt[i]
+            if c == '(':
+                depth += 1
+            elif c == ')':
+                depth -= 1
+            elif depth == 0 and (c == ";" or rx_set_end.match(stmt, i)):
+                break
+            elif depth == 0 and c == ',':
+                start_item = True
+            out.append(c)
+            i += 1
+        pos = i
+    out.append(stmt[pos:])
+    return "".join(out)
+
+
+def table_aliases(stmt):
+    """{alias: set of tables} bound by from/join/update/into/using clauses of stmt (a table is its own alias)"""
+    aliases = {}
+    for table, alias in rx_alias.findall(stmt):
+        if table.lower() in SQL_KEYWORDS or table.startswith('('):
+            continue
+        aliases.setdefault(table.split(".")[-1], set()).add(table)
+        if alias.lower() not in SQL_KEYWORDS:
+            aliases.setdefault(alias, set()).add(table)
+    return aliases
+
+
+rx_clause = re.compile(r'\b(?:select|from|join|on|where|when|set|using|exists|group|order|having|union|values)\b', re.I)
+
+
+def lookup_columns(stmt, columns_of):
+    """Return [(alias, table, [columns])] looked up by equality in stmt, per clause (on, where..): join columns
+    first then filtered ones.  columns_of is {table: set of columns}, an alias bound to several tables giving
+    each the columns it has"""
+    stmt = strip_assignments(stmt)
+    aliases = table_aliases(stmt)
+    lookups = []
+    for clause in rx_clause.split(stmt):
+        refs = []
+        for match in rx_join.finditer(clause):
+            refs += [(match.start(), match.group(1), match.group(2)), (match.start(), match.group(3), match.group(4))]
+        filters = [(m.start(), m.group(1), m.group(2)) for rx in (rx_filter, rx_filter_rev) for m in rx.finditer(clause)]
+        by_alias = {}
+        for _, alias, col in sorted(refs) + sorted(filters):
+            col = col.lower()
+            for table in sorted(aliases.get(alias, ())):
+                if col in columns_of.get(table, ()):
+                    cols = by_alias.setdefault((alias, table), [])
+                    if col not in cols:
+                        cols.append(col)
+        # filters alone (ex. current version end date) are not selective enough to be looked up by
+        joined = {(alias, table) for _, alias, col in refs for table in aliases.get(alias, ())
+                  if col.lower() in columns_of.get(table, ())}
+        lookups += [(alias, table, cols) for (alias, table), cols in by_alias.items() if (alias, table) in joined]
+    return lookups
+
+
+def is_served(columns, existing):
+    """True when the leading columns of one of existing (column tuples) are columns"""
+    return any(set(e[:len(columns)]) == set(columns) for e in existing)
+
+
+def index_name(table, columns):
+    base = table.split(".")[-1]
+    name = "{0}_{1}_idx".format(base, "_".join(columns))
+    if len(name) > 30:
+        name = "{0}_{1:04x}_idx".format(name[:21], zlib.crc32(name.encode()) & 0xffff)
+    return name
+
+
+class IndexAdvice(object):
+    """Index recommended on physical table for columns, with the reasons (DML lookups, foreign key)"""
+    def __init__(self, table, columns, model_table=None, staging=False):
+        self.table = table
+        self.columns = list(columns)
+        self.model_table = model_table
+        self.staging = staging
+        self.name = index_name(table, self.columns)
+        self.reasons = []
+
+    def stmt(self, dialect="oracle"):
+        """CREATE INDEX statement (SQLite: index of an attached schema is named with the schema)"""
+        name, table = self.name, self.table
+        if dialect == "sqlite" and "." in table:
+            schema, table = table.split(".", 1)
+            name = schema + "." + name
+        return "CREATE INDEX {0} ON {1} ({2})".format(name, table, ", ".join(self.columns))
+
+    def __str__(self):
+        return "{0} ({1})".format(self.table, ", ".join(self.columns))
+
+
+class IndexAdvisor(object):
+    """Advise indexes supporting the DML of dv_model rendered with template_dic"""
+    def __init__(self, dv_model, template_dic):
+        self.dv_model = dv_model
+        self.template_dic = template_dic
+
+    def advise(self, staging=True):
+        """List of IndexAdvice, model tables (in create order) then src tables"""
+        from dvh.diff import model_schema
+        from dvh.loadbench import staging_columns
+        schema = model_schema(self.dv_model, self.template_dic)
+        self.dv_model.setup(self.template_dic, "DML")
+        tables = {t.physical_name().lower(): t for t in self.dv_model.tables_in_create_order}
+        columns_of = {name: set(s.columns) for name, s in schema.items()}
+        existing = {name: [c.columns for c in s.constraints if c.kind in ('P', 'U')] +
+                          [i.columns for i in s.indexes.values()] for name, s in schema.items()}
+        if staging:
+            for src, cols in staging_columns(self.dv_model).items():
+                columns_of.setdefault(src, set()).update(c.lower() for c in cols)
+
+        advices = {}
+
+        def advise(table, columns, table_obj, reason):
+            if is_served(columns, existing.get(table, [])):
+                return
+            advice = advices.get((table, frozenset(columns)))
+            if advice is None:
+                advice = advices[(table, frozenset(columns))] = IndexAdvice(
+                    table, columns, table_obj.name if table in tables else None, table not in tables)
+            if reason not in advice.reasons:
+                advice.reasons.append(reason)
+
+        for table_obj in self.dv_model.tables_in_create_order:
+            name = table_obj.physical_name().lower()
+            for cons in schema[name].constraints:
+                if cons.kind == 'F':
+                    advise(name, cons.columns, table_obj, "foreign key to {}".format(cons.ref_table))
+            for no_step, stmt in enumerate(table_obj.DMLs):
+                for alias, table, columns in lookup_columns(stmt, columns_of):
+                    advise(table, columns, table_obj, "{0} DML {1}: lookup of {2} by {3}".format(
+                        table_obj.name, no_step + 1, alias, ", ".join(columns)))
+
+        # an index also serves the lookups by its leading columns
+        result = list(advices.values())
+        result = [a for a in result if not any(b is not a and b.table == a.table and len(b.columns) > len(a.columns)
+                                               and set(b.columns[:len(a.columns)]) == set(a.columns) for b in result)]
+        for a in advices.values():
+            if a not in result:
+                served_by = next(b for b in result if b.table == a.table and set(b.columns[:len(a.columns)]) == set(a.columns))
+                served_by.reasons += [r for r in a.reasons if r not in served_by.reasons]
+        order = {name: i for i, name in enumerate(tables)}
+        return sorted(result, key=lambda a: (a.staging, order.get(a.table, 0), a.table))
+
+
+def apply_advice(dv_model, advices):
+    """Add advised indexes of model tables to their 'indexes' (rendered with their DDL)"""
+    tables = {t.physical_name().lower(): t for t in dv_model.tables_in_create_order}
+    for advice in advices:
+        if not advice.staging:
+            tables[advice.table].add_index(advice.name, advice.columns)
+
+
+def full_scans(plan):
+    """Tables fully scanned in an SQLite query plan (list of detail lines), co-routines and subqueries excluded"""
+    coroutines = {line.split()[-1] for line in plan if line.startswith(("CO-ROUTINE", "MATERIALIZE"))}
+    scans = []
+    for line in plan:
+        match = re.match(r'SCAN (\w+)', line)
+        if match and match.group(1) not in coroutines and "INDEX" not in line:
+            scans.append(match.group(1))
+    return scans
+
+
+class PlanCheck(object):
+    """SQLite query plans of a DML statement without and with the advised indexes"""
+    def __init__(self, table, step, before, after):
+        self.table = table
+        self.step = step
+        self.before = before
+        self.after = after
+
+    @property
+    def removed_scans(self):
+        after = list(full_scans(self.after))
+        removed = []
+        for scan in full_scans(self.before):
+            if scan in after:
+                after.remove(scan)
+            else:
+                removed.append(scan)
+        return removed
+
+    def __str__(self):
+        return "{0} DML {1}: full scans {2} -> {3}".format(self.table, self.step, ", ".join(full_scans(self.before)) or "none",
+                                                        ", ".join(full_scans(self.after)) or "none")
+
+
+def check_plans(dv_model, template_dic, advices):
+    """Deploy dv_model into an in-memory SQLite database (template_dic being the sqlite pack) and explain its
+    DML statements without and with the advised indexes, return list of PlanCheck"""
+    import sqlite3
+    from dvh.loadbench import deploy
+    con = sqlite3.connect(":memory:")
+    deploy(con, dv_model, template_dic)
+
+    def plans():
+        return [[row[3] for row in con.execute("EXPLAIN QUERY PLAN " + stmt)] for t in dv_model.tables_in_create_order
+                for stmt in t.DMLs]
+
+    before = plans()
+    for advice in advices:
+        con.execute(advice.stmt("sqlite"))
+    after = plans()
+    steps = [(t.name, i + 1) for t in dv_model.tables_in_create_order for i in range(len(t.DMLs))]
+    con.close()
+    return [PlanCheck(table, step, b, a) for (table, step), b, a in zip(steps, before, after)]
+
+
+def advice_script(advices, dialect="oracle"):
+    lines = []
+    for staging in (False, True):
+        selected = [a for a in advices if a.staging == staging]
+        if selected and staging:
+            lines.append("-- staging (src) tables")
+        for advice in selected:
+            lines += ["-- " + r for r in advice.reasons]
+            lines.append(advice.stmt(dialect) + ";")
+    return "\n".join(lines) + "\n"
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser(description="Recommend indexes supporting the joins and filters of the generated DML")
+    parser.add_argument("-y", "--yaml", required=True, help="YAML file defining model (or directory of model shards)")
+    parser.add_argument("--dialect", default="oracle", choices=["oracle", "postgresql", "sqlite"], help="Target database")
+    parser.add_argument("--templates", action="append", default=[], metavar="DIR", help="Directory of template files overriding the dialect pack")
+    parser.add_argument("--no-staging", action="store_true", help="Advise indexes of model tables only")
+    parser.add_argument("--explain", action="store_true", help="Check the advice with query plans of a local SQLite deployment (sqlite pack)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from dvh.library import TemplateLibrary
+    from dvh.model import load_dv_model
+    args = get_args(argv)
+    dv_model = load_dv_model(args.yaml)
+    templates = TemplateLibrary(args.dialect, override_dirs=args.templates)
+    templates.check_model(dv_model)
+    advices = IndexAdvisor(dv_model, templates).advise(staging=not args.no_staging)
+    sys.stdout.write(advice_script(advices, args.dialect))
+    if args.explain:
+        sqlite_templates = templates if args.dialect == "sqlite" else TemplateLibrary("sqlite")
+        sqlite_advices = IndexAdvisor(dv_model, sqlite_templates).advise(staging=not args.no_staging)
+        for check in check_plans(dv_model, sqlite_templates, sqlite_advices):
+            print("-- " + str(check))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# coding: utf-8
+from dvh.advisor import *
+from dvh.library import TemplateLibrary
+from dvh.loadbench_test import sqlite_model
+
+
+def test_lookup_columns():
+    stmt = """merge into s1_s t using
+    (select h.h1_key as h1_key, s.upd_dt from stg s join h1_h h on (s.h1_src = h.h1_id)
+    ) s on (t.h1_key = s.h1_key and t.valid_to = to_date('40000101','YYYYMMDD'))
+when matched then update set t.valid_to = s.upd_dt, t.update_process_id = -111111
+    where t.hd <> s.hd"""
+    columns_of = {'s1_s': {'h1_key', 'valid_to', 'hd'}, 'h1_h': {'h1_key', 'h1_id'}, 'stg': {'h1_src', 'upd_dt'}}
+    assert lookup_columns(stmt, columns_of) == [('h', 'h1_h', ['h1_id']), ('s', 'stg', ['h1_src']),
+                                                ('t', 's1_s', ['h1_key', 'valid_to'])]
+    assert strip_assignments("update t set a = (select max(s.b) from s where t.k = s.k), t.c = 1 where t.v = 2") == \
+        "update t set  (select max(s.b) from s where t.k = s.k),  1 where t.v = 2"
+    # filter alone is not a lookup
+    assert lookup_columns("update s1_s as t set x = 1 where t.valid_to = '4000-01-01'", columns_of) == []
+
+
+def test_advise():
+    m, lib = sqlite_model(), TemplateLibrary("sqlite")
+    advices = IndexAdvisor(m, lib).advise()
+    assert [(str(a), a.staging) for a in advices] == [
+        ("l12_l (h2_key)", False), ("s1_s (h1_key, valid_to)", False), ("stg (h1_src)", True), ("stg (h2_src)", True)]
+    assert advices[0].reasons == ["foreign key to h2_h"]
+    assert advices[1].stmt() == "CREATE INDEX s1_s_h1_key_valid_to_idx ON s1_s (h1_key, valid_to)"
+    assert "-- staging (src) tables\n" in advice_script(advices)
+    assert [str(a) for a in IndexAdvisor(m, lib).advise(staging=False)] == ["l12_l (h2_key)", "s1_s (h1_key, valid_to)"]
+
+    checks = check_plans(m, lib, advices)
+    assert [(c.table, c.step, c.removed_scans) for c in checks if c.removed_scans] == [
+        ('h1', 1, ['s']), ('h1', 2, ['stg']), ('h2', 1, ['s']), ('h2', 2, ['stg']), ('l12', 1, ['s']),
+        ('s1', 1, ['s']), ('s1', 2, ['s'])]
+
+    apply_advice(m, advices)
+    m.setup(lib, "DDL")
+    assert m.tables['s1'].index_stmts() == ["CREATE INDEX s1_s_h1_key_valid_to_idx ON s1_s (h1_key, valid_to)"]
+    assert IndexAdvisor(m, lib).advise(staging=False) == []
+
+
+def test_index_name():
+    assert index_name("stage.stg", ["a"]) == "stg_a_idx"
+    assert len(index_name("a_long_table_name", ["first_column", "second_column"])) <= 30
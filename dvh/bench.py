@@ -0,0 +1,198 @@
+# coding: utf-8
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from dvh.model import get_template_SQL, new_yaml_loader
+from dvh.writer import SQLWriter
+
+
+####################################################################################################################
+# Benchmark of the generator pipeline on a synthetic model: nb_hubs Hubs, Links of link_arity Hubs and Sats
+# of nb_atts attributes, a share of tables using custom templates.  Each phase is timed separately
+# (yaml load, init_model validation, DDL setup, DML setup and output) and results saved to json, to be
+# compared with a stored baseline (ex. before upgrading python or dependencies).
+####################################################################################################################
+
+
+PHASES = ('yaml_load', 'init_model', 'setup_ddl', 'setup_dml', 'output')
+
+CUSTOM = "bench"
+
+
+def _is_custom(i, custom_share):
+    # spread custom tables evenly: table i is custom when it crosses the next multiple of 1/custom_share
+    return int((i + 1) * custom_share) > int(i * custom_share)
+
+
+def synthetic_model(nb_hubs=100, link_arity=2, nb_links=None, sats_per_hub=1, nb_atts=5, custom_share=0.0):
+    """Return yaml text of a synthetic DVModel, Links refer to link_arity consecutive Hubs (nb_links default
+    to nb_hubs // 2), and custom_share of tables use custom templates (see bench_templates)"""
+    nb_links = nb_hubs // 2 if nb_links is None else nb_links
+    lines = ["!DVModel", "tables:"]
+    i = 0
+
+    def custom_lines():
+        nonlocal i
+        custom = _is_custom(i, custom_share)
+        i += 1
+        return ["        DDL_custom: " + CUSTOM, "        DML_custom: " + CUSTOM] if custom else []
+
+    for h in range(nb_hubs):
+        lines += ["    h{0}: !Hub &h{0}".format(h),
+                  "        nat_key:",
+                  "            - {{name: h{0}_id, format: varchar2(30), src: h{0}_code}}".format(h),
+                  "        sur_key: {}",
+                  "        src: stg.h{}".format(h)]
+        lines += custom_lines()
+    for l in range(nb_links):
+        hubs = ", ".join("*h{}".format((l + k) % nb_hubs) for k in range(link_arity))
+        lines += ["    l{}: !Link".format(l),
+                  "        hubs: [{}]".format(hubs),
+                  "        src: stg.l{}".format(l)]
+        lines += custom_lines()
+    for h in range(nb_hubs):
+        for s in range(sats_per_hub):
+            lines += ["    s{0}_{1}: !Sat".format(h, s),
+                      "        hub: *h{}".format(h),
+                      "        src: stg.h{}".format(h),
+                      "        lfc: {src: batch_date}",
+                      "        atts:"]
+            lines += ["            - {{name: att{0}, format: varchar2(100), src: att{0}_src}}".format(a)
+                      for a in range(nb_atts)]
+            lines += custom_lines()
+    return "\n".join(lines) + "\n"
+
+
+def bench_templates(template_dic=None):
+    """Return template_dic completed with custom variants (named with CUSTOM) of the templates used by
+    synthetic model tables. Variants only differ by a leading comment, so are compiled separately."""
+    template_dic = dict(template_dic or get_template_SQL())
+    for table_type, dml_name in (('Hub', 'DML_Hub'), ('Link', 'DML_Link'), ('Sat', 'DML_Sat')):
+        template_dic["DDL_{0}-{1}".format(table_type, CUSTOM)] = "-- custom\n" + template_dic["DDL_" + table_type]
+        template_dic["DML_{0}-{1}".format(table_type, CUSTOM)] = ["-- custom\n" + step for step in template_dic[dml_name]]
+    return template_dic
+
+
+def run_benchmark(yaml_txt, template_dic=None, jobs=1, out_dir=None, repeat=1):
+    """Run all phases on the model of yaml_txt (repeat times) and return results dict, with best (minimal)
+    elapsed seconds per phase"""
+    template_dic = bench_templates(template_dic)
+    best = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yaml_file = os.path.join(tmp_dir, "bench_model.yaml")
+        with open(yaml_file, "w") as f:
+            f.write(yaml_txt)
+        for _ in range(repeat):
+            timings = {}
+            start = time.perf_counter()
+            with open(yaml_file) as f:
+                dv_model = new_yaml_loader().load(f)
+            timings['yaml_load'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            dv_model.init_model()
+            timings['init_model'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            dv_model.setup(template_dic, sql_type="DDL", jobs=jobs)
+            timings['setup_ddl'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            dv_model.setup(template_dic, sql_type="DML", jobs=jobs)
+            timings['setup_dml'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            out_path = os.path.join(out_dir or tmp_dir, "bench_output.sql")
+            with SQLWriter(out_path) as writer:
+                writer.write_tables(dv_model.tables_in_create_order, "DDL", release=False)
+                writer.write_tables(dv_model.tables_in_create_order, "DML", release=False)
+            timings['output'] = time.perf_counter() - start
+            for phase, elapsed in timings.items():
+                best[phase] = min(elapsed, best.get(phase, elapsed))
+
+    return {'nb_tables': len(dv_model.tables),
+            'bytes_written': writer.bytes_written,
+            'jobs': jobs,
+            'repeat': repeat,
+            'python': platform.python_version(),
+            'phases': {p: best[p] for p in PHASES},
+            'total': sum(best.values())}
+
+
+def compare(results, baseline, threshold=0.1):
+    """Compare phases of results with baseline, return list of (phase, baseline, current, ratio, regressed)
+    a phase being regressed when slower than baseline by more than threshold (ratio)"""
+    rows = []
+    for phase in PHASES + ('total',):
+        base = baseline['phases'].get(phase) if phase != 'total' else baseline.get('total')
+        cur = results['phases'][phase] if phase != 'total' else results['total']
+        if not base:
+            rows.append((phase, base, cur, None, False))
+            continue
+        ratio = cur / base
+        rows.append((phase, base, cur, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def format_comparison(rows):
+    lines = ["{0:<12} {1:>10} {2:>10} {3:>8}".format("phase", "baseline", "current", "ratio")]
+    for phase, base, cur, ratio, regressed in rows:
+        lines.append("{0:<12} {1:>10} {2:>10.3f} {3:>8}{4}".format(
+            phase, "-" if base is None else "{:.3f}".format(base), cur,
+            "-" if ratio is None else "{:.2f}".format(ratio), "  REGRESSION" if regressed else ""))
+    return "\n".join(lines)
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of Data Vault code generation on a synthetic model")
+    parser.add_argument("--hubs", type=int, default=1000, help="Number of Hubs")
+    parser.add_argument("--links", type=int, help="Number of Links (default to half the number of Hubs)")
+    parser.add_argument("--arity", type=int, default=2, help="Number of Hubs per Link")
+    parser.add_argument("--sats", type=int, default=1, help="Number of Sats per Hub")
+    parser.add_argument("--atts", type=int, default=10, help="Number of attributes per Sat")
+    parser.add_argument("--custom-share", type=float, default=0.1, help="Share of tables using custom templates")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of processes used by setup")
+    parser.add_argument("-r", "--repeat", type=int, default=1, help="Number of runs (best time is kept)")
+    parser.add_argument("-o", "--out", help="Json file of results")
+    parser.add_argument("-b", "--baseline", help="Json file of baseline results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown ratio reported as regression")
+    parser.add_argument("--save-baseline", action="store_true", help="Save results as new baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = get_args(argv)
+    params = {'hubs': args.hubs, 'links': args.links, 'arity': args.arity, 'sats': args.sats,
+              'atts': args.atts, 'custom_share': args.custom_share}
+    yaml_txt = synthetic_model(nb_hubs=args.hubs, link_arity=args.arity, nb_links=args.links,
+                               sats_per_hub=args.sats, nb_atts=args.atts, custom_share=args.custom_share)
+    results = run_benchmark(yaml_txt, jobs=args.jobs, repeat=args.repeat)
+    results['params'] = params
+    print("{0} tables, {1:.3f}s".format(results['nb_tables'], results['total']))
+    for phase in PHASES:
+        print("  {0:<12} {1:.3f}s".format(phase, results['phases'][phase]))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    status = 0
+    if args.baseline and os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('params') != params:
+            print("Warning: baseline run with other parameters {}".format(baseline.get('params')), file=sys.stderr)
+        rows = compare(results, baseline, args.threshold)
+        print(format_comparison(rows))
+        status = 1 if any(r[4] for r in rows) else 0
+    elif args.baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
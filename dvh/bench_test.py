@@ -0,0 +1,32 @@
+import json
+from dvh.bench import *
+
+
+def test_synthetic_model():
+    yaml = new_yaml_loader()
+    m = yaml.load(synthetic_model(nb_hubs=4, link_arity=3, sats_per_hub=2, nb_atts=3, custom_share=0.5))
+    m.init_model()
+    assert len(m.tables) == 4 + 2 + 8
+    assert [h.name for h in m.tables['l1'].hubs] == ['h1', 'h2', 'h3']
+    assert len(m.tables['s3_1'].atts) == 3
+    custom = [t for t in m.tables.values() if getattr(t, 'DDL_custom', None)]
+    assert len(custom) == 7
+    assert m.tables['h1'].template_name("DML") == "DML_Hub-" + CUSTOM
+
+
+def test_run_benchmark():
+    results = run_benchmark(synthetic_model(nb_hubs=3, custom_share=0.5), repeat=2)
+    assert results['nb_tables'] == 3 + 1 + 3
+    assert list(results['phases']) == list(PHASES)
+    assert results['bytes_written'] > 0
+    json.dumps(results)
+
+
+def test_compare():
+    baseline = {'phases': {'yaml_load': 1.0, 'init_model': 1.0, 'setup_ddl': 1.0, 'setup_dml': 1.0}, 'total': 4.0}
+    results = {'phases': {'yaml_load': 1.05, 'init_model': 0.5, 'setup_ddl': 2.0, 'setup_dml': 1.0, 'output': 0.1},
+               'total': 4.65}
+    rows = {r[0]: r for r in compare(results, baseline, threshold=0.1)}
+    assert [p for p, r in rows.items() if r[4]] == ['setup_ddl', 'total']
+    assert rows['output'][3] is None
+    assert "REGRESSION" in format_comparison(rows.values())
@@ -0,0 +1,155 @@
+# coding: utf-8
+import hashlib
+import json
+import os
+import weakref
+from dvh.column import Column
+
+
+####################################################################################################################
+# Incremental generation: only tables whose fingerprint changed are rendered again, others are served from
+# an on-disk build cache.  A table fingerprint covers:
+#   - its definition (atts as loaded and initialized from yaml, referred tables by name)
+#   - the template section it uses
+#   - the fingerprints of the tables it refers to (Link's hubs, Sat's hub..)
+####################################################################################################################
+
+
+def _canonical(value):
+    """Return a json-serializable and deterministic form of a yaml definition value"""
+    if hasattr(value, 'references'):
+        # referred table is covered by its own fingerprint
+        return "<table:{}>".format(value.name)
+    if isinstance(value, Column):
+        value = value.to_dict()
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _hash(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def definition_fingerprint(table):
+    """Hash of table's own definition (private and generated atts excluded)"""
+    atts = {k: v for k, v in table.__dict__.items() if not k.startswith('_') and k not in ('DDL', 'DMLs', 'commit_points')}
+    return _hash(_canonical(atts))
+
+
+def template_fingerprint(template):
+    if isinstance(template, list):
+        return _hash([getattr(t, 'text', t) for t in template])
+    return _hash(getattr(template, 'text', template))
+
+
+class BuildReport(object):
+    """Outcome of an incremental setup: tables rebuilt (with reason) and tables served from cache"""
+    def __init__(self, sql_type):
+        self.sql_type = sql_type
+        self.rebuilt = {}
+        self.reused = []
+
+    def __str__(self):
+        lines = ["{0}: {1} table(s) rebuilt, {2} served from cache".format(self.sql_type, len(self.rebuilt), len(self.reused))]
+        lines += ["  rebuilt {0}: {1}".format(name, reason) for name, reason in self.rebuilt.items()]
+        return "\n".join(lines)
+
+
+class IncrementalBuild(object):
+    """Setup DDL or DML of a DVModel using a build cache stored under cache_dir
+    (one json file per table and sql_type holding its fingerprint components and generated SQL)
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        # definition fingerprints are taken once per table, before setup adds generated atts
+        self._definitions = weakref.WeakKeyDictionary()
+
+    def fingerprints(self, dv_model, template_dic, sql_type):
+        """Return {table: components} for every table of an initialized dv_model, where components
+        hold 'definition', 'template', 'refs' ({name: fingerprint}) and the overall 'fingerprint'"""
+        result = {}
+
+        def fingerprint(table):
+            if table not in result:
+                if table not in self._definitions:
+                    self._definitions[table] = definition_fingerprint(table)
+                components = {'definition': self._definitions[table],
+                              'template': template_fingerprint(dv_model.get_template(table, template_dic, sql_type)),
+                              'refs': {r.name: fingerprint(r)['fingerprint'] for r in table.references()}}
+                components['fingerprint'] = _hash(components)
+                result[table] = components
+            return result[table]
+
+        for table in dv_model.tables_in_create_order:
+            fingerprint(table)
+        return result
+
+    def setup(self, dv_model, template_dic, sql_type="DDL"):
+        """Same as DVModel.setup() but rendering only tables whose fingerprint changed, and return a BuildReport"""
+        assert sql_type in ('DDL', 'DML')
+        report = BuildReport(sql_type)
+        fingerprints = self.fingerprints(dv_model, template_dic, sql_type)
+        for table in dv_model.tables_in_create_order:
+            components = fingerprints[table]
+            entry = self._load(sql_type, table.name)
+            reason = self._rebuild_reason(entry, components, sql_type)
+            if reason is None:
+                if sql_type == "DDL":
+                    table.DDL = entry['sql']
+                    # indexes derived at DDL setup (hashdiff index, default indexes) are cached with the DDL
+                    table.indexes = entry['indexes']
+                else:
+                    table.DMLs = entry['sql']
+                    table.commit_points = entry['commit_points']
+                report.reused.append(table.name)
+                continue
+            # referred tables served from cache still need their atts
+            for ref in table.references():
+                ref.prepare_DDL_atts()
+            dv_model.setup_table(table, template_dic, sql_type)
+            if sql_type == "DDL":
+                self._store(sql_type, table.name, components, table.DDL, _canonical(getattr(table, 'indexes', None) or []))
+            else:
+                self._store(sql_type, table.name, components, table.DMLs, commit_points=table.commit_points)
+            report.rebuilt[table.name] = reason
+        return report
+
+    @staticmethod
+    def _rebuild_reason(entry, components, sql_type="DDL"):
+        if entry is None or ('indexes' if sql_type == "DDL" else 'commit_points') not in entry:
+            return "not in cache"
+        previous = entry['components']
+        if previous['fingerprint'] == components['fingerprint']:
+            return None
+        if previous['definition'] != components['definition']:
+            return "definition changed"
+        if previous['template'] != components['template']:
+            return "template changed"
+        changed = sorted(n for n, fp in components['refs'].items() if previous['refs'].get(n) != fp)
+        return "referred table(s) changed: {}".format(", ".join(changed))
+
+    def _path(self, sql_type, table_name):
+        return os.path.join(self.cache_dir, sql_type, table_name + ".json")
+
+    def _load(self, sql_type, table_name):
+        try:
+            with open(self._path(sql_type, table_name)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _store(self, sql_type, table_name, components, sql, indexes=None, commit_points=None):
+        path = self._path(sql_type, table_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {'components': components, 'sql': sql}
+        if indexes is not None:
+            entry['indexes'] = indexes
+        if commit_points is not None:
+            entry['commit_points'] = commit_points
+        with open(path, 'w') as f:
+            json.dump(entry, f)
@@ -0,0 +1,95 @@
+# coding: utf-8
+import pytest
+from dvh.model import *
+from dvh.build import *
+import ruamel.yaml
+
+yaml = ruamel.yaml.YAML()
+yaml.register_class(DVModel)
+yaml.register_class(Hub)
+yaml.register_class(Sat)
+yaml.register_class(Link)
+
+model_txt = """
+!DVModel
+       tables:
+            h1: !Hub &h1
+                sur_key: {}
+                nat_key:
+                    - {name: h1_id, format: number(3), src: h1_src}
+            h2: !Hub &h2
+                nat_key:
+                    - {name: h2_id, format: number(9), src: h2_src}
+            l12: !Link
+                hubs: [*h1, *h2]
+            s1: !Sat
+                hub:  *h1
+                atts:
+                    - {name: att1, format: number, src: att1_src}
+            s2: !Sat
+                hub:  *h2
+                atts:
+                    - {name: att2, format: number, src: att2_src}
+"""
+
+def load_model(txt=model_txt):
+    m = yaml.load(txt)
+    m.init_model()
+    return m
+
+
+def test_incremental_ddl(tmp_path):
+    cache_dir = str(tmp_path)
+    m = load_model()
+    report = IncrementalBuild(cache_dir).setup(m, get_template_SQL(), sql_type="DDL")
+    assert set(report.rebuilt) == {'h1', 'h2', 'l12', 's1', 's2'}
+    assert report.rebuilt['s1'] == "not in cache"
+    assert report.reused == []
+    expected = {t.name: t.DDL for t in m.tables_in_create_order}
+
+    # unchanged model is served from cache
+    m = load_model()
+    report = IncrementalBuild(cache_dir).setup(m, get_template_SQL(), sql_type="DDL")
+    assert report.rebuilt == {}
+    assert {t.name: t.DDL for t in m.tables_in_create_order} == expected
+
+    # only the changed Sat is rebuilt
+    m = load_model(model_txt.replace("att1_src}", "att1_src}\n                    - {name: att3, format: date}"))
+    report = IncrementalBuild(cache_dir).setup(m, get_template_SQL(), sql_type="DDL")
+    assert report.rebuilt == {'s1': "definition changed"}
+    assert "att3 date," in m.tables['s1'].DDL
+
+    # changing a Hub cascades to tables referring it (s1 is back to its original definition)
+    m = load_model(model_txt.replace("h2_id, format: number(9)", "h2_id, format: number(12)"))
+    report = IncrementalBuild(cache_dir).setup(m, get_template_SQL(), sql_type="DDL")
+    assert report.rebuilt == {'h2': "definition changed",
+                              'l12': "referred table(s) changed: h2",
+                              's2': "referred table(s) changed: h2",
+                              's1': "definition changed"}
+    assert "h2_id number(12) NOT NULL," in m.tables['l12'].DDL
+    assert m.tables['s1'].DDL == expected['s1']
+
+
+def test_incremental_template_change(tmp_path):
+    cache_dir = str(tmp_path)
+    templates = get_template_SQL()
+    IncrementalBuild(cache_dir).setup(load_model(), templates, sql_type="DDL")
+
+    templates['DDL_Sat'] = templates['DDL_Sat'].replace("load_dts NOT NULL", "load_dts DATE NOT NULL")
+    m = load_model()
+    report = IncrementalBuild(cache_dir).setup(m, templates, sql_type="DDL")
+    assert report.rebuilt == {'s1': "template changed", 's2': "template changed"}
+    assert "load_dts DATE NOT NULL," in m.tables['s2'].DDL
+    assert "s2: template changed" in str(report)
+
+
+def test_incremental_ddl_keeps_derived_indexes(tmp_path):
+    cache_dir = str(tmp_path)
+    txt = model_txt.replace("hub:  *h1", "hub:  *h1\n                hashdiff: {}")
+    stmts = []
+    for _ in range(2):
+        m = load_model(txt)
+        IncrementalBuild(cache_dir).setup(m, get_template_SQL(), sql_type="DDL")
+        stmts.append([s for t in m.tables_in_create_order for s in [t.DDL] + t.index_stmts()])
+    assert "CREATE INDEX s1_hdiff_idx ON s1_s (h1_key, hashdiff)" in stmts[0]
+    assert stmts[1] == stmts[0]
@@ -0,0 +1,159 @@
+# coding: utf-8
+import datetime
+import re
+from dvh.model import DefinitionError
+
+
+####################################################################################################################
+# Chunked and hinted load DML, driven by 'load' options of yaml defaults (per table type) overridden by the
+# table ones:
+#     load: {chunks: n, chunk_by: key|lfc, range: [first_date, last_date], parallel: n, direct_path: true, hints: txt}
+# With chunks, the DML steps are repeated for each chunk, each reading only a slice of src (its 'from <src>'
+# becoming a filtered inline view), so a large load runs as a sequence of restartable slices:
+#     - chunk_by key: slice of the natural key hash (see 'chunk_fct' default), a key being in one chunk only
+#     - chunk_by lfc: range of lfc.src dates (range split into equal periods, first/last chunks left open,
+#       see 'chunk_date' default), chunks being in chronological order as required by Sat versions
+# parallel and direct_path add optimizer hints to the statements (Oracle: PARALLEL, ENABLE_PARALLEL_DML
+# and APPEND on inserts/merges), hints being any other hint text.
+# A commit follows each chunk (restart point) and each direct-path statement (its table can only be read
+# again once committed).  Commit points are kept apart from the statements (Table.commit_points), so
+# Table.DMLs stay executable one by one: scripts get a COMMIT at each point (see script_stmts), while
+# LoadOrchestrator commits each statement it runs.
+####################################################################################################################
+
+
+LOAD_OPTIONS = ('chunks', 'chunk_by', 'range', 'parallel', 'direct_path', 'hints')
+
+# commit point as written in scripts
+COMMIT = "commit;"
+
+rx_dml_start = re.compile(r'^(\s*(?:--[^\n]*\n\s*)*)(insert|merge|update|delete)\b', re.I)
+
+
+def check_options(table_obj, options):
+    unknown = [k for k in options if k not in LOAD_OPTIONS]
+    if unknown:
+        raise DefinitionError(table_obj, "Unknown 'load' option(s): {}".format(", ".join(unknown)))
+    chunks = options.get('chunks') or 1
+    if not isinstance(chunks, int) or chunks < 1:
+        raise DefinitionError(table_obj, "'load.chunks' must be a positive integer")
+    if chunks > 1:
+        if getattr(table_obj, 'src', None) is None:
+            raise DefinitionError(table_obj, "Chunked load requires a 'src'")
+        chunk_by = options.get('chunk_by', 'key')
+        if chunk_by not in ('key', 'lfc'):
+            raise DefinitionError(table_obj, "'load.chunk_by' must be 'key' or 'lfc'")
+        if chunk_by == 'lfc':
+            lfc = getattr(table_obj, 'lfc', None)
+            if lfc is None or lfc.get('src') is None:
+                raise DefinitionError(table_obj, "Chunked load by lfc requires 'lfc.src'")
+            if not isinstance(options.get('range'), list) or len(options['range']) != 2:
+                raise DefinitionError(table_obj, "Chunked load by lfc requires 'load.range: [first_date, last_date]'")
+
+
+def key_columns(table_obj):
+    """Staging columns of table_obj natural key (Hub nat_key, Link hubs' nat_keys, Sat hub's nat_key)"""
+    if table_obj.table_type == 'Hub':
+        return [n.src for n in table_obj.nat_key]
+    if table_obj.table_type == 'Link':
+        if getattr(table_obj, 'nat_keys_src', None) is not None:
+            return [c for srcs in table_obj.nat_keys_src for c in srcs]
+        return [n.src for h in table_obj.hubs for n in h.nat_key]
+    src = table_obj.for_key.src
+    return list(src) if isinstance(src, list) else [src]
+
+
+def _to_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def date_bounds(first, last, chunks):
+    """chunks - 1 dates splitting [first, last] into equal periods"""
+    first, last = _to_date(first), _to_date(last)
+    if last <= first:
+        raise ValueError("Empty date range {} to {}".format(first, last))
+    days = (last - first).days
+    return [first + datetime.timedelta(days=days * i // chunks) for i in range(1, chunks)]
+
+
+def chunk_predicates(table_obj, options):
+    """Predicate on src columns of each chunk (chunks cover all src rows, without overlap)"""
+    chunks = options.get('chunks') or 1
+    if options.get('chunk_by', 'key') == 'key':
+        key = " || '|' || ".join(key_columns(table_obj))
+        fct = table_obj.defaults['chunk_fct'].format(key, chunks - 1)
+        return ["{0} = {1}".format(fct, i) for i in range(chunks)]
+    col = table_obj.lfc.src
+    bounds = [table_obj.defaults['chunk_date'].format(b.isoformat()) for b in date_bounds(options['range'][0], options['range'][1], chunks)]
+    preds = ["({0} < {1} or {0} is null)".format(col, bounds[0])]
+    preds += ["{0} >= {1} and {0} < {2}".format(col, low, high) for low, high in zip(bounds, bounds[1:])]
+    preds.append("{0} >= {1}".format(col, bounds[-1]))
+    return preds
+
+
+def chunk_stmt(stmt, src, predicate):
+    """Return stmt reading only rows of src matching predicate (None when stmt does not read src)"""
+    rx_src = re.compile(r'(\bfrom\s+){}(?=[\s)]|$)'.format(re.escape(src)), re.I)
+    if rx_src.search(stmt) is None:
+        return None
+    return rx_src.sub(lambda m: "{0}(select * from {1} where {2})".format(m.group(1), src, predicate), stmt)
+
+
+def is_direct_path(stmt, options):
+    """True when stmt is an insert or merge to run in direct path"""
+    match = rx_dml_start.match(stmt)
+    return bool(options.get('direct_path')) and match is not None and match.group(2).lower() in ('insert', 'merge')
+
+
+def hint_stmt(stmt, options):
+    """Add optimizer hints (parallel, direct path, others) after the leading insert/merge/update/delete"""
+    match = rx_dml_start.match(stmt)
+    if match is None:
+        return stmt
+    hints = ["APPEND"] if is_direct_path(stmt, options) else []
+    if (options.get('parallel') or 1) > 1:
+        hints.append("ENABLE_PARALLEL_DML PARALLEL({})".format(options['parallel']))
+    if options.get('hints'):
+        hints.append(options['hints'])
+    if not hints:
+        return stmt
+    return stmt[:match.end()] + " /*+ {} */".format(" ".join(hints)) + stmt[match.end():]
+
+
+def load_statements(table_obj, dmls):
+    """Return (statements, commit_points) of table_obj load from its rendered DML steps, according to its load
+    options, commit_points being the indexes of the statements to commit after (see script_stmts)"""
+    options = table_obj.load_options()
+    check_options(table_obj, options)
+    steps = [(hint_stmt(stmt, options), is_direct_path(stmt, options)) for stmt in dmls]
+    chunks = options.get('chunks') or 1
+    if chunks == 1:
+        return [stmt for stmt, _ in steps], [i for i, (_, direct_path) in enumerate(steps) if direct_path]
+    stmts = []
+    commit_points = []
+    for i, predicate in enumerate(chunk_predicates(table_obj, options)):
+        for no_step, (stmt, direct_path) in enumerate(steps):
+            chunked = chunk_stmt(stmt, table_obj.src, predicate)
+            if chunked is None:
+                raise DefinitionError(table_obj, "Cannot chunk DML step {} not reading from src".format(no_step + 1))
+            if no_step == 0:
+                chunked = "-- {0} chunk {1}/{2}\n{3}".format(table_obj.name, i + 1, chunks, chunked)
+            stmts.append(chunked)
+            if direct_path or no_step == len(steps) - 1:
+                commit_points.append(len(stmts) - 1)
+    return stmts, commit_points
+
+
+def script_stmts(stmts, commit_points=None):
+    """stmts followed by a COMMIT at each of commit_points, as written in scripts"""
+    points = set(commit_points or ())
+    script = []
+    for i, stmt in enumerate(stmts):
+        script.append(stmt)
+        if i in points:
+            script.append(COMMIT)
+    return script
@@ -0,0 +1,113 @@
+# coding: utf-8
+import sqlite3
+import pytest
+from dvh.chunk import *
+from dvh.library import TemplateLibrary
+from dvh.model import get_template_SQL
+from dvh.build_test import load_model
+
+hash_model_txt = """
+!DVModel
+       defaults:
+            Sat: {load: {parallel: 8, direct_path: true}}
+       tables:
+            h1: !Hub &h1
+                src: stg
+                key_type: hash
+                load: {chunks: 3, parallel: 4}
+                nat_key:
+                    - {name: h1_id, format: number(3), src: h1_src}
+            s1: !Sat
+                src: stg
+                hub:  *h1
+                hashdiff: {}
+                lfc: {src: upd_dt}
+                load: {chunks: 3, chunk_by: lfc, range: [2024-01-01, 2024-04-01]}
+                atts:
+                    - {name: att1, format: number, src: att1_src}
+"""
+
+
+def test_chunked_hinted_dml():
+    m = load_model(hash_model_txt)
+    m.setup(get_template_SQL(), "DML")
+    h1, s1 = m.tables['h1'], m.tables['s1']
+    assert s1.load_options() == {'parallel': 8, 'direct_path': True, 'chunks': 3, 'chunk_by': 'lfc',
+                                 'range': s1.load['range']}
+    # commit points kept apart from the statements
+    assert len(h1.DMLs) == 3 and h1.commit_points == [0, 1, 2]
+    assert COMMIT not in h1.DMLs
+    assert h1.DMLs[0].startswith("-- h1 chunk 1/3\nmerge /*+ ENABLE_PARALLEL_DML PARALLEL(4) */ into h1_h")
+    assert "from (select * from stg where ora_hash(h1_src, 2) = 2) s" in h1.DMLs[2]
+    assert "'stg'" in h1.DMLs[2]
+    assert script_stmts(h1.DMLs, h1.commit_points)[1::2] == [COMMIT] * 3
+
+    # each direct-path step committed, chunks in date order
+    assert len(s1.DMLs) == 6 and s1.commit_points == list(range(6))
+    assert s1.DMLs[1].startswith("insert /*+ APPEND ENABLE_PARALLEL_DML PARALLEL(8) */ into s1_s")
+    assert "where (upd_dt < DATE '2024-01-31' or upd_dt is null)) s" in s1.DMLs[0]
+    assert "where upd_dt >= DATE '2024-01-31' and upd_dt < DATE '2024-03-01') s" in s1.DMLs[3]
+    assert "where upd_dt >= DATE '2024-03-01') s" in s1.DMLs[5]
+
+    # without direct path, commits after each chunk only
+    m = load_model(hash_model_txt.replace("direct_path: true", "direct_path: false"))
+    m.setup(get_template_SQL(), "DML")
+    assert m.tables['s1'].commit_points == [1, 3, 5]
+    assert script_stmts(["a;", "b;", "c;"], [1]) == ["a;", "b;", COMMIT, "c;"]
+
+    with pytest.raises(DefinitionError):
+        load_model(hash_model_txt.replace("chunk_by: lfc, range: [2024-01-01, 2024-04-01]", "chunk_by: lfc")) \
+            .setup(get_template_SQL(), "DML")
+
+
+def test_chunked_load_same_result():
+    txt = """
+!DVModel
+       defaults:
+            Hub: {chunk_fct: "abs({0}) % ({1} + 1)", load: KEY_LOAD}
+            Sat: {chunk_date: "'{}'"}
+            Link: {chunk_fct: "abs({0}) % ({1} + 1)", load: KEY_LOAD}
+       tables:
+            h1: !Hub &h1
+                src: stg
+                sur_key: {}
+                nat_key:
+                    - {name: h1_id, format: integer, src: h1_src}
+            h2: !Hub &h2
+                src: stg
+                sur_key: {}
+                nat_key:
+                    - {name: h2_id, format: integer, src: h2_src}
+            l12: !Link
+                src: stg
+                hubs: [*h1, *h2]
+            s1: !Sat
+                src: stg
+                hub:  *h1
+                lfc: {src: upd_dt}
+                load: LFC_LOAD
+                atts:
+                    - {name: att1, format: integer, src: att1_src}
+"""
+    rows = [(k, k % 7, '2024-0{}-15'.format(1 + k % 3), k * 10) for k in range(40)]
+    lib = TemplateLibrary("sqlite")
+    results = []
+    for key_load, lfc_load in (("{}", "{}"), ("{chunks: 4}", "{chunks: 3, chunk_by: lfc, range: [2024-01-01, 2024-04-01]}")):
+        m = load_model(txt.replace("KEY_LOAD", key_load).replace("LFC_LOAD", lfc_load))
+        con = sqlite3.connect(":memory:")
+        con.execute("create table stg (h1_src integer, h2_src integer, upd_dt date, att1_src integer)")
+        con.executemany("insert into stg values (?, ?, ?, ?)", rows)
+        m.setup(lib, "DDL")
+        for t in m.tables_in_create_order:
+            con.execute(t.DDL)
+        m.setup(lib, "DML")
+        for t in m.tables_in_create_order:
+            for no, stmt in enumerate(t.DMLs):
+                con.execute(stmt)
+                if no in t.commit_points:
+                    con.commit()
+        results.append([con.execute("select h1_id from h1_h order by 1").fetchall(),
+                        con.execute("select h1_id, h2_id from l12_l join h1_h using (h1_key) join h2_h using (h2_key) order by 1, 2").fetchall(),
+                        con.execute("select h1_id, effective_date, att1 from s1_s join h1_h using (h1_key) order by 1, 2").fetchall()])
+    assert len(m.tables['s1'].DMLs) == 3 * 2 and m.tables['s1'].commit_points == [1, 3, 5]
+    assert results[0] == results[1] and len(results[0][2]) == 40
@@ -0,0 +1,94 @@
+# coding: utf-8
+
+
+####################################################################################################################
+# Compact column representation: every column-like entry of a table (nat_key, atts, extras, lfc, hashdiff,
+# for_key(s), sur_key) is loaded from yaml as a round-trip mapping (with its comment/format metadata), then
+# turned at init into a Column (or Key) with fixed slots.  Columns keep a dict-like access (col['name'],
+# col.get('src'), 'exp' in col) where an unset slot behaves as a missing key, so keyword resolution
+# (<nat_key.src>..) and templates work on them as they did on mappings.
+####################################################################################################################
+
+
+class Column(object):
+    """Column of a table: name, format, src (staging column, or list of them) and exp (expression computed at load)"""
+    __slots__ = ('name', 'format', 'src', 'exp')
+    fields = __slots__
+
+    def __init__(self, name=None, format=None, src=None, exp=None):
+        self.name = name
+        self.format = format
+        self.src = src
+        self.exp = exp
+
+    @classmethod
+    def from_yaml(cls, value):
+        """Return column from a yaml mapping (None and columns returned as is).
+        Raise ValueError when the mapping has keys not part of fields"""
+        if value is None or isinstance(value, Column):
+            return value
+        if not isinstance(value, dict):
+            raise ValueError("Expecting a mapping of {}, got '{}'".format(", ".join(cls.fields), value))
+        unknown = [str(k) for k in value if k not in cls.fields]
+        if unknown:
+            raise ValueError("Unknown key(s) {} (expecting {})".format(", ".join(unknown), ", ".join(cls.fields)))
+        col = cls()
+        for k, v in value.items():
+            setattr(col, k, list(v) if isinstance(v, list) else v)
+        return col
+
+    def __getitem__(self, key):
+        value = getattr(self, key) if key in self.fields else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self.fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.fields and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key) if key in self.fields else None
+        return default if value is None else value
+
+    def keys(self):
+        return [k for k in self.fields if getattr(self, k) is not None]
+
+    def items(self):
+        return [(k, getattr(self, k)) for k in self.keys()]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, Column):
+            return type(self) is type(other) and self.items() == other.items()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "{0}({1})".format(self.__class__.__name__, ", ".join("{0}={1!r}".format(k, v) for k, v in self.items()))
+
+
+class Key(Column):
+    """Surrogate key (sequence or hash of natural keys): a column with its sequence name"""
+    __slots__ = ('seq',)
+    fields = Column.fields + __slots__
+
+    def __init__(self, name=None, format=None, src=None, exp=None, seq=None):
+        super().__init__(name, format, src, exp)
+        self.seq = seq
+
+
+def to_columns(value, column_class=Column):
+    """Return column_class (or list of them) from a yaml mapping (or list of mappings)"""
+    if isinstance(value, list):
+        return [column_class.from_yaml(v) for v in value]
+    return column_class.from_yaml(value)
@@ -0,0 +1,43 @@
+# coding: utf-8
+import pickle
+import pytest
+from dvh.column import *
+from dvh.model import ValidationError, get_template_SQL
+from dvh.build_test import load_model, model_txt, yaml
+
+
+def test_column_access():
+    col = Column.from_yaml(yaml.load("{name: att1, format: number, src: [a, b]}"))
+    assert col.name == "att1" and col['format'] == "number" and col.src == ['a', 'b']
+    assert type(col.src) is list
+    assert col.get('exp') is None and 'exp' not in col and 'src' in col
+    with pytest.raises(KeyError):
+        col['exp']
+    with pytest.raises(KeyError):
+        col['comment'] = "x"
+    col['exp'] = "upper(a)"
+    assert col == {'name': "att1", 'format': "number", 'src': ['a', 'b'], 'exp': "upper(a)"}
+    assert pickle.loads(pickle.dumps(col)) == col
+    assert not hasattr(col, '__dict__')
+
+    key = Key.from_yaml({'seq': "h1_seq"})
+    assert key.to_dict() == {'seq': "h1_seq"} and key != Column()
+    with pytest.raises(ValueError):
+        Column.from_yaml({'name': "x", 'seq': "s"})
+
+
+def test_model_columns():
+    m = load_model()
+    h1, l12, s1 = m.tables['h1'], m.tables['l12'], m.tables['s1']
+    assert type(h1.sur_key) is Key and type(h1.nat_key) is list and type(h1.nat_key[0]) is Column
+    m.setup(get_template_SQL(), "DDL")
+    assert h1.sur_key == {'name': "h1_key", 'format': "number(9)", 'seq': "h1_seq"}
+    assert [type(k) for k in l12.for_keys] == [Column, Column]
+    assert s1.for_key == {'name': "h1_key", 'format': "number(9)", 'src': "h1_src"}
+    assert "att1 number," in s1.DDL
+    assert s1.resolve("s.<atts.src>") == ["s.att1_src"]
+
+    with pytest.raises(ValidationError) as err:
+        load_model(model_txt.replace("src: att1_src}", "src: att1_src, comment: x}"))
+    assert [(v.table, v.rule) for v in err.value.violations] == [('s1', 'table_rule')]
+    assert "Unknown key(s) comment" in err.value.violations[0].message
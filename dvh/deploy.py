@@ -0,0 +1,193 @@
+# coding: utf-8
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+####################################################################################################################
+# Deployment: generated DDL is run wave by wave (see DVModel.waves) through a pool of DB-API connections.
+# Tables of the same wave are independent, so they run in parallel and a full rebuild takes about as long
+# as the deepest dependency chain.  Any DB-API connect() works (ex. sqlite3 for local testing).
+####################################################################################################################
+
+
+class ConnectionPool(object):
+    """Pool of at most size DB-API connections, created on demand by calling connect()"""
+    def __init__(self, connect, size=4):
+        self.connect = connect
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._nb_created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._nb_created < self.size
+            if create:
+                self._nb_created += 1
+        if create:
+            try:
+                return self.connect()
+            except Exception:
+                with self._lock:
+                    self._nb_created -= 1
+                raise
+        return self._idle.get()
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._nb_created = 0
+
+
+class StatementResult(object):
+    """Outcome of one statement: start time (perf_counter), elapsed seconds, rows affected (when reported 
+    by driver) and error if any"""
+    __slots__ = ('table', 'action', 'sql', 'elapsed', 'rowcount', 'error', 'start')
+
+    def __init__(self, table, action, sql, elapsed=0.0, rowcount=None, error=None, start=None):
+        self.table = table
+        self.action = action
+        self.sql = sql
+        self.elapsed = elapsed
+        self.rowcount = rowcount
+        self.error = error
+        self.start = start
+
+    def __repr__(self):
+        status = "error: {}".format(self.error) if self.error else "ok"
+        return "StatementResult({0} {1}, {2:.3f}s, {3})".format(self.action, self.table, self.elapsed, status)
+
+
+class RunReport(object):
+    """Results of all statements run (in order of completion)"""
+    def __init__(self):
+        self.results = []
+        self.elapsed = 0.0
+
+    @property
+    def errors(self):
+        return [r for r in self.results if r.error is not None]
+
+    def __str__(self):
+        lines = ["{0} statement(s) in {1:.3f}s, {2} error(s)".format(len(self.results), self.elapsed, len(self.errors))]
+        lines += ["  {0} {1}: {2}".format(r.action, r.table, r.error) for r in self.errors]
+        return "\n".join(lines)
+
+
+def execute_stmt(conn, table_name, action, sql):
+    """Execute sql on conn (committed) and return its StatementResult, error is collected (not raised)"""
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql.strip().rstrip(';'))
+        rowcount = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else None
+        conn.commit()
+        return StatementResult(table_name, action, sql, time.perf_counter() - start, rowcount, start=start)
+    except Exception as err:
+        conn.rollback()
+        return StatementResult(table_name, action, sql, time.perf_counter() - start, error=err, start=start)
+    finally:
+        cursor.close()
+
+
+class Deployer(object):
+    """Drop, create and grant the tables of a DVModel (DDL already setup) using pool_size concurrent connections.
+    When a table fails to be created, tables depending on it are skipped (reported with an error).
+    With sequences=True (databases having sequences), the sequence of a table sequence key is created
+    before the table, and dropped after it."""
+    def __init__(self, dv_model, connect, pool_size=4, sequences=True):
+        self.dv_model = dv_model
+        self.pool = ConnectionPool(connect, pool_size)
+        self.sequences = sequences
+
+    def _run_table(self, table_obj, action, stmts):
+        results = []
+        with self.pool.connection() as conn:
+            for sql in stmts:
+                res = execute_stmt(conn, table_obj.name, action, sql)
+                results.append(res)
+                if res.error is not None:
+                    break
+        return results
+
+    def run_waves(self, waves, action, stmts_of, report=None):
+        """Run stmts_of(table) for all tables, wave after wave, tables of a wave in parallel"""
+        report = report or RunReport()
+        start = time.perf_counter()
+        failed = set()
+        with ThreadPoolExecutor(max_workers=self.pool.size) as executor:
+            for wave in waves:
+                futures = {}
+                for table_obj in wave:
+                    failed_refs = [r.name for r in table_obj.references() if r in failed]
+                    if failed_refs:
+                        failed.add(table_obj)
+                        err = RuntimeError("skipped as depending on failed table(s): {}".format(", ".join(failed_refs)))
+                        report.results.append(StatementResult(table_obj.name, action, None, error=err))
+                    else:
+                        futures[table_obj] = executor.submit(self._run_table, table_obj, action, stmts_of(table_obj))
+                for table_obj, future in futures.items():
+                    results = future.result()
+                    report.results += results
+                    if any(r.error is not None for r in results):
+                        failed.add(table_obj)
+        report.elapsed += time.perf_counter() - start
+        return report
+
+    def drop(self, if_exists=True, report=None):
+        # reverse order: dependent tables dropped first, and failure to drop does not block others
+        waves = list(reversed(self.dv_model.waves))
+        report = report or RunReport()
+        for wave in waves:
+            self.run_waves([wave], "drop", lambda t: self.drop_stmts(t, if_exists), report)
+        return report
+
+    def create_stmts(self, table_obj):
+        stmts = [table_obj.DDL] + table_obj.index_stmts()
+        if self.sequences and table_obj.sequence_stmt() is not None:
+            stmts.insert(0, table_obj.sequence_stmt())
+        return stmts
+
+    def drop_stmts(self, table_obj, if_exists=True):
+        stmts = [table_obj.drop_stmt(if_exists=if_exists)]
+        if self.sequences and table_obj.drop_sequence_stmt() is not None:
+            stmts.append(table_obj.drop_sequence_stmt(if_exists=if_exists))
+        return stmts
+
+    def create(self, report=None):
+        return self.run_waves(self.dv_model.waves, "create", self.create_stmts, report)
+
+    def grant(self, to_schema, privileges="SELECT", report=None):
+        return self.run_waves(self.dv_model.waves, "grant", lambda t: [t.grant_stmt(to_schema, privileges)], report)
+
+    def rebuild(self, to_schema=None):
+        """Drop and create all tables (then grant them to to_schema when given), returning one RunReport"""
+        report = self.drop()
+        self.create(report)
+        if to_schema:
+            self.grant(to_schema, report=report)
+        return report
+
+    def close(self):
+        self.pool.close()
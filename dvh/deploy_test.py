@@ -0,0 +1,112 @@
+# coding: utf-8
+import os
+import sqlite3
+import pytest
+from dvh.model import *
+from dvh.deploy import *
+from dvh.build_test import load_model
+
+# DDL templates runnable on SQLite
+sqlite_templates = {
+    'DDL_Hub': """CREATE TABLE <name>_h (
+<sur_key.name> <sur_key.format>,
+<nat_key.name> <nat_key.format> NOT NULL,
+load_dts DATE NOT NULL,
+UNIQUE (<unique_key>),
+CONSTRAINT <name>_pk PRIMARY KEY (<primary_key.name>)
+);""",
+    'DDL_Link': """CREATE TABLE <name>_l (
+<sur_key.name> <sur_key.format>,
+<for_keys.name> <for_keys.format> NOT NULL,
+load_dts DATE NOT NULL,
+CONSTRAINT <name>_<hubs.name>_fk FOREIGN KEY (<for_keys.name>) REFERENCES <hubs.name>_h,
+CONSTRAINT <name>_pk PRIMARY KEY (<sur_key.name>)
+);""",
+    'DDL_Sat': """CREATE TABLE <name>_s (
+<for_key.name> <hub.primary_key.format>,
+<atts.name> <atts.format>,
+load_dts DATE NOT NULL,
+CONSTRAINT <name>_<hub.name>_fk FOREIGN KEY (<for_key.name>) REFERENCES <hub.name>_h
+);""",
+}
+
+
+def sqlite_connect(db_file):
+    return lambda: sqlite3.connect(db_file, timeout=10, check_same_thread=False)
+
+
+def db_tables(db_file):
+    with sqlite3.connect(db_file) as conn:
+        return sorted(r[0] for r in conn.execute("select name from sqlite_master where type = 'table'"))
+
+
+def test_connection_pool():
+    created = []
+    def connect():
+        created.append(1)
+        return sqlite3.connect(":memory:", check_same_thread=False)
+    pool = ConnectionPool(connect, size=2)
+    c1 = pool.acquire()
+    c2 = pool.acquire()
+    pool.release(c1)
+    assert pool.acquire() is c1
+    pool.release(c1)
+    pool.release(c2)
+    assert len(created) == 2
+    pool.close()
+
+
+def test_rebuild_on_sqlite(tmp_path):
+    db_file = os.path.join(str(tmp_path), "dv.db")
+    m = load_model()
+    m.setup(sqlite_templates, sql_type="DDL")
+    deployer = Deployer(m, sqlite_connect(db_file), pool_size=3, sequences=False)
+    report = deployer.rebuild()
+    assert report.errors == []
+    assert db_tables(db_file) == ['h1_h', 'h2_h', 'l12_l', 's1_s', 's2_s']
+    creates = [r for r in report.results if r.action == "create"]
+    assert len(creates) == 5
+    assert all(r.elapsed >= 0 for r in creates)
+
+    # rebuilding again drops existing tables first
+    report = deployer.rebuild()
+    assert report.errors == []
+    assert [r.table for r in report.results if r.action == "drop"][:3] == ['l12', 's1', 's2']
+    deployer.close()
+
+
+def test_create_errors_are_collected(tmp_path):
+    db_file = os.path.join(str(tmp_path), "dv.db")
+    m = load_model()
+    m.setup(sqlite_templates, sql_type="DDL")
+    m.tables['h2'].DDL = "CREATE TABLE h2_h (invalid sql"
+    deployer = Deployer(m, sqlite_connect(db_file), pool_size=2, sequences=False)
+    report = deployer.create()
+    assert sorted(r.table for r in report.errors) == ['h2', 'l12', 's2']
+    assert "skipped" in str([r.error for r in report.errors if r.table == 's2'][0])
+    assert db_tables(db_file) == ['h1_h', 's1_s']
+    assert "3 error(s)" in str(report)
+
+
+def test_drop_and_grant_stmts():
+    m = load_model()
+    drops = m.generate_drop_stmts(as_proc=False, if_exists=True)
+    assert drops[0] == "DROP TABLE IF EXISTS s2_s"
+    assert drops[-1] == "DROP TABLE IF EXISTS h1_h"
+    proc = m.generate_drop_stmts()
+    assert len(proc) == 1
+    assert "'s2_s', 's1_s', 'l12_l', 'h2_h', 'h1_h'" in proc[0]
+    assert m.generate_ddl_grants("reporting")[0] == "GRANT SELECT ON h1_h TO reporting"
+
+
+def test_sequence_stmts():
+    m = load_model()
+    m.setup(get_template_SQL(), sql_type="DDL")
+    h1, h2 = m.tables['h1'], m.tables['h2']
+    deployer = Deployer(m, sqlite_connect(":memory:"))
+    # sequence created before its table, and dropped after it
+    assert deployer.create_stmts(h1)[:2] == ["CREATE SEQUENCE h1_seq", h1.DDL]
+    assert deployer.drop_stmts(h1) == ["DROP TABLE IF EXISTS h1_h", "DROP SEQUENCE IF EXISTS h1_seq"]
+    # h2 has no sur_key
+    assert deployer.create_stmts(h2) == [h2.DDL] + h2.index_stmts()
+    assert Deployer(m, sqlite_connect(":memory:"), sequences=False).create_stmts(h1)[0] == h1.DDL
@@ -0,0 +1,444 @@
+# coding: utf-8
+import argparse
+import re
+import sys
+
+
+####################################################################################################################
+# Schema diff: compare the tables of two DVModel versions (or of a model and a deployed database, SQLite
+# catalog being the local stand-in) and plan the ALTER statements moving the old schema to the new one:
+# new tables, added/dropped columns, changed formats or nullability, new/dropped constraints and indexes.
+# Both sides are read the same way, from the CREATE TABLE/INDEX statements (rendered from templates for a
+# model, as stored in sqlite_master for a catalog), so columns defined by templates (load_dts..) are covered.
+# Changes that may lose data (dropped table or column, narrower format) are flagged destructive.
+# SQLite can only add and drop columns: other changes of a table are done by rebuilding it (copy of rows).
+####################################################################################################################
+
+
+class ColumnSchema(object):
+    def __init__(self, name, format, not_null=False, default=None):
+        self.name = name
+        self.format = format
+        self.not_null = not_null
+        self.default = default
+
+    def definition(self):
+        return "{0} {1}{2}{3}".format(self.name, self.format, " DEFAULT " + self.default if self.default else "",
+                                      " NOT NULL" if self.not_null else "")
+
+
+class ConstraintSchema(object):
+    """Primary key ('P'), unique ('U') or foreign key ('F', to ref_table) on columns"""
+    def __init__(self, kind, columns, ref_table=None, name=None):
+        self.kind = kind
+        self.columns = tuple(columns)
+        self.ref_table = ref_table
+        self.name = name
+
+    @property
+    def key(self):
+        return (self.kind, self.columns, self.ref_table)
+
+    def definition(self):
+        cols = ", ".join(self.columns)
+        clause = {'P': "PRIMARY KEY ({})", 'U': "UNIQUE ({})", 'F': "FOREIGN KEY ({})"}[self.kind].format(cols)
+        if self.kind == 'F':
+            clause += " REFERENCES " + self.ref_table
+        return ("CONSTRAINT {} ".format(self.name) if self.name else "") + clause
+
+
+class IndexSchema(object):
+    def __init__(self, name, columns, unique=False, stmt=None):
+        self.name = name
+        self.columns = tuple(columns)
+        self.unique = unique
+        self.stmt = stmt
+
+    @property
+    def key(self):
+        return (self.columns, self.unique)
+
+
+class TableSchema(object):
+    """Columns (in order), constraints and indexes of a table, with the statement creating it (and the
+    sequence feeding its key, if any)"""
+    def __init__(self, name, ddl=None, sequence=None):
+        self.name = name
+        self.ddl = ddl
+        self.sequence = sequence
+        self.columns = {}
+        self.constraints = []
+        self.indexes = {}
+
+    def constraint_keys(self):
+        return {c.key: c for c in self.constraints}
+
+
+def _norm(name):
+    return name.strip().strip('"').lower()
+
+
+def _norm_format(fmt):
+    return re.sub(r'\s+', '', fmt.lower())
+
+
+def _split_top_level(text):
+    """Split text on commas not enclosed in parentheses"""
+    items, depth, start = [], 0, 0
+    for i, c in enumerate(text):
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            items.append(text[start:i])
+            start = i + 1
+    items.append(text[start:])
+    return [i.strip() for i in items if i.strip()]
+
+
+def _columns(txt):
+    return [_norm(c) for c in txt.split(",")]
+
+
+rx_create_table = re.compile(r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?("?[\w.$#]+"?)\s*\(', re.I)
+rx_create_index = re.compile(r'CREATE\s+(UNIQUE\s+)?INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?("?[\w.$#]+"?)\s+ON\s+("?[\w.$#]+"?)\s*\(([^)]*)\)', re.I)
+# (PRIMARY_KEY and REFERENCE as found in Template_SQL.sql also accepted)
+rx_constraint = re.compile(r'^(?:CONSTRAINT\s+("?[\w$#]+"?)\s+)?(PRIMARY[\s_]+KEY|UNIQUE|FOREIGN\s+KEY|CHECK)\s*\(([^)]*)\)'
+                           r'(?:\s*REFERENCES?\s+("?[\w.$#]+"?))?', re.I)
+# column options, ending the column format
+rx_col_options = re.compile(r'\s(NOT\s+NULL|NULL|DEFAULT|PRIMARY[\s_]+KEY|UNIQUE|REFERENCES?|CONSTRAINT|CHECK|COLLATE)\b', re.I)
+
+
+def parse_create_table(ddl):
+    """Return TableSchema of a CREATE TABLE statement (one definition per column or table constraint)"""
+    match = rx_create_table.search(ddl)
+    if match is None:
+        raise ValueError("No CREATE TABLE found in: {}".format(ddl[:80]))
+    table = TableSchema(_norm(match.group(1)), ddl.strip())
+    depth, end = 1, None
+    for i in range(match.end(), len(ddl)):
+        depth += {'(': 1, ')': -1}.get(ddl[i], 0)
+        if depth == 0:
+            end = i
+            break
+    if end is None:
+        raise ValueError("Unbalanced parenthesis in CREATE TABLE {}".format(table.name))
+    for item in _split_top_level(ddl[match.end():end]):
+        cons = rx_constraint.match(item)
+        if cons:
+            kind = cons.group(2).upper()[0]
+            if kind != 'C':
+                ref = _norm(cons.group(4)) if cons.group(4) else None
+                name = _norm(cons.group(1)) if cons.group(1) else None
+                table.constraints.append(ConstraintSchema(kind, _columns(cons.group(3)), ref, name))
+            continue
+        name, rest = item.split(None, 1) if len(item.split(None, 1)) == 2 else (item, "")
+        name = _norm(name)
+        rest = " " + rest
+        options = list(rx_col_options.finditer(rest))
+        fmt = (rest[:options[0].start()] if options else rest).strip()
+        col = table.columns[name] = ColumnSchema(name, fmt)
+        for i, opt in enumerate(options):
+            keyword = re.sub(r'[\s_]+', ' ', opt.group(1).upper())
+            if keyword == 'NOT NULL':
+                col.not_null = True
+            elif keyword == 'DEFAULT':
+                col.default = rest[opt.end():options[i + 1].start() if i + 1 < len(options) else len(rest)].strip()
+            elif keyword in ('PRIMARY KEY', 'UNIQUE'):
+                table.constraints.append(ConstraintSchema(keyword[0], [name]))
+    return table
+
+
+def parse_create_index(stmt):
+    """Return (table name, IndexSchema) of a CREATE INDEX statement"""
+    match = rx_create_index.search(stmt)
+    if match is None:
+        raise ValueError("No CREATE INDEX found in: {}".format(stmt[:80]))
+    stmt = stmt.strip().rstrip(";")
+    return _norm(match.group(3)), IndexSchema(_norm(match.group(2)), _columns(match.group(4)), bool(match.group(1)), stmt)
+
+
+def model_schema(dv_model, template_dic):
+    """Return {table name: TableSchema} of dv_model tables (in create order) from their DDL rendered with template_dic"""
+    schema = {}
+    for table_obj in dv_model.tables_in_create_order:
+        dv_model.setup_table(table_obj, template_dic, "DDL")
+        table = parse_create_table(table_obj.DDL.rstrip().rstrip(";"))
+        for stmt in table_obj.index_stmts():
+            _, index = parse_create_index(stmt)
+            table.indexes[index.name] = index
+        table.sequence = table_obj.sequence_name()
+        schema[table.name] = table
+    return schema
+
+
+def sqlite_schema(con):
+    """Return {table name: TableSchema} of tables (in creation order) of an SQLite database connection"""
+    schema = {}
+    rows = con.execute("select type, name, tbl_name, sql from sqlite_master "
+                       "where sql is not null and name not like 'sqlite_%' order by rowid").fetchall()
+    for kind, name, tbl_name, sql in rows:
+        if kind == 'table':
+            table = parse_create_table(sql)
+            schema[table.name] = table
+    for kind, name, tbl_name, sql in rows:
+        if kind == 'index' and _norm(tbl_name) in schema:
+            _, index = parse_create_index(sql)
+            schema[_norm(tbl_name)].indexes[index.name] = index
+    return schema
+
+
+rx_format = re.compile(r'^(\w+)\s*(?:\(([^)]*)\))?')
+def is_widening(old_format, new_format):
+    """True when a column of old_format fits into new_format (same type with same or larger precision/length)"""
+    old, new = rx_format.match(_norm_format(old_format)), rx_format.match(_norm_format(new_format))
+    if old is None or new is None or old.group(1) != new.group(1):
+        return False
+    if new.group(2) is None:
+        return True
+    if old.group(2) is None:
+        return False
+    try:
+        old_params = [int(p) for p in old.group(2).split(",")]
+        new_params = [int(p) for p in new.group(2).split(",")]
+    except ValueError:
+        return False
+    if len(old_params) == 2 or len(new_params) == 2:
+        # number(precision, scale): neither integer digits nor scale may shrink
+        op, os_ = old_params[0], old_params[1] if len(old_params) == 2 else 0
+        np_, ns = new_params[0], new_params[1] if len(new_params) == 2 else 0
+        return ns >= os_ and np_ - ns >= op - os_
+    return new_params[0] >= old_params[0]
+
+
+class Change(object):
+    """A change of one table with its statements; destructive when data may be lost"""
+    def __init__(self, table, action, stmts, destructive=False, reason=None):
+        self.table = table
+        self.action = action
+        self.stmts = stmts
+        self.destructive = destructive
+        self.reason = reason
+
+    def __str__(self):
+        return "{0}: {1}{2}{3}".format(self.table, self.action, " [destructive]" if self.destructive else "",
+                                       " ({})".format(self.reason) if self.reason else "")
+
+
+class MigrationPlan(object):
+    """Ordered changes: new tables, changes of existing tables, then dropped tables (reverse order)"""
+    def __init__(self, dialect, changes):
+        self.dialect = dialect
+        self.changes = changes
+
+    def destructive(self):
+        return [c for c in self.changes if c.destructive]
+
+    def statements(self, include_destructive=True):
+        return [s for c in self.changes if include_destructive or not c.destructive for s in c.stmts]
+
+    def script(self, include_destructive=True):
+        """SQL script of the plan, each change preceded by a comment (destructive ones flagged)"""
+        lines = []
+        for c in self.changes:
+            if c.destructive and not include_destructive:
+                lines.append("-- skipped {}".format(c))
+                continue
+            lines.append("-- {}".format(c))
+            lines += [s + ";" for s in c.stmts]
+        return "\n".join(lines) + "\n"
+
+    def apply(self, con):
+        """Execute the plan on an SQLite connection (in a single transaction)"""
+        with con:
+            for stmt in self.statements():
+                con.execute(stmt)
+
+    def __len__(self):
+        return len(self.changes)
+
+    def __str__(self):
+        return "\n".join(str(c) for c in self.changes)
+
+
+class SchemaDiff(object):
+    """Plan the statements moving schema old to schema new (both {table name: TableSchema}) for dialect"""
+    def __init__(self, old, new, dialect="oracle"):
+        if dialect not in ('oracle', 'postgresql', 'sqlite'):
+            raise ValueError("Unknown dialect '{}'".format(dialect))
+        self.old = old
+        self.new = new
+        self.dialect = dialect
+
+    def plan(self):
+        changes = []
+        for name, table in self.new.items():
+            if name not in self.old:
+                stmts = self._create_sequence(table) + [table.ddl] + [i.stmt for i in table.indexes.values()]
+                changes.append(Change(name, "create_table", stmts))
+        for name, table in self.new.items():
+            if name in self.old:
+                if table.sequence != self.old[name].sequence and self._create_sequence(table):
+                    changes.append(Change(name, "create_sequence", self._create_sequence(table)))
+                changes += self._table_changes(self.old[name], table)
+        for name in reversed(list(self.old)):
+            if name not in self.new:
+                stmts = ["DROP TABLE {}".format(name)] + self._drop_sequence(self.old[name])
+                changes.append(Change(name, "drop_table", stmts, destructive=True))
+        return MigrationPlan(self.dialect, changes)
+
+    def _create_sequence(self, table):
+        # SQLite has no sequence (its pack computes keys from max + row_number)
+        if table.sequence is None or self.dialect == "sqlite":
+            return []
+        return ["CREATE SEQUENCE {}".format(table.sequence)]
+
+    def _drop_sequence(self, table):
+        if table.sequence is None or self.dialect == "sqlite":
+            return []
+        return ["DROP SEQUENCE {}".format(table.sequence)]
+
+    def _table_changes(self, old, new):
+        added = [c for n, c in new.columns.items() if n not in old.columns]
+        dropped = [c for n, c in old.columns.items() if n not in new.columns]
+        changed = [(old.columns[n], c) for n, c in new.columns.items() if n in old.columns and
+                   (_norm_format(old.columns[n].format) != _norm_format(c.format) or old.columns[n].not_null != c.not_null)]
+        old_cons, new_cons = old.constraint_keys(), new.constraint_keys()
+        cons_dropped = [c for k, c in old_cons.items() if k not in new_cons]
+        cons_added = [c for k, c in new_cons.items() if k not in old_cons]
+        idx_dropped = [i for n, i in old.indexes.items() if n not in new.indexes or new.indexes[n].key != i.key]
+        idx_added = [i for n, i in new.indexes.items() if n not in old.indexes or old.indexes[n].key != i.key]
+
+        if self.dialect == 'sqlite' and self._needs_rebuild(old, added, dropped, changed, cons_dropped, cons_added):
+            return [self._rebuild(old, new, dropped, changed)]
+
+        t = new.name
+        changes = [Change(t, "drop_index", ["DROP INDEX {}".format(i.name)]) for i in idx_dropped]
+        changes += [Change(t, "drop_constraint", [self._drop_constraint(t, c)]) for c in cons_dropped]
+        changes += [Change(t, "add_column", [self._add_column(t, c)],
+                           reason="not null without default, fails on a non-empty table" if c.not_null and not c.default else None)
+                    for c in added]
+        for old_col, col in changed:
+            change = Change(t, "modify_column", self._modify_column(t, old_col, col))
+            if _norm_format(old_col.format) != _norm_format(col.format) and not is_widening(old_col.format, col.format):
+                change.destructive = True
+                change.reason = "format {} to {} may not fit existing values".format(old_col.format, col.format)
+            elif col.not_null and not old_col.not_null:
+                change.reason = "not null, fails on existing null values"
+            changes.append(change)
+        changes += [Change(t, "add_constraint", ["ALTER TABLE {0} ADD {1}".format(t, c.definition())]) for c in cons_added]
+        changes += [Change(t, "add_index", [i.stmt]) for i in idx_added]
+        changes += [Change(t, "drop_column", ["ALTER TABLE {0} DROP COLUMN {1}".format(t, c.name)], destructive=True)
+                    for c in dropped]
+        return changes
+
+    def _add_column(self, table, col):
+        if self.dialect == 'oracle':
+            return "ALTER TABLE {0} ADD ({1})".format(table, col.definition())
+        return "ALTER TABLE {0} ADD COLUMN {1}".format(table, col.definition())
+
+    def _modify_column(self, table, old_col, col):
+        stmts = []
+        format_changed = _norm_format(old_col.format) != _norm_format(col.format)
+        if self.dialect == 'oracle':
+            null_clause = "" if col.not_null == old_col.not_null else (" NOT NULL" if col.not_null else " NULL")
+            stmts.append("ALTER TABLE {0} MODIFY ({1}{2}{3})".format(table, col.name, " " + col.format if format_changed else "", null_clause))
+        else:
+            if format_changed:
+                stmts.append("ALTER TABLE {0} ALTER COLUMN {1} TYPE {2}".format(table, col.name, col.format))
+            if col.not_null != old_col.not_null:
+                stmts.append("ALTER TABLE {0} ALTER COLUMN {1} {2} NOT NULL".format(table, col.name, "SET" if col.not_null else "DROP"))
+        return stmts
+
+    def _drop_constraint(self, table, cons):
+        if cons.name:
+            return "ALTER TABLE {0} DROP CONSTRAINT {1}".format(table, cons.name)
+        if self.dialect == 'oracle':
+            if cons.kind == 'P':
+                return "ALTER TABLE {} DROP PRIMARY KEY".format(table)
+            if cons.kind == 'U':
+                return "ALTER TABLE {0} DROP UNIQUE ({1})".format(table, ", ".join(cons.columns))
+        # default names given by PostgreSQL
+        suffix = {'P': "pkey", 'U': "key", 'F': "fkey"}[cons.kind]
+        name = table + "_pkey" if cons.kind == 'P' else "_".join((table,) + cons.columns + (suffix,))
+        return "ALTER TABLE {0} DROP CONSTRAINT {1}".format(table, name)
+
+    @staticmethod
+    def _needs_rebuild(old, added, dropped, changed, cons_dropped, cons_added):
+        """SQLite alters only add columns (nullable or with default) and drop columns not part of a constraint or index"""
+        if changed or cons_dropped or cons_added:
+            return True
+        if any(c.not_null and not c.default for c in added):
+            return True
+        constrained = {col for c in old.constraints for col in c.columns}
+        constrained |= {col for i in old.indexes.values() for col in i.columns}
+        return any(c.name in constrained for c in dropped)
+
+    def _rebuild(self, old, new, dropped, changed):
+        """SQLite: create new version of table, copy rows of the common columns, then replace old table"""
+        tmp = new.name + "__new"
+        match = rx_create_table.search(new.ddl)
+        create = new.ddl[:match.start(1)] + tmp + new.ddl[match.end(1):]
+        common = ", ".join(c for c in new.columns if c in old.columns)
+        stmts = [create,
+                 "INSERT INTO {0} ({1}) SELECT {1} FROM {2}".format(tmp, common, old.name),
+                 "DROP TABLE {}".format(old.name),
+                 "ALTER TABLE {0} RENAME TO {1}".format(tmp, new.name)]
+        stmts += [i.stmt for i in new.indexes.values()]
+        narrowed = [c.name for o, c in changed if _norm_format(o.format) != _norm_format(c.format)
+                    and not is_widening(o.format, c.format)]
+        reasons = (["dropped column(s) " + ", ".join(c.name for c in dropped)] if dropped else []) + \
+                  (["narrower format of " + ", ".join(narrowed)] if narrowed else [])
+        return Change(new.name, "rebuild_table", stmts, destructive=bool(reasons), reason="; ".join(reasons) or None)
+
+
+def diff_models(old_model, new_model, template_dic, dialect="oracle"):
+    """MigrationPlan from old_model to new_model (DDL rendered with template_dic)"""
+    return SchemaDiff(model_schema(old_model, template_dic), model_schema(new_model, template_dic), dialect).plan()
+
+
+def diff_sqlite(con, dv_model, template_dic):
+    """MigrationPlan from the tables of an SQLite database to dv_model (DDL rendered with template_dic)"""
+    return SchemaDiff(sqlite_schema(con), model_schema(dv_model, template_dic), "sqlite").plan()
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser(description="Plan ALTER statements between two versions of a Data Vault model")
+    old = parser.add_mutually_exclusive_group(required=True)
+    old.add_argument("--old", help="YAML file (or directory of shards) of the deployed model version")
+    old.add_argument("--sqlite", help="SQLite database of the deployed model (compared with sqlite templates)")
+    parser.add_argument("-y", "--yaml", required=True, help="YAML file (or directory of shards) of the new model version")
+    parser.add_argument("--dialect", default="oracle", choices=["oracle", "postgresql", "sqlite"], help="Target database")
+    parser.add_argument("--templates", action="append", default=[], metavar="DIR", help="Directory of template files overriding the dialect pack")
+    parser.add_argument("--safe-only", action="store_true", help="Skip destructive changes")
+    parser.add_argument("--apply", action="store_true", help="Apply plan to the --sqlite database")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    import sqlite3
+    from dvh.library import TemplateLibrary
+    from dvh.model import load_dv_model
+    args = get_args(argv)
+    dialect = "sqlite" if args.sqlite else args.dialect
+    templates = TemplateLibrary(dialect, override_dirs=args.templates)
+    new_model = load_dv_model(args.yaml)
+    templates.check_model(new_model, ("DDL",))
+    if args.sqlite:
+        con = sqlite3.connect(args.sqlite)
+        plan = diff_sqlite(con, new_model, templates)
+    else:
+        plan = diff_models(load_dv_model(args.old), new_model, templates, dialect)
+    sys.stdout.write(plan.script(include_destructive=not args.safe_only))
+    print("-- {0} change(s), {1} destructive".format(len(plan), len(plan.destructive())), file=sys.stderr)
+    if args.apply:
+        if not args.sqlite:
+            raise SystemExit("--apply requires --sqlite")
+        if args.safe_only:
+            plan = MigrationPlan(plan.dialect, [c for c in plan.changes if not c.destructive])
+        plan.apply(con)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# coding: utf-8
+import sqlite3
+from dvh.diff import *
+from dvh.library import TemplateLibrary
+from dvh.model import get_template_SQL
+from dvh.build_test import load_model, model_txt
+
+att1 = "src: att1_src}"
+att2 = "\n                    - {name: att2, format: number, src: att2_src}"
+s3 = """            s3: !Sat
+                hub:  *h2
+                atts:
+                    - {name: att4, format: date, src: att4_src}
+"""
+
+
+def test_parse_create_table():
+    table = parse_create_table("CREATE TABLE s1_s (\nh1_key number(9),\nvalid_to date NOT NULL DEFAULT to_date('40000101','YYYYMMDD'),\n"
+                               "amount number(12, 2) not null,\nload_dts NOT NULL,\n"
+                               "CONSTRAINT s1_pk PRIMARY_KEY (h1_key, valid_to),\n"
+                               "CONSTRAINT s1_h1_fk FOREIGN KEY (h1_key) REFERENCE h1_h\n)\nCOMPRESS")
+    assert list(table.columns) == ['h1_key', 'valid_to', 'amount', 'load_dts']
+    assert table.columns['valid_to'].default == "to_date('40000101','YYYYMMDD')" and table.columns['valid_to'].not_null
+    assert table.columns['amount'].format == "number(12, 2)"
+    assert [c.key for c in table.constraints] == [('P', ('h1_key', 'valid_to'), None), ('F', ('h1_key',), 'h1_h')]
+
+    assert is_widening("varchar2(10)", "VARCHAR2(30)") and is_widening("number(9)", "number")
+    assert not is_widening("number(9)", "number(5)") and not is_widening("number(9, 2)", "number(9, 3)")
+    assert not is_widening("date", "varchar2(10)")
+
+
+def test_diff_models():
+    old = load_model()
+    new = load_model(model_txt.replace(att1, att1 + "\n                    - {name: att3, format: varchar2(10), src: att3_src}")
+                              .replace(att2, "\n                    - {name: att2, format: number(5), src: att2_src}")
+                              .replace("format: number(3)", "format: number(5)") + s3)
+    plan = diff_models(old, new, get_template_SQL())
+    assert [(c.table, c.action, c.destructive) for c in plan.changes] == [
+        ('s3_s', 'create_table', False), ('h1_h', 'modify_column', False),
+        ('s1_s', 'add_column', False), ('s2_s', 'modify_column', True)]
+    assert plan.changes[0].stmts[0].startswith("CREATE TABLE s3_s")
+    assert plan.statements(include_destructive=False)[1:] == ["ALTER TABLE h1_h MODIFY (h1_id number(5))",
+                                                               "ALTER TABLE s1_s ADD (att3 varchar2(10))"]
+
+    plan = diff_models(new, old, get_template_SQL(), dialect="postgresql")
+    assert [(c.table, c.action) for c in plan.destructive()] == [
+        ('h1_h', 'modify_column'), ('s1_s', 'drop_column'), ('s3_s', 'drop_table')]
+    assert "ALTER TABLE s1_s DROP COLUMN att3" in plan.script()
+    assert "ALTER TABLE h1_h ALTER COLUMN h1_id TYPE number(3)" in plan.statements()
+
+
+def test_diff_new_sequence_key():
+    link = """            l21: !Link
+                hubs: [*h2, *h1]
+"""
+    old, new = load_model(), load_model(model_txt + link)
+    plan = diff_models(old, new, get_template_SQL())
+    assert [(c.table, c.action) for c in plan.changes] == [('l21_l', 'create_table')]
+    # its DML uses l21_seq.nextval
+    assert plan.changes[0].stmts[:2] == ["CREATE SEQUENCE l21_seq", new.tables['l21'].DDL.rstrip().rstrip(";")]
+    plan = diff_models(new, old, get_template_SQL())
+    assert plan.changes[0].stmts == ["DROP TABLE l21_l", "DROP SEQUENCE l21_seq"]
+    # Hub getting a sequence key
+    plan = diff_models(old, load_model(model_txt.replace("h2: !Hub &h2\n", "h2: !Hub &h2\n                sur_key: {}\n")),
+                       get_template_SQL())
+    assert plan.changes[0].stmts == ["CREATE SEQUENCE h2_seq"]
+
+
+def test_diff_sqlite_catalog():
+    lib = TemplateLibrary("sqlite")
+    txt = model_txt.replace("h2: !Hub &h2", "h2: !Hub &h2\n                sur_key: {}") \
+                   .replace("hub:  *h1", "hub:  *h1\n                lfc: {src: upd_dt}")
+    old = load_model(txt)
+    con = sqlite3.connect(":memory:")
+    for table in model_schema(old, lib).values():
+        con.execute(table.ddl)
+    con.execute("insert into h1_h values (1, 5, '2024-01-01', null, 1, 'stg')")
+    con.execute("insert into s1_s (h1_key, effective_date, att1, load_dts) values (1, '2024-01-01', 7, '2024-01-01')")
+    assert len(diff_sqlite(con, old, lib)) == 0
+
+    new = load_model(txt.replace(att1, att1 + "\n                    - {name: att3, format: varchar(10), src: att3_src}")
+                        .replace("format: number(3)", "format: number(5)")
+                        .replace(att2, "\n                    - {name: att5, format: date, src: att5_src}"))
+    plan = diff_sqlite(con, new, lib)
+    assert [(c.table, c.action, c.destructive) for c in plan.changes] == [
+        ('h1_h', 'rebuild_table', False), ('s1_s', 'add_column', False),
+        ('s2_s', 'add_column', False), ('s2_s', 'drop_column', True)]
+    plan.apply(con)
+    assert len(diff_sqlite(con, new, lib)) == 0
+    assert con.execute("select h1_key, h1_id from h1_h").fetchall() == [(1, 5)]
+    assert con.execute("select att1, att3 from s1_s").fetchall() == [(7, None)]
@@ -0,0 +1,152 @@
+# coding: utf-8
+import os
+import re
+from collections.abc import Mapping
+from dvh.model import DefinitionError, TEMPLATE_SQL_FILE, ValidationError
+from dvh.validate import Violation
+
+
+####################################################################################################################
+# Template library: template sections ('--DDL_Hub:', '--DML_Hub-withdupes(1):'..) read from a dialect pack
+# (Template_SQL.sql being the Oracle one) completed or overridden by the *.sql files of override directories.
+# Each file is parsed in a single pass over its lines and cached by path and modification time, files
+# being only read when a section is first requested, and checked again for changes on refresh() only.
+# A model can be checked against the library: every template it refers to (per table type, hash key or
+# hashdiff variants and '<sql_type>_custom' ones) must exist.
+####################################################################################################################
+
+
+PACKS_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "templates")
+
+DIALECTS = {'oracle': TEMPLATE_SQL_FILE,
+            'postgresql': os.path.join(PACKS_DIR, "postgresql.sql"),
+            'sqlite': os.path.join(PACKS_DIR, "sqlite.sql")}
+
+# section marker, ex. "--DDL_Hub:" or "--DML_Sat-hashdiff(2):"
+rx_section = re.compile(r'^--((DDL|DML)_[^:(\s]+)(?:\((\d+)\))?:')
+# any line looking like a section marker, a malformed one being an error instead of silently ignored text
+rx_marker = re.compile(r'^--\s*(DDL|DML)_', re.IGNORECASE)
+
+
+def parse_sections(lines, source="template"):
+    """Return {'DDL_Hub': 'ddl', .., 'DML_Sat': ['step1', 'step2',..]} from template lines.
+    A section starts after its marker line and ends with the first ';' (included), text outside
+    sections being ignored. A line starting like a marker but not matching rx_section is an error."""
+    ddls = {}
+    dmls = {}
+    current = None
+    buf = []
+    for line in lines:
+        line = line.rstrip("\n")
+        match = rx_section.match(line)
+        if not match and rx_marker.match(line):
+            raise DefinitionError(source, "Malformed section marker '{}', expecting ex. '--DML_Sat(1):'".format(line))
+        if match:
+            if current is not None:
+                raise DefinitionError(source, "Section '{}' not terminated by ';'".format(current[0]))
+            key, sql_type, step = match.group(1), match.group(2), int(match.group(3) or 1)
+            if (sql_type == "DDL" and key in ddls) or (sql_type == "DML" and step in dmls.get(key, {})):
+                raise DefinitionError(source, "Section '{}' defined more than once".format(match.group(0)))
+            current = (key, sql_type, step)
+            buf = [line[match.end():]] if line[match.end():].strip() else []
+            continue
+        if current is None:
+            continue
+        end = line.find(';')
+        if end == -1:
+            buf.append(line)
+            continue
+        buf.append(line[:end + 1])
+        key, sql_type, step = current
+        if sql_type == "DDL":
+            ddls[key] = "\n".join(buf)
+        else:
+            dmls.setdefault(key, {})[step] = "\n".join(buf)
+        current = None
+    if current is not None:
+        raise DefinitionError(source, "Section '{}' not terminated by ';'".format(current[0]))
+    sections = dict(ddls)
+    sections.update({key: [steps[n] for n in sorted(steps)] for key, steps in dmls.items()})
+    return sections
+
+
+# path -> (mtime_ns, size, sections)
+_file_cache = {}
+def load_template_file(path):
+    """Return sections of template file at path, parsed again only when the file changed"""
+    path = os.path.abspath(path)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        raise DefinitionError(path, "Template file not found")
+    cached = _file_cache.get(path)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    with open(path) as f:
+        sections = parse_sections(f, source=path)
+    _file_cache[path] = (st.st_mtime_ns, st.st_size, sections)
+    return sections
+
+
+class TemplateLibrary(Mapping):
+    """Read-only dict of template sections from dialect pack, overridden by files of override_dirs (in order).
+    Usable wherever a template dict is expected (ex. DVModel.setup()).
+    Files are read on first access, then only checked for changes by refresh() (ex. once per run of a
+    long-running process), so looking up templates table after table costs no file system access."""
+    def __init__(self, dialect="oracle", override_dirs=(), files=None):
+        if files is None:
+            if dialect not in DIALECTS:
+                raise DefinitionError(dialect, "Unknown dialect, expecting one of: {}".format(", ".join(DIALECTS)))
+            files = [DIALECTS[dialect]]
+        self.dialect = dialect
+        self.files = list(files)
+        for d in override_dirs:
+            self.files += sorted(os.path.join(d, f) for f in os.listdir(d) if f.endswith(".sql"))
+        self._sections = None
+        self._versions = None
+
+    def refresh(self):
+        """Read files changed since last read (all of them on first call), and merge their sections again
+        when any changed. Return True when sections changed."""
+        versions = [load_template_file(path) for path in self.files]
+        if self._sections is not None and all(v is p for v, p in zip(versions, self._versions)):
+            return False
+        merged = {}
+        for sections in versions:
+            merged.update(sections)
+        self._sections = merged
+        self._versions = versions
+        return True
+
+    def sections(self):
+        """Merged sections of all files (as of the last refresh)"""
+        if self._sections is None:
+            self.refresh()
+        return self._sections
+
+    def __getitem__(self, key):
+        return self.sections()[key]
+
+    def __iter__(self):
+        return iter(self.sections())
+
+    def __len__(self):
+        return len(self.sections())
+
+    def missing_templates(self, dv_model, sql_types=("DDL", "DML")):
+        """Return list of Violation for each template referred by a table of dv_model but not found"""
+        sections = self.sections()
+        violations = []
+        for table_obj in dv_model.tables_in_create_order:
+            for sql_type in sql_types:
+                name = table_obj.template_name(sql_type)
+                if name not in sections:
+                    violations.append(Violation(table_obj.name, 'missing_template',
+                                                "Template '{0}' not found in {1} templates".format(name, self.dialect)))
+        return violations
+
+    def check_model(self, dv_model, sql_types=("DDL", "DML")):
+        """Raise ValidationError when templates referred by dv_model are missing"""
+        violations = self.missing_templates(dv_model, sql_types)
+        if violations:
+            raise ValidationError(dv_model, violations)
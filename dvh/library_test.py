@@ -0,0 +1,123 @@
+# coding: utf-8
+import os
+import sqlite3
+import pytest
+from dvh.library import *
+from dvh.build_test import load_model, model_txt
+from dvh.model import get_template_SQL
+
+
+def test_parse_sections():
+    lines = ["/* header; ignored */\n",
+             "--DDL_Hub:\n", "create table <name>_h (\n", "id number);\n",
+             "--DML_Hub(2):\n", "update <name>_h;\n",
+             "--DML_Hub(1): insert into <name>_h\n", "select 1 from dual; -- rest ignored\n"]
+    sections = parse_sections(lines)
+    assert sections['DDL_Hub'] == "create table <name>_h (\nid number);"
+    assert sections['DML_Hub'] == [" insert into <name>_h\nselect 1 from dual;", "update <name>_h;"]
+
+    with pytest.raises(DefinitionError):
+        parse_sections(["--DDL_Hub:\n", "create table t (\n", "--DDL_Sat:\n", "x;\n"])
+    with pytest.raises(DefinitionError):
+        parse_sections(["--DDL_Hub:\n", "create table t;\n", "--DDL_Hub:\n", "x;\n"])
+    # near-miss markers are not silently ignored
+    for marker in ("--DML_Sat(1)\n", "--DML_Sat-withdupes\n", "-- DDL_Hub:\n", "--dml_Hub(1):\n"):
+        with pytest.raises(DefinitionError):
+            parse_sections([marker, "select 1 from dual;\n"])
+
+
+def test_template_file_cache(tmp_path):
+    path = tmp_path / "t.sql"
+    path.write_text("--DDL_Hub:\ncreate table <name>_h (id number);\n")
+    sections = load_template_file(str(path))
+    assert load_template_file(str(path)) is sections
+    path.write_text("--DDL_Hub:\ncreate table <name>_h (id number(9));\n")
+    st = os.stat(str(path))
+    os.utime(str(path), ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert load_template_file(str(path))['DDL_Hub'] == "create table <name>_h (id number(9));"
+
+    # Oracle pack is the historical template file, with every table type section
+    oracle = TemplateLibrary('oracle')
+    for name in ('DML_Hub', 'DML_Link', 'DML_Sat', 'DML_Sat-withdupes', 'DML_Sat-hashdiff'):
+        assert oracle[name] and all(step.rstrip().endswith(";") for step in oracle[name])
+    assert get_template_SQL()['DML_Hub-hashkey'] == TemplateLibrary()['DML_Hub-hashkey']
+
+
+def test_override_and_missing_templates(tmp_path):
+    (tmp_path / "custom.sql").write_text("--DDL_Sat:\n-- own Sat\ncreate table <name>_s (x number);\n"
+                                         "--DML_Sat(1):\ninsert into <name>_s select 1 from dual;\n")
+    m = load_model()
+    lib = TemplateLibrary("oracle")
+    assert lib.missing_templates(m) == []
+    m.tables['s2'].DML_custom = "unknown"
+    assert [(v.table, v.rule) for v in lib.missing_templates(m, ("DML",))] == [('s2', 'missing_template')]
+    with pytest.raises(ValidationError):
+        lib.check_model(m, ("DML",))
+    m.tables['s2'].DML_custom = None
+
+    lib = TemplateLibrary("oracle", override_dirs=[str(tmp_path)])
+    assert lib.missing_templates(m) == []
+    m.setup(lib, "DDL")
+    assert m.tables['s1'].DDL.startswith("-- own Sat")
+    assert m.tables['h1'].DDL.startswith("CREATE TABLE h1_h")
+
+    with pytest.raises(DefinitionError):
+        TemplateLibrary("db2")
+
+
+def test_sqlite_pack():
+    txt = model_txt.replace("h2: !Hub &h2", "h2: !Hub &h2\n                sur_key: {}") \
+                   .replace("!Link", "!Link\n                src: stg") \
+                   .replace("!Hub &h1", "!Hub &h1\n                src: stg") \
+                   .replace("!Hub &h2", "!Hub &h2\n                src: stg") \
+                   .replace("hub:  *h1", "hub:  *h1\n                src: stg\n"
+                            "                lfc: {name: valid_from, format: date, src: upd_dt, exp: valid_to}")
+    txt = txt.split("            s2: !Sat")[0]
+    m = load_model(txt)
+    lib = TemplateLibrary("sqlite")
+    lib.check_model(m)
+    con = sqlite3.connect(":memory:")
+    con.execute("create table stg (h1_src integer, h2_src integer, upd_dt date, att1_src integer)")
+    m.setup(lib, "DDL")
+    for t in m.tables_in_create_order:
+        con.executescript(t.DDL)
+    m.setup(lib, "DML")
+
+    def load(rows):
+        con.execute("delete from stg")
+        con.executemany("insert into stg values (?, ?, ?, ?)", rows)
+        for t in m.tables_in_create_order:
+            for stmt in t.DMLs:
+                con.executescript(stmt)
+
+    load([(1, 10, '2024-01-01', 5), (2, 20, '2024-01-01', 6)])
+    load([(1, 10, '2024-01-02', 5), (2, 30, '2024-01-02', 7)])
+    assert con.execute("select h1_key, h1_id from h1_h order by 1").fetchall() == [(1, 1), (2, 2)]
+    assert con.execute("select h1_key, h2_key from l12_l order by 1").fetchall() == [(1, 1), (2, 2), (2, 3)]
+    assert con.execute("select h1_key, valid_from, valid_to, att1 from s1_s order by 1, 2").fetchall() == [
+        (1, '2024-01-01', '4000-01-01', 5),
+        (2, '2024-01-01', '2024-01-02', 6),
+        (2, '2024-01-02', '4000-01-01', 7)]
+
+
+def test_refresh(tmp_path, monkeypatch):
+    path = tmp_path / "t.sql"
+    path.write_text("--DDL_Hub:\ncreate table <name>_h (id number);\n")
+    lib = TemplateLibrary(files=[str(path)])
+    assert lib['DDL_Hub'] == "create table <name>_h (id number);"
+    # model setup (a lookup per table) does not check files again
+    oracle = TemplateLibrary("oracle")
+    oracle.sections()
+    stats = []
+    real_stat = os.stat
+    monkeypatch.setattr(os, "stat", lambda p, *a, **k: stats.append(p) or real_stat(p, *a, **k))
+    load_model().setup(oracle, "DDL")
+    assert stats == []
+    monkeypatch.undo()
+
+    path.write_text("--DDL_Hub:\ncreate table <name>_h (id number(9));\n")
+    st = os.stat(str(path))
+    os.utime(str(path), ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert lib['DDL_Hub'] == "create table <name>_h (id number);"
+    assert lib.refresh() and not lib.refresh()
+    assert lib['DDL_Hub'] == "create table <name>_h (id number(9));"
@@ -0,0 +1,91 @@
+# coding: utf-8
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dvh.deploy import ConnectionPool, RunReport, StatementResult, execute_stmt
+
+
+####################################################################################################################
+# Load orchestration: DML steps of each table (Table.DMLs) are run as soon as the tables it refers to are
+# loaded (all Hubs start right away, a Link or Sat starts once its Hubs are loaded unless keys are hashes
+# computed from staging, see Table.load_references()), through a pool of
+# DB-API connections.  Concurrency is also bounded per staging source ('src'), so a single staging table
+# is not scanned by too many merges at once.  Each step is committed once run (see execute_stmt), which
+# covers the commit points of chunked and direct-path loads (Table.commit_points, see dvh.chunk).
+####################################################################################################################
+
+
+class LoadOrchestrator(object):
+    """Run the DML of a DVModel (DML already setup) with pool_size concurrent connections and at most
+    max_per_src tables loading from the same 'src' at the same time.
+    Each step is recorded with its elapsed time and rows affected; when a table fails, tables depending
+    on it are skipped (reported with an error)."""
+    def __init__(self, dv_model, connect, pool_size=4, max_per_src=1):
+        self.dv_model = dv_model
+        self.pool = ConnectionPool(connect, pool_size)
+        self.max_per_src = max_per_src
+
+    def _load_table(self, table_obj):
+        results = []
+        with self.pool.connection() as conn:
+            for no, sql in enumerate(table_obj.DMLs, 1):
+                res = execute_stmt(conn, table_obj.name, "load step {}".format(no), sql)
+                results.append(res)
+                if res.error is not None:
+                    break
+        return results
+
+    def run(self, tables=None):
+        """Load tables (default to all tables of model) and return the RunReport"""
+        tables = list(tables if tables is not None else self.dv_model.tables_in_create_order)
+        missing = [t.name for t in tables if getattr(t, 'DMLs', None) is None]
+        if missing:
+            raise ValueError("DML not setup for table(s): {}".format(", ".join(missing)))
+
+        report = RunReport()
+        start = time.perf_counter()
+        selected = set(tables)
+        pending_refs = {t: {r for r in t.load_references() if r in selected} for t in tables}
+        dependents = {}
+        for t in tables:
+            for r in pending_refs[t]:
+                dependents.setdefault(r, []).append(t)
+        ready = [t for t in tables if not pending_refs[t]]
+        running = {}
+        running_per_src = {}
+        skipped = set()
+
+        def skip_dependents(failed):
+            for d in dependents.get(failed, []):
+                if d not in skipped:
+                    skipped.add(d)
+                    err = RuntimeError("skipped as depending on failed table: {}".format(failed.name))
+                    report.results.append(StatementResult(d.name, "load", None, error=err))
+                    skip_dependents(d)
+
+        with ThreadPoolExecutor(max_workers=self.pool.size) as executor:
+            while ready or running:
+                for table_obj in list(ready):
+                    src = getattr(table_obj, 'src', None)
+                    if src is not None and running_per_src.get(src, 0) >= self.max_per_src:
+                        continue
+                    ready.remove(table_obj)
+                    running_per_src[src] = running_per_src.get(src, 0) + 1
+                    running[executor.submit(self._load_table, table_obj)] = table_obj
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    table_obj = running.pop(future)
+                    running_per_src[getattr(table_obj, 'src', None)] -= 1
+                    results = future.result()
+                    report.results += results
+                    if any(r.error is not None for r in results):
+                        skip_dependents(table_obj)
+                        continue
+                    for d in dependents.get(table_obj, []):
+                        pending_refs[d].discard(table_obj)
+                        if not pending_refs[d] and d not in skipped:
+                            ready.append(d)
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    def close(self):
+        self.pool.close()
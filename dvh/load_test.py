@@ -0,0 +1,107 @@
+# coding: utf-8
+import os
+import sqlite3
+import pytest
+from dvh.model import *
+from dvh.load import *
+from dvh.deploy import Deployer
+from dvh.deploy_test import sqlite_templates, sqlite_connect
+from dvh.build_test import load_model
+
+
+def deploy_with_staging(db_file):
+    m = load_model()
+    m.setup(sqlite_templates, sql_type="DDL")
+    Deployer(m, sqlite_connect(db_file), sequences=False).create()
+    with sqlite3.connect(db_file) as conn:
+        conn.execute("create table stg_a (h1_src, h2_src, att1_src, att2_src)")
+        conn.executemany("insert into stg_a values (?, ?, ?, ?)", [(1, 10, 'a', 'x'), (2, 20, 'b', 'y'), (2, 30, 'b', 'z')])
+    for t in m.tables.values():
+        t.src = "stg_a"
+    # DML steps runnable on SQLite
+    m.tables['h1'].DMLs = ["insert into h1_h (h1_key, h1_id, load_dts) select distinct h1_src, h1_src, date('now') from stg_a"]
+    m.tables['h2'].DMLs = ["insert into h2_h (h2_id, load_dts) select distinct h2_src, date('now') from stg_a"]
+    m.tables['l12'].DMLs = ["insert into l12_l (l12_key, h1_key, h2_id, load_dts) select rowid, h1_src, h2_src, date('now') from stg_a"]
+    m.tables['s1'].DMLs = ["insert into s1_s (h1_key, att1, load_dts) select distinct h1_src, att1_src, date('now') from stg_a",
+                           "update s1_s set att1 = upper(att1)"]
+    m.tables['s2'].DMLs = ["insert into s2_s (h2_id, att2, load_dts) select h2_src, att2_src, date('now') from stg_a"]
+    return m
+
+
+def test_load_dependency_order(tmp_path):
+    db_file = os.path.join(str(tmp_path), "dv.db")
+    m = deploy_with_staging(db_file)
+    loader = LoadOrchestrator(m, sqlite_connect(db_file), pool_size=3, max_per_src=2)
+    report = loader.run()
+    loader.close()
+    assert report.errors == []
+    rows = {(r.table, r.action): r.rowcount for r in report.results}
+    assert rows == {('h1', 'load step 1'): 2, ('h2', 'load step 1'): 3, ('l12', 'load step 1'): 3,
+                    ('s1', 'load step 1'): 2, ('s1', 'load step 2'): 2, ('s2', 'load step 1'): 3}
+
+    def interval(name):
+        steps = [r for r in report.results if r.table == name]
+        return steps[0].start, steps[-1].start + steps[-1].elapsed
+    # Link and Sat start once the Hubs they refer to are loaded
+    assert interval('l12')[0] >= max(interval('h1')[1], interval('h2')[1])
+    assert interval('s1')[0] >= interval('h1')[1]
+    assert interval('s2')[0] >= interval('h2')[1]
+    # never more than max_per_src tables loading from the same src
+    bounds = [interval(n) for n in m.tables]
+    for start, _ in bounds:
+        assert sum(1 for s, e in bounds if s <= start < e) <= 2
+
+
+def test_load_failure_skips_dependents(tmp_path):
+    db_file = os.path.join(str(tmp_path), "dv.db")
+    m = deploy_with_staging(db_file)
+    m.tables['h2'].DMLs = ["insert into unknown_table select 1"]
+    report = LoadOrchestrator(m, sqlite_connect(db_file), pool_size=2).run()
+    assert sorted(r.table for r in report.errors) == ['h2', 'l12', 's2']
+    assert sorted(r.table for r in report.results if r.error is None) == ['h1', 's1', 's1']
+
+    del m.tables['s2'].DMLs
+    with pytest.raises(ValueError):
+        LoadOrchestrator(m, sqlite_connect(db_file)).run()
+
+
+def test_load_chunked_direct_path(tmp_path):
+    from dvh.library import TemplateLibrary
+    db_file = os.path.join(str(tmp_path), "dv.db")
+    m = load_model("""
+!DVModel
+       defaults:
+            Hub: {chunk_fct: "abs({0}) % ({1} + 1)"}
+            Sat: {chunk_date: "'{}'"}
+       tables:
+            h1: !Hub &h1
+                src: stg
+                sur_key: {}
+                load: {chunks: 2, direct_path: true}
+                nat_key:
+                    - {name: h1_id, format: integer, src: h1_src}
+            s1: !Sat
+                src: stg
+                hub:  *h1
+                lfc: {src: upd_dt}
+                load: {chunks: 2, chunk_by: lfc, range: [2024-01-01, 2024-03-01], direct_path: true}
+                atts:
+                    - {name: att1, format: integer, src: att1_src}
+""")
+    lib = TemplateLibrary("sqlite")
+    m.setup(lib, "DDL")
+    with sqlite3.connect(db_file) as conn:
+        for t in m.tables_in_create_order:
+            conn.execute(t.DDL)
+        conn.execute("create table stg (h1_src integer, upd_dt date, att1_src integer)")
+        conn.executemany("insert into stg values (?, ?, ?)", [(k, '2024-0{}-15'.format(1 + k % 2), k) for k in range(10)])
+    m.setup(lib, "DML")
+    assert m.tables['s1'].commit_points
+
+    # commit points are not statements: every step runs, each one committed
+    report = LoadOrchestrator(m, sqlite_connect(db_file)).run()
+    assert report.errors == []
+    assert len(report.results) == len(m.tables['h1'].DMLs) + len(m.tables['s1'].DMLs)
+    with sqlite3.connect(db_file) as conn:
+        assert conn.execute("select count(*) from h1_h").fetchone() == (10,)
+        assert conn.execute("select count(*) from s1_s").fetchone() == (10,)
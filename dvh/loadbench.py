@@ -0,0 +1,227 @@
+# coding: utf-8
+import argparse
+import datetime
+import json
+import random
+import sqlite3
+import time
+
+
+####################################################################################################################
+# End-to-end load benchmark: the generated DDL is deployed into an SQLite database (sqlite template pack,
+# optionally overridden to try other templates), then several load cycles run the generated DML over
+# synthetic staging rows, timing each table load.  Staging rows are synthesized per src from the columns
+# the tables loaded from it read (natural keys, lfc, attributes):
+#     - first cycle stages nb_rows new keys
+#     - next cycles stage nb_rows rows of which a churn share differs from previous cycle (half new keys,
+#       half changed attributes of existing keys), the others being unchanged keys
+#     - a dupes share of rows is staged twice
+# Throughput is reported as staged rows per second, per table and per table type.
+####################################################################################################################
+
+
+FIRST_DATE = datetime.date(2024, 1, 1)
+
+
+def _is_int(fmt):
+    fmt = (fmt or "").lower()
+    return fmt.startswith(("int", "number", "numeric", "bigint", "smallint")) and "," not in fmt
+
+
+class StagingColumn(object):
+    """Column of a staging src: kind is 'key' (natural key), 'lfc' (load date) or 'att'"""
+    def __init__(self, name, kind, is_int):
+        self.name = name
+        self.kind = kind
+        self.is_int = is_int
+
+    def value(self, key, version, cycle):
+        if self.kind == 'key':
+            return key if self.is_int else "K{}".format(key)
+        if self.kind == 'lfc':
+            return (FIRST_DATE + datetime.timedelta(days=cycle)).isoformat()
+        return key * 1000 + version if self.is_int else "v{0}_{1}".format(version, key)
+
+
+def staging_columns(dv_model):
+    """Return {src: {column name: StagingColumn}} read by the tables of dv_model (DDL atts must be ready)"""
+    srcs = {}
+
+    def add(table_obj, name, kind, fmt):
+        if name is not None:
+            srcs.setdefault(table_obj.src, {}).setdefault(name, StagingColumn(name, kind, _is_int(fmt)))
+
+    for table_obj in dv_model.tables_in_create_order:
+        if getattr(table_obj, 'src', None) is None:
+            continue
+        if table_obj.table_type == 'Hub':
+            for n in table_obj.nat_key:
+                add(table_obj, n.src, 'key', n.format)
+        elif table_obj.table_type == 'Link':
+            hubs_srcs = getattr(table_obj, 'nat_keys_src', None) or [[n.src for n in h.nat_key] for h in table_obj.hubs]
+            for h, hub_srcs in zip(table_obj.hubs, hubs_srcs):
+                for src, n in zip(hub_srcs, h.nat_key):
+                    add(table_obj, src, 'key', n.format)
+        elif table_obj.table_type == 'Sat':
+            key_srcs = table_obj.for_key.src if isinstance(table_obj.for_key.src, list) else [table_obj.for_key.src]
+            for src, n in zip(key_srcs, table_obj.hub.nat_key):
+                add(table_obj, src, 'key', n.format)
+            for a in getattr(table_obj, 'atts', None) or []:
+                add(table_obj, a.src, 'att', a.format)
+        for e in getattr(table_obj, 'extras', None) or []:
+            add(table_obj, e.src, 'att', e.format)
+        lfc = getattr(table_obj, 'lfc', None)
+        if lfc is not None:
+            add(table_obj, lfc.get('src'), 'lfc', 'date')
+    return srcs
+
+
+class StagingGenerator(object):
+    """Synthetic staging rows of one src, cycle after cycle (see module doc for churn and dupes)"""
+    def __init__(self, columns, nb_rows, churn=0.1, dupes=0.0, seed=0):
+        self.columns = list(columns)
+        self.nb_rows = nb_rows
+        self.churn = churn
+        self.dupes = dupes
+        self.rnd = random.Random(seed)
+        # version of attributes per key
+        self.versions = {}
+        self.cycle = 0
+
+    def rows(self):
+        """Rows of next cycle"""
+        if not self.versions:
+            keys = list(range(self.nb_rows))
+            self.versions = dict.fromkeys(keys, 0)
+        else:
+            nb_changed = int(round(self.nb_rows * self.churn))
+            nb_new = nb_changed // 2
+            nb_existing = min(self.nb_rows - nb_new, len(self.versions))
+            existing = self.rnd.sample(sorted(self.versions), nb_existing)
+            for k in existing[:nb_changed - nb_new]:
+                self.versions[k] += 1
+            first_new = max(self.versions) + 1
+            new = list(range(first_new, first_new + nb_new))
+            self.versions.update(dict.fromkeys(new, 0))
+            keys = existing + new
+        rows = [tuple(c.value(k, self.versions[k], self.cycle) for c in self.columns) for k in keys]
+        rows += [rows[i] for i in self.rnd.sample(range(len(rows)), int(round(len(rows) * self.dupes)))]
+        self.cycle += 1
+        return rows
+
+
+def _execute(con, stmts):
+    for stmt in stmts:
+        con.execute(stmt)
+    con.commit()
+
+
+def deploy(con, dv_model, template_dic):
+    """Create target tables of dv_model (and schemas of src, attached in memory) into SQLite connection con,
+    then setup their DML"""
+    dv_model.setup(template_dic, "DDL")
+    for table_obj in dv_model.tables_in_create_order:
+        _execute(con, [table_obj.DDL] + table_obj.index_stmts())
+    dv_model.setup(template_dic, "DML")
+    columns = staging_columns(dv_model)
+    schemas = sorted({src.split(".")[0] for src in columns if "." in src})
+    for schema in schemas:
+        con.execute("attach database ':memory:' as {}".format(schema))
+    for src, cols in columns.items():
+        con.execute("create table {0} ({1})".format(src, ", ".join(
+            "{} {}".format(c.name, "integer" if c.is_int else "text") for c in cols.values())))
+    return columns
+
+
+def run_load_benchmark(dv_model, template_dic, nb_rows=1000, cycles=3, churn=0.1, dupes=0.0, db=":memory:", seed=0,
+                       index_stmts=()):
+    """Deploy dv_model into SQLite database db (with additional index_stmts, ex. advised ones) and run cycles loads
+    of synthetic staging data, return results dict with elapsed seconds and rows per second, per table, table type
+    and cycle"""
+    con = sqlite3.connect(db)
+    columns = deploy(con, dv_model, template_dic)
+    _execute(con, index_stmts)
+    generators = {src: StagingGenerator(cols.values(), nb_rows, churn, dupes, seed=seed + i)
+                  for i, (src, cols) in enumerate(sorted(columns.items()))}
+    tables = {t.name: {'type': t.table_type, 'rows': 0, 'seconds': 0.0} for t in dv_model.tables_in_create_order}
+    cycles_res = []
+    for cycle in range(cycles):
+        staged = {}
+        for src, gen in generators.items():
+            rows = gen.rows()
+            con.execute("delete from {}".format(src))
+            con.executemany("insert into {0} values ({1})".format(src, ", ".join("?" * len(gen.columns))), rows)
+            staged[src] = len(rows)
+        con.commit()
+        start_cycle = time.perf_counter()
+        for table_obj in dv_model.tables_in_create_order:
+            start = time.perf_counter()
+            _execute(con, table_obj.DMLs)
+            res = tables[table_obj.name]
+            res['seconds'] += time.perf_counter() - start
+            res['rows'] += staged.get(getattr(table_obj, 'src', None), 0)
+        cycles_res.append({'staged_rows': sum(staged.values()), 'seconds': time.perf_counter() - start_cycle})
+
+    by_type = {}
+    for name, res in tables.items():
+        res['rows_per_sec'] = res['rows'] / res['seconds'] if res['seconds'] else 0.0
+        res['target_rows'] = con.execute("select count(*) from {}".format(dv_model.tables[name].physical_name())).fetchone()[0]
+        agg = by_type.setdefault(res['type'], {'tables': 0, 'rows': 0, 'seconds': 0.0})
+        agg['tables'] += 1
+        agg['rows'] += res['rows']
+        agg['seconds'] += res['seconds']
+    for agg in by_type.values():
+        agg['rows_per_sec'] = agg['rows'] / agg['seconds'] if agg['seconds'] else 0.0
+    con.close()
+    return {'params': {'rows': nb_rows, 'cycles': cycles, 'churn': churn, 'dupes': dupes, 'seed': seed,
+                       'indexes': list(index_stmts)},
+            'sqlite': sqlite3.sqlite_version,
+            'types': by_type, 'tables': tables, 'cycles': cycles_res}
+
+
+def format_results(results):
+    lines = ["{0:<8} {1:>7} {2:>10} {3:>9} {4:>10}".format("type", "tables", "rows", "seconds", "rows/s")]
+    for table_type, agg in results['types'].items():
+        lines.append("{0:<8} {1:>7} {2:>10} {3:>9.3f} {4:>10.0f}".format(
+            table_type, agg['tables'], agg['rows'], agg['seconds'], agg['rows_per_sec']))
+    for i, c in enumerate(results['cycles']):
+        lines.append("cycle {0}: {1} staged rows loaded in {2:.3f}s".format(i + 1, c['staged_rows'], c['seconds']))
+    return "\n".join(lines)
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load benchmark of generated DDL/DML on SQLite with synthetic staging data")
+    parser.add_argument("-y", "--yaml", required=True, help="YAML file defining model (or directory of model shards)")
+    parser.add_argument("--templates", action="append", default=[], metavar="DIR", help="Directory of template files overriding the sqlite pack")
+    parser.add_argument("-n", "--rows", type=int, default=10000, help="Number of staging rows per src and cycle")
+    parser.add_argument("-c", "--cycles", type=int, default=3, help="Number of load cycles")
+    parser.add_argument("--churn", type=float, default=0.1, help="Share of staging rows changed from one cycle to the next")
+    parser.add_argument("--dupes", type=float, default=0.0, help="Share of staging rows duplicated")
+    parser.add_argument("--db", default=":memory:", help="SQLite database file (default in memory)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of synthetic data")
+    parser.add_argument("--advise", action="store_true", help="Create indexes recommended by the index advisor (model and staging tables)")
+    parser.add_argument("-o", "--out", help="Json file of results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from dvh.library import TemplateLibrary
+    from dvh.model import load_dv_model
+    args = get_args(argv)
+    dv_model = load_dv_model(args.yaml)
+    templates = TemplateLibrary("sqlite", override_dirs=args.templates)
+    templates.check_model(dv_model)
+    index_stmts = []
+    if args.advise:
+        from dvh.advisor import IndexAdvisor
+        index_stmts = [a.stmt("sqlite") for a in IndexAdvisor(dv_model, templates).advise()]
+    results = run_load_benchmark(dv_model, templates, args.rows, args.cycles, args.churn, args.dupes, args.db, args.seed,
+                                 index_stmts)
+    print(format_results(results))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
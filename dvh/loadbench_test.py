@@ -0,0 +1,50 @@
+# coding: utf-8
+from dvh.loadbench import *
+from dvh.build_test import load_model, model_txt
+from dvh.library import TemplateLibrary
+
+
+def sqlite_model():
+    txt = model_txt.replace("h2: !Hub &h2", "h2: !Hub &h2\n                sur_key: {}") \
+                   .replace("!Link", "!Link\n                src: stg") \
+                   .replace("!Hub &h1", "!Hub &h1\n                src: stg") \
+                   .replace("!Hub &h2", "!Hub &h2\n                src: stg") \
+                   .replace("hub:  *h1", "hub:  *h1\n                src: stg\n"
+                            "                lfc: {name: valid_from, format: date, src: upd_dt, exp: valid_to}")
+    return load_model(txt.split("            s2: !Sat")[0])
+
+
+def test_staging_generator():
+    cols = [StagingColumn("k", 'key', True), StagingColumn("dt", 'lfc', False), StagingColumn("a", 'att', False)]
+    gen = StagingGenerator(cols, 10, churn=0.4, dupes=0.2, seed=1)
+    first = gen.rows()
+    assert len(first) == 12 and len(set(first)) == 10
+    assert first[0] == (0, '2024-01-01', 'v0_0')
+    second = gen.rows()
+    keys = {r[0] for r in second}
+    # 2 new keys, 2 changed ones, 6 unchanged
+    assert len(keys) == 10 and len(keys - {r[0] for r in first}) == 2
+    assert sum(1 for r in set(second) if r[2].startswith("v1_")) == 2
+
+
+def test_run_load_benchmark():
+    m = sqlite_model()
+    res = run_load_benchmark(m, TemplateLibrary("sqlite"), nb_rows=100, cycles=3, churn=0.2, dupes=0.1)
+    assert set(res['types']) == {'Hub', 'Link', 'Sat'}
+    assert res['types']['Hub']['tables'] == 2
+    assert [c['staged_rows'] for c in res['cycles']] == [110, 110, 110]
+    tables = res['tables']
+    assert tables['h1']['rows'] == 330 and tables['h1']['rows_per_sec'] > 0
+    # 10 new keys per cycle after the first one, whatever the duplicates
+    assert tables['h1']['target_rows'] == 120
+    # 10 changed keys per cycle, each one adding a Sat version
+    assert tables['s1']['target_rows'] == 140
+    assert "cycle 3: 110 staged rows" in format_results(res)
+
+
+def test_run_load_benchmark_with_indexes():
+    m = sqlite_model()
+    res = run_load_benchmark(m, TemplateLibrary("sqlite"), nb_rows=50, cycles=2, churn=0.2,
+                             index_stmts=["CREATE INDEX stg_h1_src_idx ON stg (h1_src)"])
+    assert res['params']['indexes'] == ["CREATE INDEX stg_h1_src_idx ON stg (h1_src)"]
+    assert res['tables']['h1']['target_rows'] == 55
@@ -2,8 +2,16 @@
 import ruamel.yaml
 import re
 import os
-from itertools import zip_longest
+import sys
+from itertools import zip_longest, repeat
+from concurrent.futures import ProcessPoolExecutor
 import argparse
+from dvh.template import compile_template
+from dvh.column import Column, Key, to_columns
+from dvh.build import IncrementalBuild
+from dvh.writer import SQLWriter
+from dvh.snapshot import load_with_snapshot
+from dvh import profiler
 
 
 ####################################################################################################################
@@ -24,52 +32,257 @@ class BaseError(Exception):
 class ModelRuleError(BaseError): pass
 #Yaml-related causing yaml.load to fail, will raise DefinitionError by model reader...
 class DefinitionError(BaseError): pass
+#All rule violations found by model validation (see dvh.validate)
+class ValidationError(ModelRuleError):
+    def __init__(self, obj, violations):
+        super().__init__(obj, "{0} violation(s) found in YAML definition:\n{1}".format(
+            len(violations), "\n".join("  " + str(v) for v in violations)))
+        self.violations = violations
+
+
+class KeywordCache(object):
+    """Memoize keyword resolution of a model keyed by (object, keyword path). Each entry records the tables
+    it was resolved from (ex. ('link', 'hubs.primary_key.name') depends on the link and its hubs), so that
+    a table changing state only invalidates entries depending on it.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        # (obj, keyword) -> (values, error, deps)
+        self._entries = {}
+        # table -> set of (obj, keyword) depending on it
+        self._dependents = {}
+        # deps being collected for entries currently resolved (nested resolution through other tables)
+        self._collecting = []
+
+    def get(self, obj, keyword, resolver):
+        """Return list of values for keyword resolved from obj, calling resolver() only on cache miss.
+        Resolution error (KeyError or AttributeError) is also memoized and raised again."""
+        key = (obj, keyword)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            deps = {obj}
+            self._collecting.append(deps)
+            try:
+                entry = (resolver(), None, deps)
+            except (KeyError, AttributeError) as err:
+                entry = (None, err, deps)
+            finally:
+                self._collecting.pop()
+            self._entries[key] = entry
+            for d in deps:
+                self._dependents.setdefault(d, set()).add(key)
+        values, err, deps = entry
+        if self._collecting:
+            self._collecting[-1].update(deps)
+        if err is not None:
+            raise err.__class__(*err.args)
+        return list(values)
+
+    def invalidate(self, table):
+        """Remove all entries resolved from table (called when table changes state)"""
+        for key in self._dependents.pop(table, ()):
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._dependents.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries),
+                'hit_ratio': self.hits / lookups if lookups else 0.0}
 
 
 class DVModel(object):
     """Represent a complete DataVault model defined inside a YAML document
     """
     def init_model(self):
-        error = False
-        for table_name, table_obj in self.tables.items():
-            df = None
-            if getattr(self, 'defaults', None) is not None:
-                df = self.defaults.get(table_obj.__class__.__name__)
-            try:
-                table_obj.init(table_name, yaml_defaults=df)
-            except (ModelRuleError, DefinitionError) as err:
-                print(err)
-                error = True
-        if error:
-            raise ModelRuleError(self, "Fix all model error(s) found in YAML definition")
-        self.tables_in_create_order = sorted(self.tables.values(), key=lambda v: v.creation_order + v.name)
+        """Init and validate all tables, raising ValidationError with all rule violations found"""
+        violations = self.validate()
+        if violations:
+            raise ValidationError(self, violations)
+        self.waves = self._dependency_waves()
+        self.tables_in_create_order = [t for wave in self.waves for t in wave]
+        self._build_reverse_indexes()
+
+    def _build_reverse_indexes(self):
+        """Index tables by the tables they refer to (per table type) and by their staging src"""
+        # referred table -> {table_type: [referring tables]}
+        self.referred_by = {}
+        # src (lower case) -> [tables]
+        self.tables_by_src = {}
+        for table_obj in self.tables_in_create_order:
+            for ref in dict.fromkeys(table_obj.references()):
+                self.referred_by.setdefault(ref, {}).setdefault(table_obj.table_type, []).append(table_obj)
+            if getattr(table_obj, 'src', None):
+                self.tables_by_src.setdefault(table_obj.src.lower(), []).append(table_obj)
+
+    def _table(self, table):
+        return self.tables[table] if isinstance(table, str) else table
+
+    def referring(self, table, table_type=None):
+        """Tables directly referring to table (object or name), only of table_type when given"""
+        by_type = self.referred_by.get(self._table(table), {})
+        if table_type is not None:
+            return list(by_type.get(table_type, []))
+        return [t for tables in by_type.values() for t in tables]
+
+    def sats_of(self, hub):
+        return self.referring(hub, 'Sat')
+
+    def links_of(self, hub):
+        return self.referring(hub, 'Link')
+
+    def satlinks_of(self, link):
+        return self.referring(link, 'SatLink')
+
+    def tables_from_src(self, src):
+        """Tables loaded from staging src (ex. 'hubref_dsa.dsa_rcent_loc')"""
+        return list(self.tables_by_src.get(src.lower(), []))
+
+    def impacted_by(self, table):
+        """All tables depending (directly or not) on table, in create order"""
+        impacted = set()
+        pending = [self._table(table)]
+        while pending:
+            for t in self.referring(pending.pop()):
+                if t not in impacted:
+                    impacted.add(t)
+                    pending.append(t)
+        return [t for t in self.tables_in_create_order if t in impacted]
+
+    def validate(self):
+        """Init tables and return list of all rule violations (see dvh.validate)"""
+        from dvh.validate import validate_model
+        self.reset_keyword_cache()
+        return validate_model(self)
+
+    def _dependency_waves(self):
+        """Topological sort of tables from their references (Link's hubs, Sat's hub..), grouped in waves: 
+        tables of a wave only depend on tables of previous waves, so can be created/loaded concurrently"""
+        tables = set(self.tables.values())
+        nb_pending_refs = {}
+        dependents = {}
+        for table_obj in self.tables.values():
+            refs = set(table_obj.references())
+            for ref in refs:
+                if ref not in tables:
+                    raise ModelRuleError(table_obj, "Refers to a table not part of model 'tables'")
+                dependents.setdefault(ref, []).append(table_obj)
+            nb_pending_refs[table_obj] = len(refs)
+
+        waves = []
+        wave = [t for t, n in nb_pending_refs.items() if n == 0]
+        while wave:
+            wave.sort(key=lambda v: v.creation_order + v.name)
+            waves.append(wave)
+            next_wave = []
+            for table_obj in wave:
+                for d in dependents.get(table_obj, []):
+                    nb_pending_refs[d] -= 1
+                    if nb_pending_refs[d] == 0:
+                        next_wave.append(d)
+            wave = next_wave
+        if sum(len(w) for w in waves) < len(tables):
+            in_cycle = sorted(t.name for t, n in nb_pending_refs.items() if n > 0)
+            raise ModelRuleError(self, "Cyclic references between tables: {}".format(", ".join(in_cycle)))
+        return waves
         
         
-    def setup(self, template_dic, sql_type="DDL"):
+    def reset_keyword_cache(self):
+        """Give all tables a new (empty) resolution cache shared by this model"""
+        self.keyword_cache = KeywordCache()
+        for table_obj in self.tables.values():
+            table_obj._keyword_cache = self.keyword_cache
+
+    def __getstate__(self):
+        # resolution cache is rebuilt after unpickling (see snapshot)
+        state = self.__dict__.copy()
+        state.pop('keyword_cache', None)
+        return state
+
+    def setup(self, template_dic, sql_type="DDL", jobs=1):
+        assert sql_type in ('DDL','DML')
+        if jobs > 1:
+            self._setup_parallel(template_dic, sql_type, jobs)
+            return
+        for table_obj in self.tables_in_create_order:
+            self.setup_table(table_obj, template_dic, sql_type)
+
+    def _setup_parallel(self, template_dic, sql_type, jobs):
+        """Setup tables of the first wave (Hubs) here, then fan out tables of next waves to a pool of
+        jobs processes, wave by wave. Each worker sends back the table atts, so the resulting model
+        (and generated SQL) is identical to the serial setup."""
+        for table_obj in self.waves[0] if self.waves else []:
+            self.setup_table(table_obj, template_dic, sql_type)
+        if len(self.waves) < 2:
+            return
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for tables in self.waves[1:]:
+                tmpls = [self.get_template(t, template_dic, sql_type) for t in tables]
+                chunksize = max(1, len(tables) // (jobs * 4))
+                states = executor.map(_setup_in_worker, tables, tmpls, repeat(sql_type, len(tables)), chunksize=chunksize)
+                for table_obj, state in zip(tables, states):
+                    table_obj.__dict__.update(state)
+                    table_obj._invalidate_keywords()
+
+    def generate(self, template_dic, writer, sql_type="DDL"):
+        """Setup tables one by one, handing over each table's SQL to writer (see SQLWriter) as soon as rendered"""
         assert sql_type in ('DDL','DML')
         for table_obj in self.tables_in_create_order:
-            tmpl = template_dic[sql_type + "_" + table_obj.__class__.__name__]
-            if getattr(table_obj, sql_type + "_custom", None) is not None:
-                tmpl = template_dic[sql_type + "_" + table_obj.__class__.__name__ + "_" + getattr(table_obj, sql_type + "_custom")]
-            if sql_type == "DDL":
-                table_obj.setup_DDL(template=tmpl)
-            elif sql_type == "DML":
-                table_obj.setup_DML(templates=tmpl)
+            self.setup_table(table_obj, template_dic, sql_type)
+            writer.write_table(table_obj, sql_type)
+
+    def setup_table(self, table_obj, template_dic, sql_type="DDL"):
+        if profiler.ACTIVE is not None:
+            with profiler.ACTIVE.table_setup(table_obj, sql_type):
+                self._setup_table(table_obj, template_dic, sql_type)
+        else:
+            self._setup_table(table_obj, template_dic, sql_type)
+
+    def _setup_table(self, table_obj, template_dic, sql_type):
+        tmpl = self.get_template(table_obj, template_dic, sql_type)
+        if sql_type == "DDL":
+            table_obj.setup_DDL(template=tmpl)
+        elif sql_type == "DML":
+            table_obj.setup_DML(templates=tmpl)
+
+    @staticmethod
+    def get_template(table_obj, template_dic, sql_type="DDL"):
+        """Return template of table_obj (its type or custom template when defined)"""
+        return template_dic[table_obj.template_name(sql_type)]
                   
     
     def generate_ddl_stmts(self, with_sequence=True):
-        if with_sequence:
-            for t in reversed(self.tables_in_creation_order):
-                print("I will drop: " + t)
         for t in self.tables_in_create_order:
+            if with_sequence and t.sequence_stmt() is not None:
+                yield t.sequence_stmt()
             yield t.DDL
+            yield from t.index_stmts()
     
-    def generate_drop_stmts(self, as_proc=True):
-        # TODO implement drop stmtm indivudal or inside a single proc. (iterating an array of table name and a single catch error)
-        pass
+    def generate_drop_stmts(self, as_proc=True, if_exists=False):
+        """Drop stmts (in reverse create order) either individual or inside a single proc 
+        (iterating an array of table name with a single catch error)"""
+        tables = list(reversed(self.tables_in_create_order))
+        if not as_proc:
+            return [t.drop_stmt(if_exists=if_exists) for t in tables]
+        names = ", ".join("'{}'".format(t.physical_name()) for t in tables)
+        proc = ("BEGIN\n"
+                "  FOR t IN (SELECT column_value AS name FROM TABLE(sys.odcivarchar2list({}))) LOOP\n"
+                "    BEGIN\n"
+                "      EXECUTE IMMEDIATE 'DROP TABLE ' || t.name || ' CASCADE CONSTRAINTS';\n"
+                "    EXCEPTION WHEN OTHERS THEN NULL;\n"
+                "    END;\n"
+                "  END LOOP;\n"
+                "END;").format(names)
+        return [proc]
 
-    def generate_ddl_grants(self, to_schema):
-        pass
+    def generate_ddl_grants(self, to_schema, privileges="SELECT"):
+        return [t.grant_stmt(to_schema, privileges) for t in self.tables_in_create_order]
     
 
 class PRESModel(object):
@@ -91,13 +304,45 @@ class Table(object):
     """
     # default's defaults (applied when no default found in yaml model)
     defaults_default = \
-        { 'Hub':  {'sur_key': dict(name="<name>_key", format="number(9)", seq="<name>_seq")},
+        { 'Hub':  {'sur_key': dict(name="<name>_key", format="number(9)", seq="<name>_seq"),
+                   'key_type': "sequence",
+                   'hash_key': dict(name="<name>_key", format="raw(16)"),
+                   'hash_fct': "standard_hash({}, 'MD5')",
+                   'hash_norm': "upper(trim({}))",
+                   'physical': {},
+                   'indexes': [],
+                   'load': {},
+                   'chunk_fct': "ora_hash({}, {})",
+                   'chunk_date': "DATE '{}'"},
           'Link': {'sur_key': dict(name="<name>_key", format= "number(9)", seq="<name>_seq"),
-                   'for_keys': dict(name="<hubs.primary_key.name>", src="<hubs.nat_key.src>")},
+                   'for_keys': dict(name="<hubs.primary_key.name>", src="<hubs.nat_key.src>"),
+                   'key_type': "sequence",
+                   'hash_key': dict(name="<name>_key", format="raw(16)"),
+                   'hash_fct': "standard_hash({}, 'MD5')",
+                   'hash_norm': "upper(trim({}))",
+                   'physical': {},
+                   'indexes': [],
+                   'load': {},
+                   'chunk_fct': "ora_hash({}, {})",
+                   'chunk_date': "DATE '{}'"},
           'Sat':  {'for_key': dict(name="<hub.primary_key.name>", src="<hub.nat_key.src>"), 
-                   'lfc': dict(name="effective_date", exp="expiration_date", format= "date")},
+                   'lfc': dict(name="effective_date", exp="expiration_date", format= "date"),
+                   'hashdiff': dict(name="hashdiff", format="raw(16)"),
+                   'hash_fct': "standard_hash({}, 'MD5')",
+                   'hash_norm': "to_char({})",
+                   'physical': {},
+                   'indexes': [],
+                   'load': {},
+                   'chunk_fct': "ora_hash({}, {})",
+                   'chunk_date': "DATE '{}'"},
           'Satlink':  "todo" 
          }
+    # atts referring to other tables (which must be setup before self)
+    ref_atts = ()
+    # column atts (mapping or list of mappings in yaml) turned into Column/Key at init
+    column_atts = {}
+    # suffix of physical table name (as used in DDL templates)
+    name_suffix = ''
                         
     rx_keyword = re.compile(r'(<[^>]+>)')
     # verify .. want any alphanumeric char or . as prefix/suffix
@@ -114,24 +359,178 @@ class Table(object):
         else:
             self.defaults = self.defaults_default[self.table_type]
         self.validate_rules()
+        self._setup_columns()
+        self._invalidate_keywords()
+
+    def _setup_columns(self):
+        """Replace yaml mappings of column atts by their compact Column/Key (see dvh.column)"""
+        for att, column_class in self.column_atts.items():
+            value = getattr(self, att, None)
+            if value is not None:
+                try:
+                    setattr(self, att, to_columns(value, column_class))
+                except ValueError as err:
+                    raise DefinitionError(self, "Invalid '{0}': {1}".format(att, err))
         
     def validate_rules(self):
         raise NotImplementedError
+
+    def template_name(self, sql_type):
+        """Name of template section used by self: its type or custom variant (ex. 'DML_Hub-withdupes')"""
+        custom = getattr(self, sql_type + "_custom", None)
+        name = sql_type + "_" + self.__class__.__name__
+        return name + "-" + custom if custom else name
+
+    def load_references(self):
+        """Tables which must be loaded before self (their keys are looked up by self DML)"""
+        return self.references()
+
+    def uses_hash_key(self):
+        """True when keys are hash of natural keys ('key_type: hash' set on table or in yaml defaults)"""
+        return (getattr(self, 'key_type', None) or self.defaults.get('key_type')) == 'hash'
+
+    def hash_exp(self, srcs, prefix="s."):
+        """Hash expression of normalized source columns srcs (see 'hash_fct' and 'hash_norm' defaults)"""
+        if not isinstance(srcs, list):
+            srcs = [srcs]
+        norm = [self.defaults['hash_norm'].format(prefix + c) for c in srcs]
+        return self.defaults['hash_fct'].format(" || '|' || ".join(norm))
+
+    def _validate_key_type(self):
+        key_type = getattr(self, 'key_type', None) or self.defaults.get('key_type')
+        if key_type not in ('sequence', 'hash'):
+            raise ModelRuleError(self, "Invalid 'key_type' {}, must be 'sequence' or 'hash'".format(key_type))
+
+    def physical_name(self):
+        return self.name + self.name_suffix
+
+    def add_index(self, name, columns, **options):
+        """Add index (when not already defined) to 'indexes', list of {name, columns, [locality, unique]} 
+        defined in yaml or derived"""
+        if getattr(self, 'indexes', None) is None:
+            self.indexes = []
+        if name not in [i['name'] for i in self.indexes]:
+            self.indexes.append(dict(name=name, columns=columns, **options))
+
+    def index_stmts(self):
+        stmts = []
+        for idx in getattr(self, 'indexes', None) or []:
+            columns = ", ".join(idx['columns']) if isinstance(idx['columns'], list) else idx['columns']
+            stmt = "CREATE {0}INDEX {1} ON {2} ({3})".format("UNIQUE " if idx.get('unique') else "", idx['name'], 
+                                                            self.physical_name(), columns)
+            if idx.get('locality'):
+                stmt += " " + idx['locality'].upper()
+            stmts.append(stmt)
+        return stmts
+
+    def _resolve_option(self, value):
+        """Resolve keywords found in a physical option value (str, list or dict)"""
+        if isinstance(value, dict):
+            return {k: self._resolve_option(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._resolve_option(v) for v in value]
+        if isinstance(value, str) and value.find('<') != -1:
+            return self.resolve(value, scalar=True, mandatory=True)
+        return value
+
+    def _setup_physical(self):
+        """Set 'physical_clause' (storage, compression and partitioning rendered after the table definition)
+        from 'physical' options of yaml defaults overridden by the table ones, and add default 'indexes'.
+            physical: {compress: true|<clause>, tablespace: ts, storage: <clause>,
+                       partition: {by: range|hash|list, column: col, interval: exp, initial: value, count: n},
+                       subpartition: {by: hash|list, column: col, count: n}}
+        """
+        physical = dict(self.defaults.get('physical') or {})
+        physical.update(getattr(self, 'physical', None) or {})
+        physical = self._resolve_option(physical)
+        clauses = []
+        if physical.get('compress'):
+            clauses.append("COMPRESS" if physical['compress'] is True else physical['compress'])
+        if physical.get('tablespace'):
+            clauses.append("TABLESPACE " + physical['tablespace'])
+        if physical.get('storage'):
+            clauses.append(physical['storage'])
+        if physical.get('partition'):
+            clauses += self._partition_clauses(physical['partition'], physical.get('subpartition'))
+        self.physical_clause = "".join("\n" + c for c in clauses)
+
+        for idx in self._resolve_option(self.defaults.get('indexes') or []):
+            self.add_index(**idx)
+
+    def _partition_clauses(self, part, subpart=None):
+        by = part.get('by', 'range').upper()
+        clauses = ["PARTITION BY {0} ({1})".format(by, part['column'])]
+        if by == 'HASH' and part.get('count'):
+            clauses[0] += " PARTITIONS {}".format(part['count'])
+        if part.get('interval'):
+            clauses.append("INTERVAL ({})".format(part['interval']))
+        if subpart:
+            clause = "SUBPARTITION BY {0} ({1})".format(subpart.get('by', 'hash').upper(), subpart['column'])
+            if subpart.get('count'):
+                clause += " SUBPARTITIONS {}".format(subpart['count'])
+            clauses.append(clause)
+        if by == 'RANGE':
+            if part.get('initial') is None:
+                raise DefinitionError(self, "Range partition requires an 'initial' partition bound")
+            clauses.append("(PARTITION {0}_p0 VALUES LESS THAN ({1}))".format(self.name, part['initial']))
+        return clauses
+
+    def load_options(self):
+        """'load' options of yaml defaults overridden by the table ones (chunks, parallel.. see dvh.chunk)"""
+        options = dict(self.defaults.get('load') or {})
+        options.update(getattr(self, 'load', None) or {})
+        return options
+
+    def drop_stmt(self, if_exists=False):
+        return "DROP TABLE {0}{1}".format("IF EXISTS " if if_exists else "", self.physical_name())
+
+    def sequence_name(self):
+        """Name of the sequence feeding sur_key (None for tables without sequence key)"""
+        sur_key = getattr(self, 'sur_key', None)
+        return sur_key.seq if sur_key is not None and not self.uses_hash_key() else None
+
+    def sequence_stmt(self):
+        """Create stmt of the sequence feeding sur_key (None for tables without sequence key)"""
+        return "CREATE SEQUENCE {}".format(self.sequence_name()) if self.sequence_name() else None
+
+    def drop_sequence_stmt(self, if_exists=False):
+        if not self.sequence_name():
+            return None
+        return "DROP SEQUENCE {0}{1}".format("IF EXISTS " if if_exists else "", self.sequence_name())
+
+    def grant_stmt(self, to_schema, privileges="SELECT"):
+        return "GRANT {0} ON {1} TO {2}".format(privileges, self.physical_name(), to_schema)
+
+    def references(self):
+        """Return list of tables referred by self (ex. Link's hubs, Sat's hub)"""
+        refs = []
+        for att in self.ref_atts:
+            ref = getattr(self, att, None)
+            if isinstance(ref, list):
+                refs += ref
+            elif ref is not None:
+                refs.append(ref)
+        return refs
             
     def setup_DDL(self, template):
         """ Setting up DDL prerequisite with mandatory/default atts
         """
         # Let subclass setup all needed atts
         self._setup_atts_for_DDL()
+        self._setup_physical()
+        self._ddl_atts_ready = True
+        self._invalidate_keywords()
         
-#        ddl_list =  template.split("\n")
-#        resolved_list = []
-#        for i, line in enumerate(ddl_list):
-#            new_lines = self.resolve_ddl_line(line)
-#            if new_lines:
-#                resolved_list += new_lines
-#        self.DDL = "\n".join(resolved_list)
+        # Fillout the DDL text from compiled template (see dvh.template)
+        self.DDL = compile_template(template, "DDL").render(self)
                     
+    def prepare_DDL_atts(self):
+        """Setup DDL atts when not done yet (prerequisite of DML, and of any table referring self)"""
+        if not getattr(self, '_ddl_atts_ready', False):
+            self._setup_atts_for_DDL()
+            self._ddl_atts_ready = True
+            self._invalidate_keywords()
+
     def _setup_atts_for_DDL(self):
         raise NotImplementedError
     
@@ -140,79 +539,25 @@ class Table(object):
         TO MERGE WITH setup_DDL...
         """
         # setup for DDL atts is a prerequisite.. A VOIR??
-        if getattr(self, "DDL", None) is None:
-            self._setup_atts_for_DDL()
+        self.prepare_DDL_atts()
         
         # Let subclass setup all needed atts
         self._setup_atts_for_DML()
+        self._invalidate_keywords()
         
-        # Fillout the DML text from template step
-        self.DMLs = []
-        for step in templates:
-            step_list =  step.splitlines()
-            new_lines = []
-            for line in step_list:
-                replaced = self.resolve_dml_line(line)
-                new_lines.append(replaced)
-            self.DMLs.append("\n".join(new_lines))
+        # Fillout the DML text from compiled template step (see dvh.template)
+        self.DMLs = [step.render(self) for step in compile_template(templates, "DML")]
+        # indexes of DMLs to commit after (chunks and direct-path statements)
+        self.commit_points = []
+        if self.load_options():
+            # chunks and hints (see dvh.chunk)
+            from dvh.chunk import load_statements
+            self.DMLs, self.commit_points = load_statements(self, self.DMLs)
                 
         
     def _setup_atts_for_DML(self):
         raise NotImplementedError
 
-    
-    def resolve_ddl_line(self, ddl_line):
-        """
-        Transform ddl_line where each keywords (including pre/sufix, 'prefix<objs.prop>suffix') is resolved from self.
-        and return as list (or None if any keyword resolved to None) 
-        """
-        kw_items = self.rx_keyword.findall(ddl_line)
-        if len(kw_items) == 0:
-            return [ddl_line]
-
-        values_per_item = [self.resolve(k, scalar=False, mandatory=False) for k in kw_items]
-        # print('substitute kw {0} en= {1}'.format(str(kw_items), str(values_per_item)))
-        
-        max_nb_values = 0
-        for values in values_per_item:
-            if not values:
-                return None
-            if len(values) > max_nb_values:
-                max_nb_values = len(values)
-
-        new_lines = []
-        for no_line in range(max_nb_values):
-            new_line = ddl_line
-            for no_item in range(len(values_per_item)):
-                newvalue = values_per_item[no_item][no_line] if len(values_per_item[no_item]) > no_line else values_per_item[no_item][0]
-                new_line = new_line.replace(kw_items[no_item], newvalue)
-            new_lines.append(new_line)
-        return new_lines    
-    
-    
-    def resolve_dml_line(self, dml_line):
-        """
-        Transform dml_line by resolving each keywords and join results into a string using ", ".
-        """
-        kw_items = self.rx_kw_presuffix.findall(dml_line)
-        #print("voici ce que he trouve " + str(kw_items))
-        if len(kw_items) == 0:
-            return dml_line
-
-        values_per_item = [self.resolve(k, scalar=False, mandatory=False) for k in kw_items]
-        print('substitute kw {0} en= {1}'.format(str(kw_items), str(values_per_item)))
-        
-        new_line = dml_line
-        for no_item, values in enumerate(values_per_item):
-            if values:
-                new_line.replace(kw_items[no_item], ", ".join(values))
-            else:
-                # TODO handle the comma after None if present..
-                # i_after = text_line.find(kw_items[i]) + len(kw_items[i])
-                new_line.replace(kw_items[no_item], "")
-        return new_line
-        
-
     def fillout_att_dict(self, att_dict, default_dict):
         """Complete att_dict by setting any missing value to default resolution. PAS CERTAIN DOIT GARDER: When resolution is a list 
         of one element, set value as this element instead of the list"""
@@ -225,6 +570,28 @@ class Table(object):
                     att_dict[k] = def_value
                      
 
+    def resolve(self, txt, scalar=False, mandatory=False):
+        """Resolve the keyword found in txt ('prefix<objs.prop>suffix') and return the list of resolved values 
+        with prefix/suffix (or only the first one when scalar=True). If no keyword found in txt, simply return it.
+        Return None when keyword resolves to None or Raise error when mandatory=True
+        """
+        idx_1 = txt.find('<')
+        if idx_1 == -1:
+            return txt if scalar else [txt]
+        idx_2 = txt.index('>', idx_1)
+        prefix = txt[:idx_1]
+        postfix = txt[idx_2+1:]
+        keyword = txt[idx_1+1:idx_2].strip()
+
+        values = self.resolve_keyword(keyword, mandatory=mandatory)
+        values = [v for v in values if v is not None] if values else None
+        if not values:
+            if mandatory:
+                raise DefinitionError(self, "Mandatory Keyword '{}' resolved to None".format(keyword))
+            return None
+        res = [prefix + str(v) + postfix for v in values]
+        return res[0] if scalar else res
+
     def resolve_text(self, txt, join_with=None):
         """Extract keyword from txt and resolve it from self (ex '<name>_key' --> self.name + "_key").
         If no keyword found in txt, simply return it. Use join_with to join list element to return string.
@@ -249,10 +616,7 @@ class Table(object):
         """Resolve keyword from self and return result as a list. 
         If impossible to resolve return None or Raise error when mandatory=True"""
         try:
-            if alt_obj:
-                result = list(self._resolve_recursive(obj=alt_obj, keyword=keyword))
-            else:
-                result = list(self._resolve_recursive(obj=self, keyword=keyword))
+            result = self._resolve_cached(obj=alt_obj if alt_obj else self, keyword=keyword)
         except (KeyError, AttributeError):
             if mandatory:
                 raise DefinitionError(self, "Mandatory Keyword '{}' resolved to None".format(keyword))
@@ -260,32 +624,54 @@ class Table(object):
                 result = None
         return result
 
+    def _resolve_cached(self, obj, keyword):
+        """Resolve keyword from obj as a list, going through the model's KeywordCache when obj is a table"""
+        cache = getattr(self, '_keyword_cache', None)
+        if cache is None or not isinstance(obj, Table):
+            return list(self._resolve_recursive(obj, keyword))
+        return cache.get(obj, keyword, lambda: list(self._resolve_recursive(obj, keyword)))
+
+    def _invalidate_keywords(self):
+        """To call whenever self changes state, so cached resolution using its atts are discarded"""
+        cache = getattr(self, '_keyword_cache', None)
+        if cache is not None:
+            cache.invalidate(self)
+
     def _resolve_recursive(self, obj, keyword):
         """Resolve keyword from object (obj.keyword1.keyword2..keywordn) to get value(s) of keywordn. 
         Raise KeyError or AttributeError when None is found at any level."""
         kw = keyword.split(".")
         # recursive STOP condition
         if len(kw) == 1:
-            if isinstance(obj, dict):
+            if isinstance(obj, (dict, Column)):
                 yield obj[keyword]
             elif isinstance(obj, list):
                 for o in obj: yield o
             else:
                 yield getattr(obj, keyword)
         else:
-            child = getattr(obj, kw[0])
+            child = obj[kw[0]] if isinstance(obj, (dict, Column)) else getattr(obj, kw[0])
+            if child is None:
+                raise AttributeError("Keyword '{}' is None for obj:'{}'".format(kw[0], obj))
             remaining_kw = ".".join(kw[1:])
             # TODO: list of list does not work properly in that case... (ex. hubs.nat_key.src) as the list are exploded.. see how to fix
+            # resolution through another table (ex. hubs.primary_key.name) is cached at that table level
             if isinstance(child, list):
-                for c in child: yield from self._resolve_recursive(c, remaining_kw)
-            elif isinstance(child, dict) or hasattr(child, '_resolve_recursive'):
-                yield from self._resolve_recursive(child, remaining_kw)
+                for c in child: yield from self._resolve_cached(c, remaining_kw)
+            elif isinstance(child, (dict, Column)) or hasattr(child, '_resolve_recursive'):
+                yield from self._resolve_cached(child, remaining_kw)
             else:
                 raise Exception("Recusrive programming error: obj:'{}', child:'{}', kw:'{}'".format(obj, child, keyword))
                         
             
+    def __getstate__(self):
+        # model's resolution cache is not sent along (ex. to worker process)
+        state = self.__dict__.copy()
+        state.pop('_keyword_cache', None)
+        return state
+
     def __repr__(self):
-        atts = ", ".join(["{0}={1}".format(k, repr(v)) for k, v in self.__dict__.items()])
+        atts = ", ".join(["{0}={1}".format(k, repr(v)) for k, v in self.__dict__.items() if k != '_keyword_cache'])
         return "{0}({1})".format(self.__class__.__name__, atts)
 
     def __str__(self):
@@ -294,32 +680,53 @@ class Table(object):
         
 class Hub(Table):
     creation_order = '1'
+    name_suffix = '_h'
+    column_atts = {'sur_key': Key, 'nat_key': Column, 'extras': Column}
               
     def validate_rules(self):
         if not isinstance( getattr(self, 'nat_key', None), list):
             raise ModelRuleError(self, "Hub must have a 'nat_key' list of at least one natural key")
-        if getattr(self, 'sur_key', None) is None and len(self.nat_key) > 1:
+        self._validate_key_type()
+        if getattr(self, 'sur_key', None) is None and len(self.nat_key) > 1 and not self.uses_hash_key():
             raise ModelRuleError(self, "Hub without 'sur_key' must have only ONE 'nat_key' (used as its PK")
+
+    def template_name(self, sql_type):
+        if sql_type == "DML" and self.uses_hash_key() and getattr(self, "DML_custom", None) is None:
+            return "DML_Hub-hashkey"
+        return super().template_name(sql_type)
             
     def _setup_atts_for_DDL(self):
-        if getattr(self, 'sur_key', None) is not None:
+        if self.uses_hash_key():
+            # hash key is the PK, computed from nat_key
+            if getattr(self, 'sur_key', None) is None:
+                self.sur_key = Key()
+            self.fillout_att_dict(self.sur_key, self.defaults['hash_key'])
+            self.sur_key.exp = self.hash_exp([n.src for n in self.nat_key])
+        elif getattr(self, 'sur_key', None) is not None:
             self.fillout_att_dict(self.sur_key, self.defaults['sur_key'])
-            self.primary_key = {'name': self.sur_key['name'], 'format': self.sur_key['format']}
-            self.unique_key = ", ".join([n['name'] for n in self.nat_key])
+        if getattr(self, 'sur_key', None) is not None:
+            self.primary_key = Column(self.sur_key.name, self.sur_key.format)
+            self.unique_key = ", ".join([n.name for n in self.nat_key])
         else:
             self.sur_key = None
-            self.primary_key = {'name': self.nat_key[0]['name'], 'format': self.nat_key[0]['format']}
+            self.primary_key = Column(self.nat_key[0].name, self.nat_key[0].format)
             self.unique_key = None
 
     def _setup_atts_for_DML(self):        
         src = self.resolve("s.<nat_key.src>", scalar=False, mandatory=True)
         tgt = self.resolve("t.<nat_key.name>", scalar=False, mandatory=True)
         self.keys_join = " and ".join( t[0] + " = " + t[1] for t in zip(src, tgt) )
+        if self.uses_hash_key():
+            self.keys_join = "t.{0} = s.{0}".format(self.sur_key.name)
+            self.keys_select = ", ".join(["{} as {}".format(self.sur_key.exp, self.sur_key.name)] + src)
         
 
             
 class Link(Table):
     creation_order = '2'
+    name_suffix = '_l'
+    ref_atts = ('hubs',)
+    column_atts = {'sur_key': Key, 'for_keys': Column, 'extras': Column}
 
     def validate_rules(self):
         if not isinstance(getattr(self, 'hubs', None), list) or len(self.hubs) < 2:
@@ -330,16 +737,28 @@ class Link(Table):
                     raise ModelRuleError(self, "Link can only refer to Hub type")
             if getattr(self, 'for_keys', None) is not None and len(self.for_keys) != len(self.hubs):
                 raise ModelRuleError(self, "Link's 'for_keys' mismatch the number of 'hubs'")
+        self._validate_key_type()
+
+    def template_name(self, sql_type):
+        if sql_type == "DML" and self.uses_hash_key() and getattr(self, "DML_custom", None) is None:
+            return "DML_Link-hashkey"
+        return super().template_name(sql_type)
+
+    def load_references(self):
+        # hash keys are computed from staging, no lookup into hubs
+        return [] if self.uses_hash_key() else self.references()
 
     def _setup_atts_for_DDL(self):
         if getattr(self, 'sur_key', None) is None:
             # sur_key is MANDATORY
-            self.sur_key = {}
-        self.fillout_att_dict(self.sur_key, self.defaults['sur_key'])
+            self.sur_key = Key()
+        # hubs with hash key are checked by model validation (see dvh.validate)
+        hash_key = self.uses_hash_key()
+        self.fillout_att_dict(self.sur_key, self.defaults['hash_key' if hash_key else 'sur_key'])
         
         # there's no list of FK name in yaml
         if getattr(self, 'for_keys', None) is None:
-            self.for_keys = [{}] * len(self.hubs)
+            self.for_keys = [Column() for _ in self.hubs]
         
         
         d_fmts = self.resolve_keyword('hubs.primary_key.format', mandatory=True)
@@ -352,48 +771,106 @@ class Link(Table):
         
         for i, k in enumerate(self.for_keys):
             self.fillout_att_dict(k, def_dict[i])
-        self.unique_key = ", ".join([v['name'] for v in self.for_keys])
+        self.unique_key = ", ".join([v.name for v in self.for_keys])
+
+        if hash_key:
+            # each FK is its hub's hash (computed from link src), and link key the hash of all of them
+            hubs_srcs = self.nat_keys_src if getattr(self, 'nat_keys_src', None) is not None else d_srcs
+            for h, k, srcs in zip(self.hubs, self.for_keys, hubs_srcs):
+                k.exp = h.hash_exp(srcs)
+            self.sur_key.exp = self.hash_exp([c for srcs in hubs_srcs for c in srcs])
 
     def _setup_atts_for_DML(self):
         if getattr(self, 'nat_keys_src', None) is not None:
             hubs_natkey_src =  [ self.src + "." + n for h in self.nat_keys_src for n in h] 
         else:    
-            hubs_natkey_src = [ self.src + "." + n['src'] for h in self.hubs for n in h.nat_key] 
-        hubs_natkey_tgt = [ h.name + "." + n['name'] for h in self.hubs for n in h.nat_key] 
+            hubs_natkey_src = [ self.src + "." + n.src for h in self.hubs for n in h.nat_key] 
+        hubs_natkey_tgt = [ h.name + "." + n.name for h in self.hubs for n in h.nat_key] 
         self.nat_keys_join = " and ".join([t[0] + " = " + t[1] for t in zip(hubs_natkey_src, hubs_natkey_tgt)])
+        # same lookup of hubs (aliased h0, h1..) from src aliased s, and the hub keys found
+        hubs_srcs = self.nat_keys_src if getattr(self, 'nat_keys_src', None) is not None else \
+                    [[n.src for n in h.nat_key] for h in self.hubs]
+        self.hubs_join = " ".join("join {0} h{1} on ({2})".format(
+            h.physical_name(), i, " and ".join("s.{0} = h{1}.{2}".format(src, i, n.name) for src, n in zip(srcs, h.nat_key)))
+            for i, (h, srcs) in enumerate(zip(self.hubs, hubs_srcs)))
+        self.hubs_keys = ", ".join("h{0}.{1}".format(i, h.primary_key.name) for i, h in enumerate(self.hubs))
         
         for_keys_tgt = self.resolve("t.<for_keys.name>", scalar=False, mandatory=True)
         # resolve only goes 2-level deep...
-        for_keys_src = ["s." + h.primary_key['name'] for h in self.hubs]
+        for_keys_src = ["s." + h.primary_key.name for h in self.hubs]
         self.keys_join = " and ".join([ t[0] + " = " + t[1] for t in zip(for_keys_tgt, for_keys_src)])
+        if self.uses_hash_key():
+            self.keys_join = "t.{0} = s.{0}".format(self.sur_key.name)
+            self.keys_select = ", ".join("{} as {}".format(k.exp, k.name) for k in [self.sur_key] + self.for_keys)
             
             
              
 class Sat(Table):
     creation_order = '3'
+    name_suffix = '_s'
+    ref_atts = ('hub',)
+    column_atts = {'for_key': Column, 'lfc': Column, 'hashdiff': Column, 'atts': Column}
 
     def validate_rules(self):
         if getattr(self, 'hub', None) is None:
             raise ModelRuleError(self, "Satellite must refer to one 'hub'")
 
+    def load_references(self):
+        # hub hash key is computed from staging, no lookup into hub
+        return [] if self.hub.uses_hash_key() else self.references()
+
+    def template_name(self, sql_type):
+        if sql_type == "DML" and getattr(self, 'hashdiff', None) is not None and getattr(self, "DML_custom", None) is None:
+            return "DML_Sat-hashdiff"
+        return super().template_name(sql_type)
+
     def _setup_atts_for_DDL(self):       
         if getattr(self, 'for_key', None) is None:
             # for_key is MANDATORY
-            self.for_key = {}
+            self.for_key = Column()
         self.fillout_att_dict(self.for_key, self.defaults['for_key'])
+        # hardcoded: FK has the format of hub's PK
+        self.for_key.format = self.hub.primary_key.format
+        if self.hub.uses_hash_key():
+            self.for_key.exp = self.hub.hash_exp(self.for_key.src)
 
         # lfc is not MANDATORY
         if getattr(self, 'lfc', None) is None:
-            self.primary_key =  self.for_key['name']
+            self.primary_key =  self.for_key.name
         else:
             self.fillout_att_dict(self.lfc, self.defaults['lfc'])
-            self.primary_key =  "{}, {}".format(self.for_key['name'], self.lfc['name'] )
+            self.primary_key =  "{}, {}".format(self.for_key.name, self.lfc.name )
+
+        # hashdiff is not MANDATORY (set at least an empty dict{} to detect changes on a single hash of atts)
+        if getattr(self, 'hashdiff', None) is not None:
+            self.fillout_att_dict(self.hashdiff, self.defaults['hashdiff'])
+            self.hashdiff.exp = self.hash_exp([a.src for a in self.atts])
+            self.add_index(self.name + "_hdiff_idx", [self.for_key.name, self.hashdiff.name])
+
+    def _setup_atts_for_DML(self):
+        if self.hub.uses_hash_key():
+            self.key_exp = self.for_key.exp
+            self.hub_join = None
+        else:
+            # hub's key looked up from its nat_key
+            srcs = self.for_key.src if isinstance(self.for_key.src, list) else [self.for_key.src]
+            self.key_exp = "h." + self.hub.primary_key.name
+            nat_join = " and ".join("s.{} = h.{}".format(src, n.name) for src, n in zip(srcs, self.hub.nat_key))
+            self.hub_join = "join {0} h on ({1})".format(self.hub.physical_name(), nat_join)
+        self.keys_join = "t.{} = {}".format(self.for_key.name, self.key_exp)
+        self.key_null = "t.{} is null".format(self.for_key.name)
+        if getattr(self, 'hashdiff', None) is not None:
+            self.atts_comp = "t.{} <> {}".format(self.hashdiff.name, self.hashdiff.exp)
+        elif getattr(self, 'atts', None):
+            self.atts_comp = " or ".join("decode(t.{}, s.{}, 0, 1) = 1".format(a.name, a.src) for a in self.atts)
             
 
     
 # TODO by inhereting from Sat!
 class SatLink(Table):
     creation_order = '4'
+    name_suffix = '_sl'
+    ref_atts = ('link',)
     defaults =  {"for_key.name": "<link.sur_key>", "lfc_dts": "effective_date" }
     
     def validate_rules(self):
@@ -408,68 +885,151 @@ class SatLink(Table):
 ####################################################################################################################
 
 
+def _setup_in_worker(table_obj, template, sql_type):
+    """Setup table_obj in worker process, and return its atts (except references to other tables)"""
+    if sql_type == "DDL":
+        table_obj.setup_DDL(template=template)
+    else:
+        table_obj.setup_DML(templates=template)
+    return {k: v for k, v in table_obj.__dict__.items() if k not in table_obj.ref_atts}
+
+
+def new_yaml_loader():
+    """Return yaml loader with DVModel and table classes registered"""
+    yaml = ruamel.yaml.YAML()
+    yaml.register_class(DVModel)
+    yaml.register_class(Hub)
+    yaml.register_class(Sat)
+    yaml.register_class(Link)
+    yaml.register_class(SatLink)       
+    return yaml
+
+
+def load_dv_model(yaml_model_file):
+    """Load DVModel from yaml_model_file (or directory of model shards) and init/validate it"""
+    if os.path.isdir(yaml_model_file):
+        from dvh.shard import load_sharded_model
+        return load_sharded_model(yaml_model_file)
+    yaml = new_yaml_loader()
+    with open(yaml_model_file) as yf:
+        dv_model = yaml.load(yf)
+    dv_model.init_model()
+    return dv_model
+
+
 DV_MODEL = None
-def init_dv_model(yaml_model_file):
+def init_dv_model(yaml_model_file, snapshot_dir=None, tables=None):
+    """Load global DV_MODEL, from its snapshot under snapshot_dir when yaml_model_file is unchanged.
+    A directory of yaml files is loaded as a sharded model, and when tables are given only these 
+    tables and their dependencies are loaded"""
     global DV_MODEL
     if not DV_MODEL:
-        yaml = ruamel.yaml.YAML()
-        yaml.register_class(DVModel)
-        yaml.register_class(Hub)
-        yaml.register_class(Sat)
-        yaml.register_class(Link)
-        yaml.register_class(SatLink)       
-        
-        with open(yaml_model_file) as yf:
-            DV_MODEL = yaml.load(yf)
-        DV_MODEL.init_model()
+        if os.path.isdir(yaml_model_file) or tables:
+            from dvh.shard import load_sharded_model
+            DV_MODEL = load_sharded_model(yaml_model_file, tables=tables)
+        elif snapshot_dir:
+            DV_MODEL = load_with_snapshot(yaml_model_file, snapshot_dir, load_dv_model)
+        else:
+            DV_MODEL = load_dv_model(yaml_model_file)
                 
     
+# Template located at the ROOT of Project
+TEMPLATE_SQL_FILE = os.path.join(os.path.dirname(__file__), os.pardir, "Template_SQL.sql")
+
 # dict with DDL and DML {'DDL_Hub': 'ddl', .., 'DML_Sat': ['step1', 'step2',..]) 
-template_SQL = None
-def get_template_SQL():
-    global template_SQL
-    if template_SQL:
-        return template_SQL
-    
-    module_path = os.path.dirname(__file__)
-    # Template located at the ROOT of Project
-    template = os.path.join(module_path, os.pardir, "Template_SQL.sql")
-    try:       
-        with open(template) as tf:
-            content = "".join(tf.readlines())
-    except NotADirectoryError:
-        raise Exception("Could not find Template SQL '{}'".format(template))
-
-    content_dic = {}
-    regex = re.compile(r'(--(DDL|DML)_[^:]+:)', re.MULTILINE)
-    for exp, _ in regex.findall(content):
-        ibegin = content.index(exp) + len(exp) + 1
-        iend = content.index(';',ibegin) + 1
-        if exp.find('DDL') != -1:
-            key = exp[exp.index('--')+2:exp.index(':')]
-            content_dic[key] = content[ibegin:iend]
-        elif exp.find('DML') != -1:
-            key = exp[exp.index('--')+2:exp.index('(')]
-            content_dic.setdefault(key, []).append(content[ibegin:iend])
-    return content_dic
-
-
-def get_args():
+def get_template_SQL(template=TEMPLATE_SQL_FILE):
+    """Return template sections of template file (parsed once, then only when file changes, see dvh.library)"""
+    from dvh.library import load_template_file
+    return dict(load_template_file(template))
+
+
+def get_args(argv=None):
     parser = argparse.ArgumentParser(description="Utility for Data Vault code generation")
-    parser.add_argument("-y", "--yaml", help="YAML file defining model and configuration")
-    parser.add_argument("output", help="Output type: refresh_ddl, refresh_dml or chrono")
-    return parser.parse_args()
-    
+    parser.add_argument("-y", "--yaml", help="YAML file defining model and configuration (or directory of model shards)")
+    parser.add_argument("-t", "--tables", action="append", help="Only generate these tables (and the tables they depend on), "
+                        "comma separated (repeatable)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of processes used to generate tables in parallel")
+    parser.add_argument("-s", "--snapshot-dir", help="Directory of model snapshots, used to skip yaml parsing when model is unchanged")
+    parser.add_argument("-c", "--cache-dir", help="Build cache directory: only tables changed since last run are regenerated")
+    parser.add_argument("-o", "--out", help="Output script file (or directory with --per-table), default to stdout")
+    parser.add_argument("--per-table", action="store_true", help="Write one file per table and sql type")
+    parser.add_argument("-z", "--gzip", action="store_true", help="Compress output file(s) with gzip")
+    parser.add_argument("--single-scan", action="store_true", help="DML: load tables sharing a staging src with one statement")
+    parser.add_argument("--dialect", default="oracle", choices=["oracle", "postgresql", "sqlite"], help="Template pack of target database")
+    parser.add_argument("--templates", action="append", default=[], metavar="DIR", help="Directory of template files overriding the dialect pack (repeatable)")
+    parser.add_argument("--profile", metavar="REPORT", help="Profile run into json file REPORT (and REPORT.folded for flamegraph)")
+    parser.add_argument("output", help="Output type: refresh_ddl, refresh_dml, validate or chrono")
+    args = parser.parse_args(argv)
+    if args.tables:
+        args.tables = [t.strip() for value in args.tables for t in value.split(",") if t.strip()]
+    return args
     
-def main():
-    # args = get_args()
-    init_dv_model("./Ex_model.yaml")
-    DV_MODEL.setup_DDL(get_template_SQL())
-    print(list(DV_MODEL.generate_ddl()))
     
+def main(argv=None):
+    args = get_args(argv)
+    if args.profile:
+        profiler.enable()
+    try:
+        _run(args)
+    finally:
+        # report written for every output type, including error exits
+        if args.profile:
+            profiler.disable().write(args.profile)
+
+
+def _run(args):
+    with profiler.phase("load_model"):
+        try:
+            init_dv_model(args.yaml or "./Ex_model.yaml", snapshot_dir=args.snapshot_dir, tables=args.tables)
+        except ValidationError as err:
+            if args.output != "validate":
+                raise
+            for v in err.violations:
+                print(v)
+            sys.exit(1)
+    from dvh.library import TemplateLibrary
+    with profiler.phase("load_templates"):
+        template_dic = TemplateLibrary(args.dialect, override_dirs=args.templates)
+    if args.output == "validate":
+        violations = template_dic.missing_templates(DV_MODEL)
+        for v in violations:
+            print(v)
+        if violations:
+            sys.exit(1)
+        print("{} table(s) validated".format(len(DV_MODEL.tables)))
+        return
+    sql_type = "DML" if args.output == "refresh_dml" else "DDL"
+    template_dic.check_model(DV_MODEL, (sql_type,))
+    # SQLite has no sequence (its pack computes keys from max + row_number)
+    with SQLWriter(args.out, per_table=args.per_table, compress=args.gzip, sequences=args.dialect != "sqlite") as writer:
+        if args.cache_dir:
+            with profiler.phase("setup_" + sql_type):
+                report = IncrementalBuild(args.cache_dir).setup(DV_MODEL, template_dic, sql_type=sql_type)
+            print(report, file=sys.stderr)
+            with profiler.phase("output"):
+                writer.write_tables(DV_MODEL.tables_in_create_order, sql_type)
+        elif args.single_scan and sql_type == "DML":
+            from dvh.multiload import single_scan_plan
+            with profiler.phase("setup_DML"):
+                plan = single_scan_plan(DV_MODEL, template_dic)
+            with profiler.phase("output"):
+                for name, stmts in plan:
+                    writer.write_stmts(name, stmts)
+        elif args.jobs > 1:
+            with profiler.phase("setup_" + sql_type):
+                DV_MODEL.setup(template_dic, sql_type=sql_type, jobs=args.jobs)
+            with profiler.phase("output"):
+                writer.write_tables(DV_MODEL.tables_in_create_order, sql_type)
+        else:
+            # setup and output interleaved, table by table
+            with profiler.phase("generate_" + sql_type):
+                DV_MODEL.generate(template_dic, writer, sql_type=sql_type)
+    profiler.count('bytes_written', writer.bytes_written)
 
 
 if __name__ == '__main__':
-    main()
+    # run from the imported module, so tables and errors are the classes used by other modules (dvh.validate..)
+    from dvh import model
+    model.main()
     
     
@@ -297,3 +297,316 @@ def test_validate_rules():
     
     
 
+def test_keyword_cache():
+    m = yaml.load(dvmodel_txt)
+    m.init_model()
+    cache = m.keyword_cache
+    assert cache.stats()['entries'] == 0
+
+    h = m.tables['h_surkey_nats']
+    l_no = m.tables['l_no']
+    l_surkey = m.tables['l_surkey']
+    h.primary_key = {'name': 'pk_h'}
+    m.tables['h_no_surkey_one_nat'].primary_key = {'name': 'pk_h2'}
+
+    assert l_no.resolve_keyword('hubs.primary_key.name', mandatory=True) == ['pk_h', 'pk_h2']
+    misses = cache.misses
+    # hubs values resolved by a previous link are reused
+    assert l_surkey.resolve_keyword('hubs.primary_key.name', mandatory=True) == ['pk_h', 'pk_h2']
+    assert cache.misses == misses + 1
+    assert cache.hits == 2
+    assert l_surkey.resolve_keyword('hubs.primary_key.name', mandatory=True) == ['pk_h', 'pk_h2']
+    assert cache.hits == 3
+
+    # failed resolution is also memoized
+    assert l_no.resolve_keyword('missing_att', mandatory=False) is None
+    assert l_no.resolve_keyword('missing_att', mandatory=False) is None
+    assert cache.hits == 4
+
+    # hub changing state invalidates entries resolved through it
+    h.primary_key = {'name': 'new_pk'}
+    h._invalidate_keywords()
+    assert l_no.resolve_keyword('hubs.primary_key.name', mandatory=True) == ['new_pk', 'pk_h2']
+    assert l_surkey.resolve_keyword('hubs.primary_key.name', mandatory=True) == ['new_pk', 'pk_h2']
+
+
+def test_keyword_cache_same_ddl():
+    m_cached = yaml.load(dvmodel_txt)
+    m_cached.init_model()
+    m_cached.setup(get_template_SQL(), sql_type="DDL")
+    assert m_cached.keyword_cache.hits > 0
+
+    m_nocache = yaml.load(dvmodel_txt)
+    m_nocache.init_model()
+    for t in m_nocache.tables.values():
+        t._keyword_cache = None
+    m_nocache.setup(get_template_SQL(), sql_type="DDL")
+    for name, t in m_cached.tables.items():
+        assert t.DDL == m_nocache.tables[name].DDL
+
+
+def test_parallel_setup_same_as_serial():
+    serial = yaml.load(dvmodel_txt)
+    serial.init_model()
+    serial.setup(get_template_SQL(), sql_type="DDL")
+
+    parallel = yaml.load(dvmodel_txt)
+    parallel.init_model()
+    parallel.setup(get_template_SQL(), sql_type="DDL", jobs=2)
+    assert [t.DDL for t in parallel.tables_in_create_order] == [t.DDL for t in serial.tables_in_create_order]
+    # atts set by workers are sent back, while references still point to the model's tables
+    s_noforkey = parallel.tables['s_noforkey']
+    assert s_noforkey.primary_key == serial.tables['s_noforkey'].primary_key
+    assert s_noforkey.hub is parallel.tables['h_surkey_nats']
+    assert parallel.tables['l_no'].hubs[1] is parallel.tables['h_no_surkey_one_nat']
+
+    hub_link_txt = """
+!DVModel
+       tables:
+            h1: !Hub &h1
+                nat_key:
+                    - {name: h1_id, format: number(9), src: h1_src}
+                src: stg.h1
+            h2: !Hub &h2
+                sur_key: {}
+                nat_key:
+                    - {name: h2_id, format: number(9), src: h2_src}
+                src: stg.h2
+            l12: !Link
+                hubs: [*h1, *h2]
+                src: stg.l12
+"""
+    serial = yaml.load(hub_link_txt)
+    serial.init_model()
+    serial.setup(get_template_SQL(), sql_type="DML")
+    parallel = yaml.load(hub_link_txt)
+    parallel.init_model()
+    parallel.setup(get_template_SQL(), sql_type="DML", jobs=2)
+    assert [t.DMLs for t in parallel.tables_in_create_order] == [t.DMLs for t in serial.tables_in_create_order]
+
+
+def test_dependency_waves():
+    m = yaml.load(dvmodel_txt)
+    m.init_model()
+    assert [[t.name for t in w] for w in m.waves] == [['h_no_surkey_one_nat', 'h_surkey_nats'],
+                                                       ['l_forkey', 'l_no', 'l_surkey', 's_forkey', 's_noforkey']]
+    assert m.tables_in_create_order == m.waves[0] + m.waves[1]
+
+    # Sat of Sat only waits for its own hub chain
+    m.tables['s_forkey'].hub = m.tables['s_noforkey']
+    m.init_model()
+    assert [[t.name for t in w] for w in m.waves] == [['h_no_surkey_one_nat', 'h_surkey_nats'],
+                                                       ['l_forkey', 'l_no', 'l_surkey', 's_noforkey'],
+                                                       ['s_forkey']]
+    m.tables['s_noforkey'].hub = m.tables['s_forkey']
+    with pytest.raises(ValidationError) as e:
+        m.init_model()
+    assert {(v.table, v.rule) for v in e.value.violations} == {('s_forkey', 'cyclic_reference'),
+                                                               ('s_noforkey', 'cyclic_reference')}
+
+    m = yaml.load(dvmodel_txt)
+    del m.tables['h_no_surkey_one_nat']
+    with pytest.raises(ModelRuleError):
+        m.init_model()
+
+
+hashkey_txt = """
+!DVModel
+       defaults:
+            Hub: {key_type: hash}
+       tables:
+            h1: !Hub &h1
+                nat_key:
+                    - {name: h1_id, format: number(9), src: h1_src}
+                    - {name: h1b_id, format: number(9), src: h1b_src}
+                src: stg.a
+            h2: !Hub &h2
+                nat_key:
+                    - {name: h2_id, format: number(9), src: h2_src}
+                src: stg.b
+            l12: !Link
+                key_type: hash
+                hubs: [*h1, *h2]
+                src: stg.l
+            s1: !Sat
+                hub:  *h1
+                src: stg.a
+"""
+
+def test_hash_keys():
+    m = yaml.load(hashkey_txt)
+    m.init_model()
+    templates = get_template_SQL()
+    m.setup(templates, sql_type="DDL")
+    h1, h2, l12, s1 = [m.tables[n] for n in ('h1', 'h2', 'l12', 's1')]
+    h1_hash = "standard_hash(upper(trim(s.h1_src)) || '|' || upper(trim(s.h1b_src)), 'MD5')"
+    assert h1.sur_key == {'name': 'h1_key', 'format': 'raw(16)', 'exp': h1_hash}
+    assert h1.DDL.splitlines()[1:4] == ["h1_key raw(16),", "h1_id number(9) NOT NULL,", "h1b_id number(9) NOT NULL,"]
+    assert l12.for_keys[0]['exp'] == h1_hash
+    assert l12.for_keys[1]['format'] == 'raw(16)'
+    assert s1.for_key['exp'] == h1_hash
+    assert "h1_key raw(16)," in s1.DDL
+    # no sequence for hash keys
+    assert [stmt for stmt in m.generate_ddl_stmts() if stmt.startswith("CREATE SEQUENCE")] == []
+
+    for t in (h1, h2, l12):
+        m.setup_table(t, templates, sql_type="DML")
+    assert h1.template_name("DML") == "DML_Hub-hashkey"
+    assert "select distinct {} as h1_key, s.h1_src, s.h1b_src".format(h1_hash) in h1.DMLs[0]
+    assert "on (t.l12_key = s.l12_key)" in l12.DMLs[0]
+    assert "join" not in l12.DMLs[0]
+    # keys computed from staging, so load does not wait for hubs
+    assert l12.load_references() == []
+    assert s1.load_references() == []
+
+
+def test_hash_keys_rules():
+    m = yaml.load(hashkey_txt.replace("key_type: hash\n", "key_type: sequence\n"))
+    m.init_model()
+    # sequence link over hash hubs is fine, but still looks up hubs
+    m.setup(get_template_SQL(), sql_type="DDL")
+    assert m.tables['l12'].load_references() == m.tables['l12'].hubs
+
+    m = yaml.load(hashkey_txt.replace("Hub: {key_type: hash}", "Hub: {key_type: sequence}"))
+    m.tables['h1'].sur_key = {}
+    # reported by validation, before any setup
+    with pytest.raises(ValidationError) as e:
+        m.init_model()
+    assert {(v.table, v.rule) for v in e.value.violations} == {('l12', 'hash_key_mismatch')}
+
+    m = yaml.load(hashkey_txt.replace("key_type: hash\n", "key_type: md5\n"))
+    with pytest.raises(ModelRuleError):
+        m.init_model()
+
+
+def test_sequence_hub_dml():
+    m = yaml.load(hashkey_txt.replace("Hub: {key_type: hash}", "Hub: {key_type: sequence}")
+                             .replace("key_type: hash\n", "key_type: sequence\n")
+                             .replace("h1: !Hub &h1\n", "h1: !Hub &h1\n                sur_key: {}\n"))
+    m.init_model()
+    templates = get_template_SQL()
+    for t in m.tables_in_create_order[:3]:
+        m.setup_table(t, templates, sql_type="DML")
+    h1, h2, l12 = [m.tables[n] for n in ('h1', 'h2', 'l12')]
+    assert h1.DMLs == ["""merge into h1_h t using 
+    (select distinct h1_src, h1b_src
+     from stg.a s
+    ) s on (s.h1_src = t.h1_id and s.h1b_src = t.h1b_id)
+when matched then update set t.last_seen_date = sysdate
+when not matched then insert(h1_key, h1_id, h1b_id, load_dts, last_seen_date, process_id, rec_src)
+values (h1_seq.nextval, s.h1_src, s.h1b_src, sysdate, sysdate, -111111, 'stg.a')
+;"""]
+    # Hub without sur_key: its nat_key is the key
+    assert "insert(h2_id, load_dts, last_seen_date, process_id, rec_src)\nvalues (s.h2_src, sysdate," in h2.DMLs[0]
+    assert "(select distinct h0.h1_key, h1.h2_id\n     from stg.l s join h1_h h0 on (s.h1_src = h0.h1_id and " \
+           "s.h1b_src = h0.h1b_id) join h2_h h1 on (s.h2_src = h1.h2_id)" in l12.DMLs[0]
+    assert "values (l12_seq.nextval, s.h1_key, s.h2_id, sysdate," in l12.DMLs[0]
+
+
+def test_sat_hashdiff():
+    txt = hashkey_txt.replace("""            s1: !Sat
+                hub:  *h1
+                src: stg.a
+""", """            s1: !Sat
+                hub:  *h1
+                src: stg.a
+                lfc: {src: batch_date}
+                hashdiff: {}
+                atts:
+                    - {name: att1, format: number, src: att1_src}
+                    - {name: att2, format: varchar2(10), src: att2_src}
+            s2: !Sat
+                hub:  *h1
+                src: stg.a
+                lfc: {src: batch_date}
+                atts:
+                    - {name: att1, format: number, src: att1_src}
+""")
+    m = yaml.load(txt)
+    m.init_model()
+    templates = get_template_SQL()
+    m.setup(templates, sql_type="DDL")
+    s1 = m.tables['s1']
+    att_hash = "standard_hash(to_char(s.att1_src) || '|' || to_char(s.att2_src), 'MD5')"
+    assert s1.hashdiff == {'name': 'hashdiff', 'format': 'raw(16)', 'exp': att_hash}
+    assert "hashdiff raw(16)," in s1.DDL
+    assert s1.index_stmts() == ["CREATE INDEX s1_hdiff_idx ON s1_s (h1_key, hashdiff)"]
+    assert "CREATE INDEX s1_hdiff_idx ON s1_s (h1_key, hashdiff)" in list(m.generate_ddl_stmts())
+    s2 = m.tables['s2']
+    assert "hashdiff" not in s2.DDL
+    assert s2.index_stmts() == []
+
+    s1.setup_DML(m.get_template(s1, templates, "DML"))
+    assert len(s1.DMLs) == 2
+    assert "where t.hashdiff <> s.hashdiff" in s1.DMLs[0]
+    assert "select standard_hash(upper(trim(s.h1_src)) || '|' || upper(trim(s.h1b_src)), 'MD5') as h1_key, {} as hashdiff, s.batch_date".format(att_hash) in s1.DMLs[0]
+    assert "insert into s1_s (h1_key, effective_date, att1, att2, hashdiff, load_dts, process_id, rec_src)" in s1.DMLs[1]
+    assert "where t.h1_key is null" in s1.DMLs[1]
+    # regular Sat: changes detected att by att
+    s2.setup_DML(m.get_template(s2, templates, "DML"))
+    assert s2.template_name("DML") == "DML_Sat"
+    assert s2.atts_comp == "decode(t.att1, s.att1_src, 0, 1) = 1"
+    assert "when matched then update set t.expiration_date = s.batch_date, t.update_process_id = -111111\n" \
+           "    where decode(t.att1, s.att1_src, 0, 1) = 1" in s2.DMLs[0]
+    assert "insert into s2_s (h1_key, effective_date, att1, load_dts, process_id, rec_src)" in s2.DMLs[1]
+
+
+def test_physical_options():
+    txt = hashkey_txt.replace("""       defaults:
+            Hub: {key_type: hash}
+""", """       defaults:
+            Hub: {key_type: hash, physical: {tablespace: dv_hub}}
+            Sat:
+                physical:
+                    compress: COMPRESS FOR QUERY HIGH
+                    partition: {column: <lfc.name>, interval: "NUMTOYMINTERVAL(1, 'MONTH')", initial: "DATE '2000-01-01'"}
+                    subpartition: {column: <for_key.name>, count: 8}
+                indexes:
+                    - {name: <name>_fk_idx, columns: [<for_key.name>], locality: local}
+""").replace("""            h2: !Hub &h2
+""", """            h2: !Hub &h2
+                physical: {tablespace: dv_big, partition: {by: hash, column: h2_key, count: 16}}
+""").replace("""            s1: !Sat
+                hub:  *h1
+                src: stg.a
+""", """            s1: !Sat
+                hub:  *h1
+                src: stg.a
+                lfc: {src: batch_date}
+""")
+    m = yaml.load(txt)
+    m.init_model()
+    m.setup(get_template_SQL(), sql_type="DDL")
+    h1, h2, s1, l12 = (m.tables[n] for n in ('h1', 'h2', 's1', 'l12'))
+    assert h1.DDL.endswith(")\nTABLESPACE dv_hub;")
+    assert h2.DDL.endswith(")\nTABLESPACE dv_big\nPARTITION BY HASH (h2_key) PARTITIONS 16;")
+    assert s1.DDL.endswith(""")
+COMPRESS FOR QUERY HIGH
+PARTITION BY RANGE (effective_date)
+INTERVAL (NUMTOYMINTERVAL(1, 'MONTH'))
+SUBPARTITION BY HASH (h1_key) SUBPARTITIONS 8
+(PARTITION s1_p0 VALUES LESS THAN (DATE '2000-01-01'));""")
+    assert s1.index_stmts() == ["CREATE INDEX s1_fk_idx ON s1_s (h1_key) LOCAL"]
+    assert l12.physical_clause == ""
+    assert l12.DDL.endswith("\n);")
+
+    s1.physical = {'partition': {'column': 'effective_date'}}
+    with pytest.raises(DefinitionError):
+        s1._setup_physical()
+
+
+def test_reverse_indexes():
+    m = yaml.load(dvmodel_txt)
+    m.init_model()
+    names = lambda tables: [t.name for t in tables]
+    assert names(m.sats_of('h_surkey_nats')) == ['s_forkey', 's_noforkey']
+    assert m.sats_of('h_no_surkey_one_nat') == []
+    assert names(m.links_of(m.tables['h_no_surkey_one_nat'])) == ['l_forkey', 'l_no', 'l_surkey']
+    assert m.satlinks_of('l_no') == []
+    assert names(m.impacted_by('h_surkey_nats')) == ['l_forkey', 'l_no', 'l_surkey', 's_forkey', 's_noforkey']
+
+    m = yaml.load(hashkey_txt)
+    m.init_model()
+    assert names(m.tables_from_src('STG.A')) == ['h1', 's1']
+    assert m.tables_from_src('stg.x') == []
+    assert names(m.referring('h1')) == ['l12', 's1']
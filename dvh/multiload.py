@@ -0,0 +1,193 @@
+# coding: utf-8
+from dvh.chunk import script_stmts
+
+
+####################################################################################################################
+# Single-scan load: tables loaded from the same staging 'src' are fed by one multi-table insert (Oracle
+# INSERT ALL) reading src once per level of references (see below), instead of one statement (and one
+# full scan of src) per table.
+# Only tables whose keys are computed from staging alone can share the scan: Hubs and Links with hash key,
+# and Sats of a Hub with hash key (having lfc), see single_scan_eligible().  Other tables keep their own DML.
+# Tables of one INSERT ALL never refer to each other (Oracle does not order the rows of its INTO clauses, so
+# a Sat row could precede the row of its Hub and fail its foreign key): a src feeding a Hub and its Sats is
+# loaded by one INSERT ALL for the Hub, then one for the Sats (see reference_levels).
+# The driving select computes every target key (and Sat hashdiff) once, and flags new rows by outer joining
+# the targets: new Hub/Link keys (first occurrence only) and new Sat versions (no current version, or a
+# changed one, first occurrence of each key and content only).  Being insert only, previous Sat versions
+# are then expired from the Sat itself (no scan of src), and Hub/Link last_seen_date is not maintained in
+# this mode.
+####################################################################################################################
+
+
+# expiration of current Sat version (as used by DML_Sat templates)
+OPEN_END = "to_date('40000101','YYYYMMDD')"
+
+
+def _prepare(table_obj):
+    for ref in table_obj.references():
+        ref.prepare_DDL_atts()
+    table_obj.prepare_DDL_atts()
+
+
+def single_scan_eligible(table_obj):
+    """True when table_obj keys are computed from its src only (no lookup into other tables at load).
+    DDL atts must be ready (see Table.prepare_DDL_atts)"""
+    if table_obj.table_type in ('Hub', 'Link'):
+        return table_obj.uses_hash_key() and getattr(table_obj, 'src', None) is not None
+    if table_obj.table_type == 'Sat':
+        lfc = getattr(table_obj, 'lfc', None)
+        return (table_obj.hub.uses_hash_key() and getattr(table_obj, 'src', None) is not None
+                and lfc is not None and lfc.get('src') is not None and lfc.get('exp') is not None)
+    return False
+
+
+def group_by_src(dv_model, tables=None, min_tables=2):
+    """Return {src: [eligible tables]} (tables in create order) for src feeding at least min_tables"""
+    selected = None if tables is None else set(tables)
+    groups = {}
+    for src, src_tables in dv_model.tables_by_src.items():
+        group = []
+        for table_obj in src_tables:
+            if selected is None or table_obj in selected:
+                _prepare(table_obj)
+                if single_scan_eligible(table_obj):
+                    group.append(table_obj)
+        if len(group) >= min_tables:
+            groups[group[0].src] = group
+    return groups
+
+
+class _Target(object):
+    """Contribution of one table to the single-scan statement: computed columns (of the driving select),
+    outer join to the table, new row condition and its INTO clause"""
+    def __init__(self, table_obj):
+        self.table = table_obj
+        self.alias = table_obj.name + "_t"
+        getattr(self, "_setup_" + table_obj.table_type.lower())()
+
+    def col(self, suffix):
+        """Name of a column computed for self in the driving select"""
+        return "{0}__{1}".format(self.table.name, suffix)
+
+    def _setup_key(self, key_name, key_exp):
+        """Hub or Link: each new key inserted once (first staging row)"""
+        self.computed = [(key_exp, self.col("key")),
+                         ("row_number() over (partition by {} order by null)".format(key_exp), self.col("rn"))]
+        self.join = "{0}.{1} = s.{2}".format(self.alias, key_name, self.col("key"))
+        self.new_cond = "{0}.{1} is null and s.{2} = 1".format(self.alias, key_name, self.col("rn"))
+
+    def _setup_hub(self):
+        t = self.table
+        self._setup_key(t.sur_key.name, t.sur_key.exp)
+        self.columns = [t.sur_key.name] + [n.name for n in t.nat_key]
+        self.values = [self.col("key")] + [n.src for n in t.nat_key]
+        self._audit_columns(last_seen=True)
+
+    def _setup_link(self):
+        t = self.table
+        self._setup_key(t.sur_key.name, t.sur_key.exp)
+        self.computed += [(k.exp, self.col("fk{}".format(i))) for i, k in enumerate(t.for_keys)]
+        self.columns = [t.sur_key.name] + [k.name for k in t.for_keys]
+        self.values = [self.col("key")] + [self.col("fk{}".format(i)) for i in range(len(t.for_keys))]
+        self._audit_columns(last_seen=True)
+
+    def _setup_sat(self):
+        """Sat: new version when no current version or a changed one, each distinct version inserted once
+        (earliest staging row of a key and content)"""
+        t = self.table
+        key_name = t.for_key.name
+        self.computed = [(t.for_key.exp, self.col("key"))]
+        self.join = "{0}.{1} = s.{2} and {0}.{3} = {4}".format(self.alias, key_name, self.col("key"), t.lfc.exp, OPEN_END)
+        atts = getattr(t, 'atts', None) or []
+        if getattr(t, 'hashdiff', None) is not None:
+            self.computed.append((t.hashdiff.exp, self.col("hdiff")))
+            changed = ["{0}.{1} <> s.{2}".format(self.alias, t.hashdiff.name, self.col("hdiff"))]
+            version = [t.for_key.exp, t.hashdiff.exp]
+        else:
+            changed = ["decode({0}.{1}, s.{2}, 0, 1) = 1".format(self.alias, a.name, a.src) for a in atts]
+            version = [t.for_key.exp] + [a.src for a in atts]
+        self.computed.append(("row_number() over (partition by {0} order by {1})".format(", ".join(version), t.lfc.src),
+                              self.col("rn")))
+        self.new_cond = "({0}) and s.{1} = 1".format(
+            " or ".join(["{0}.{1} is null".format(self.alias, key_name)] + changed), self.col("rn"))
+        self.columns = [key_name, t.lfc.name] + [a.name for a in atts]
+        self.values = [self.col("key"), t.lfc.src] + [a.src for a in atts]
+        if getattr(t, 'hashdiff', None) is not None:
+            self.columns.append(t.hashdiff.name)
+            self.values.append(self.col("hdiff"))
+        self._audit_columns(last_seen=False)
+
+    def _audit_columns(self, last_seen):
+        self.columns += ["load_dts"] + (["last_seen_date"] if last_seen else []) + ["process_id", "rec_src"]
+        self.values += ["sysdate"] + (["sysdate"] if last_seen else []) + ["-111111", "'{}'".format(self.table.src)]
+
+    def into_clause(self):
+        return ("    when {0} = 1 then\n"
+                "        into {1} ({2})\n"
+                "        values ({3})").format(self.col("new"), self.table.physical_name(),
+                                               ", ".join(self.columns), ", ".join(self.values))
+
+
+def insert_all_stmt(src, tables):
+    """Single statement loading all tables from one scan of src"""
+    for table_obj in tables:
+        _prepare(table_obj)
+    targets = [_Target(t) for t in tables]
+    intos = "\n".join(tgt.into_clause() for tgt in targets)
+    flags = ",\n".join("       case when {0} then 1 else 0 end as {1}".format(tgt.new_cond, tgt.col("new"))
+                       for tgt in targets)
+    computed = ",\n".join("             {0} as {1}".format(exp, name) for tgt in targets for exp, name in tgt.computed)
+    joins = "\n".join("left join {0} {1} on ({2})".format(tgt.table.physical_name(), tgt.alias, tgt.join)
+                      for tgt in targets)
+    return ("insert all\n{0}\n"
+            "select s.*,\n{1}\n"
+            "from (select s.*,\n{2}\n"
+            "      from {3} s) s\n"
+            "{4}\n;").format(intos, flags, computed, src, joins)
+
+
+def expire_stmt(sat):
+    """Expire current versions of sat superseded by a newer current version (read from sat only)"""
+    key, lfc_name, lfc_exp = sat.for_key.name, sat.lfc.name, sat.lfc.exp
+    newer = "from {0} n where n.{1} = t.{1} and n.{2} > t.{2}".format(sat.physical_name(), key, lfc_name)
+    return ("update {0} t set t.{1} = (select min(n.{2}) {3}), t.update_process_id = -111111\n"
+            "where t.{1} = {4}\n"
+            "  and exists (select 1 {3} and n.{1} = {4})\n;").format(sat.physical_name(), lfc_exp, lfc_name, newer, OPEN_END)
+
+
+def reference_levels(dv_model, tables):
+    """Return {table: level} of tables, level 0 referring to none of tables, level n+1 referring to tables
+    of level n at most (ex. Hubs 0, their Links and Sats 1)"""
+    selected = set(tables)
+    levels = {}
+    for table_obj in dv_model.tables_in_create_order:
+        if table_obj in selected:
+            levels[table_obj] = max([levels[r] + 1 for r in table_obj.references() if r in selected] or [0])
+    return levels
+
+
+def single_scan_plan(dv_model, template_dic, tables=None, min_tables=2):
+    """Return load plan as list of (name, [DML stmts]), by level of references (see reference_levels), so
+    that a table is loaded after the tables its foreign keys refer to.  For each level: one unit per shared
+    src (named after src, suffixed by level when src feeds several levels, with its INSERT ALL then Sat
+    expirations), then the other tables (regular DML from template_dic), in create order.
+    Tables of one INSERT ALL never refer to each other, Oracle not ordering the rows of its INTO clauses."""
+    tables = list(tables if tables is not None else dv_model.tables_in_create_order)
+    levels = reference_levels(dv_model, tables)
+    groups = group_by_src(dv_model, tables, min_tables)
+    grouped = {t for group in groups.values() for t in group}
+    plan = []
+    for level in range(max(levels.values(), default=-1) + 1):
+        for src, group in groups.items():
+            part = [t for t in group if levels[t] == level]
+            if not part:
+                continue
+            name = src if len(part) == len(group) else "{0}.{1}".format(src, level + 1)
+            stmts = [insert_all_stmt(src, part)]
+            stmts += [expire_stmt(t) for t in part if t.table_type == 'Sat']
+            plan.append((name, stmts))
+        for table_obj in dv_model.tables_in_create_order:
+            if levels.get(table_obj) == level and table_obj not in grouped:
+                dv_model.setup_table(table_obj, template_dic, sql_type="DML")
+                plan.append((table_obj.name, script_stmts(table_obj.DMLs, table_obj.commit_points)))
+    return plan
@@ -0,0 +1,99 @@
+import hashlib
+import sqlite3
+from dvh.multiload import *
+from dvh.model import get_template_SQL
+from dvh.model_test import hashkey_txt, yaml
+
+multi_txt = hashkey_txt.replace("""            s1: !Sat
+                hub:  *h1
+                src: stg.a
+""", """            s1: !Sat
+                hub:  *h1
+                src: stg.a
+                lfc: {src: batch_date}
+                hashdiff: {}
+                atts:
+                    - {name: att1, format: number, src: att1_src}
+            s2: !Sat
+                hub:  *h1
+                src: STG.A
+                lfc: {src: batch_date}
+                atts:
+                    - {name: att2, format: number, src: att2_src}
+            s3: !Sat
+                hub:  *h2
+                src: stg.b
+""")
+
+
+def load_model():
+    m = yaml.load(multi_txt)
+    m.init_model()
+    return m
+
+
+def test_group_by_src():
+    m = load_model()
+    groups = group_by_src(m)
+    assert {src: [t.name for t in g] for src, g in groups.items()} == {'stg.a': ['h1', 's1', 's2']}
+    # s3 has no lfc
+    assert not single_scan_eligible(m.tables['s3'])
+    assert group_by_src(m, tables=[m.tables['h1'], m.tables['s1']]) == {'stg.a': [m.tables['h1'], m.tables['s1']]}
+    assert group_by_src(m, min_tables=4) == {}
+
+
+def test_insert_all():
+    m = load_model()
+    h1, s1, s2 = (m.tables[n] for n in ('h1', 's1', 's2'))
+    stmt = insert_all_stmt('stg.a', [h1, s1, s2])
+    assert stmt.startswith("insert all\n    when h1__new = 1 then\n        into h1_h (h1_key, h1_id, h1b_id, load_dts, last_seen_date, process_id, rec_src)")
+    assert "        values (s1__key, batch_date, att1_src, s1__hdiff, sysdate, -111111, 'stg.a')" in stmt
+    assert stmt.count("from stg.a s") == 1
+    assert "case when h1_t.h1_key is null and s.h1__rn = 1 then 1 else 0 end as h1__new" in stmt
+    assert "case when (s1_t.h1_key is null or s1_t.hashdiff <> s.s1__hdiff) and s.s1__rn = 1 then 1 else 0 end as s1__new" in stmt
+    assert "partition by {0}, att2_src order by batch_date) as s2__rn".format(h1.sur_key.exp) in stmt
+    assert "decode(s2_t.att2, s.att2_src, 0, 1) = 1" in stmt
+    assert "left join s2_s s2_t on (s2_t.h1_key = s.s2__key and s2_t.expiration_date = to_date('40000101','YYYYMMDD'))" in stmt
+    assert expire_stmt(s1).startswith("update s1_s t set t.expiration_date = (select min(n.effective_date) from s1_s n")
+
+
+def test_single_scan_plan():
+    m = load_model()
+    plan = single_scan_plan(m, get_template_SQL(), tables=[m.tables[n] for n in ('h1', 'h2', 'l12', 's1', 's2')])
+    # a Hub and its Sats are not inserted by the same INSERT ALL (Sat foreign key to the Hub)
+    assert [name for name, _ in plan] == ['stg.a.1', 'h2', 'stg.a.2', 'l12']
+    assert len(plan[0][1]) == 1 and "into s1_s" not in plan[0][1][0]
+    assert len(plan[2][1]) == 1 + 2 and "into h1_h" not in plan[2][1][0]
+    assert plan[1][1] == m.tables['h2'].DMLs
+    assert reference_levels(m, [m.tables[n] for n in ('s1', 'h1', 'l12')]) == \
+        {m.tables['h1']: 0, m.tables['l12']: 1, m.tables['s1']: 1}
+
+    # Sats only: a single unit
+    plan = single_scan_plan(m, get_template_SQL(), tables=[m.tables[n] for n in ('s1', 's2')])
+    assert [name for name, _ in plan] == ['stg.a']
+
+
+def test_insert_all_dedupes_staging():
+    m = load_model()
+    stmt = insert_all_stmt('stg.a', [m.tables[n] for n in ('h1', 's1', 's2')])
+    # run the driving select in SQLite, with the Oracle functions it uses
+    con = sqlite3.connect(":memory:")
+    con.create_function("standard_hash", 2, lambda v, alg: hashlib.md5(str(v).encode()).hexdigest())
+    con.create_function("to_char", 1, str)
+    con.create_function("to_date", 2, lambda v, fmt: v)
+    con.create_function("decode", 4, lambda a, b, same, diff: same if a == b else diff)
+    con.execute("attach database ':memory:' as stg")
+    con.execute("create table stg.a (h1_src, h1b_src, batch_date, att1_src, att2_src)")
+    con.executemany("insert into stg.a values (?, ?, ?, ?, ?)",
+                    [(1, 1, '2024-01-02', 10, 20), (1, 1, '2024-01-01', 10, 20), (1, 1, '2024-01-01', 10, 20),
+                     (1, 1, '2024-01-03', 11, 20), (2, 2, '2024-01-01', 30, 40)])
+    con.execute("create table h1_h (h1_key)")
+    con.execute("create table s1_s (h1_key, expiration_date, hashdiff)")
+    con.execute("create table s2_s (h1_key, expiration_date, att2)")
+    select = stmt[stmt.index("select s.*,"):stmt.rindex(";")]
+    rows = con.execute("select h1_src, batch_date, h1__new, s1__new, s2__new from ({}) order by h1_src, batch_date".format(select)).fetchall()
+    new = lambda i: sorted((r[0], r[1]) for r in rows if r[i] == 1)
+    assert len(new(2)) == 2
+    # each distinct version once, from its earliest staging row
+    assert new(3) == [(1, '2024-01-01'), (1, '2024-01-03'), (2, '2024-01-01')]
+    assert new(4) == [(1, '2024-01-01'), (2, '2024-01-01')]
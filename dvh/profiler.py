@@ -0,0 +1,104 @@
+# coding: utf-8
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+
+####################################################################################################################
+# Profiling of a generation run (see --profile): wall time per phase, nested by table type during setup
+# (ex. "generate_DDL;Hub"), and counters (tables, keyword resolutions, template lines rendered, bytes
+# written).  Report is written as json and as folded stacks (one "phase;sub_phase self_microseconds"
+# line per path) which flamegraph tools read directly.
+# Disabled by default: instrumented code only checks ACTIVE once per table, nothing is recorded.
+####################################################################################################################
+
+
+# Profiler of the current run, or None when profiling is disabled
+ACTIVE = None
+
+
+class Profiler(object):
+    """Record elapsed time of nested phases (keyed by their path "a;b;c") and counters"""
+    def __init__(self):
+        # path -> [seconds, calls]
+        self.timings = {}
+        self.counters = {}
+        self._stack = []
+
+    @contextmanager
+    def phase(self, name):
+        self._stack.append(name)
+        path = ";".join(self._stack)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.timings.setdefault(path, [0.0, 0])
+            entry[0] += time.perf_counter() - start
+            entry[1] += 1
+            self._stack.pop()
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def table_setup(self, table_obj, sql_type):
+        """Time setup of table_obj under its table type, and count what it rendered"""
+        cache = getattr(table_obj, '_keyword_cache', None)
+        lookups = cache.hits + cache.misses if cache is not None else 0
+        with self.phase(table_obj.__class__.__name__):
+            yield
+        self.count('tables_' + sql_type)
+        if cache is not None:
+            self.count('keyword_resolutions', cache.hits + cache.misses - lookups)
+        if sql_type == "DDL":
+            rendered = [table_obj.DDL] if getattr(table_obj, 'DDL', None) else []
+        else:
+            rendered = getattr(table_obj, 'DMLs', None) or []
+        self.count('template_lines', sum(sql.count("\n") + 1 for sql in rendered))
+
+    def self_times(self):
+        """Return {path: seconds spent in path itself, excluding its sub phases}"""
+        selfs = {path: entry[0] for path, entry in self.timings.items()}
+        for path, entry in self.timings.items():
+            parent = path.rpartition(";")[0]
+            if parent in selfs:
+                selfs[parent] -= entry[0]
+        return selfs
+
+    def folded(self):
+        """Folded stacks lines (self time in microseconds), as read by flamegraph tools"""
+        return ["{0} {1}".format(path, max(0, int(round(s * 1e6)))) for path, s in sorted(self.self_times().items())]
+
+    def report(self):
+        return {'phases': {path: {'seconds': e[0], 'calls': e[1]} for path, e in self.timings.items()},
+                'counters': dict(self.counters)}
+
+    def write(self, path):
+        """Write json report to path, and folded stacks to path + '.folded'"""
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        with open(path + ".folded", "w") as f:
+            f.write("\n".join(self.folded()) + "\n")
+
+
+def enable():
+    global ACTIVE
+    ACTIVE = Profiler()
+    return ACTIVE
+
+
+def disable():
+    global ACTIVE
+    prof, ACTIVE = ACTIVE, None
+    return prof
+
+
+def phase(name):
+    """Context timing phase name when profiling is enabled (no-op otherwise)"""
+    return ACTIVE.phase(name) if ACTIVE is not None else nullcontext()
+
+
+def count(name, n=1):
+    if ACTIVE is not None:
+        ACTIVE.count(name, n)
@@ -0,0 +1,62 @@
+import json
+import pytest
+from dvh import model, profiler
+from dvh.build_test import load_model, model_txt
+from dvh.model import get_template_SQL
+
+
+def test_profiler_phases():
+    prof = profiler.Profiler()
+    with prof.phase("a"):
+        with prof.phase("b"):
+            pass
+        with prof.phase("b"):
+            pass
+    prof.count("x", 3)
+    assert set(prof.timings) == {"a", "a;b"}
+    assert prof.timings["a;b"][1] == 2
+    assert prof.self_times()["a"] <= prof.timings["a"][0]
+    assert [line.split()[0] for line in prof.folded()] == ["a", "a;b"]
+    assert prof.report()['counters'] == {"x": 3}
+
+
+def test_profile_setup(tmp_path):
+    m = load_model()
+    profiler.enable()
+    try:
+        with profiler.phase("setup"):
+            m.setup(get_template_SQL(), sql_type="DDL")
+        profiler.count("bytes_written", 10)
+    finally:
+        prof = profiler.disable()
+    assert profiler.ACTIVE is None
+    assert {"setup", "setup;Hub", "setup;Link", "setup;Sat"} <= set(prof.timings)
+    assert prof.counters['tables_DDL'] == len(m.tables)
+    assert prof.counters['keyword_resolutions'] > 0
+    assert prof.counters['template_lines'] == sum(t.DDL.count("\n") + 1 for t in m.tables.values())
+    prof.write(str(tmp_path / "profile.json"))
+    assert json.loads((tmp_path / "profile.json").read_text())['counters']['bytes_written'] == 10
+    assert (tmp_path / "profile.json.folded").read_text().startswith("setup ")
+
+    # disabled: nothing recorded
+    profiler.count("bytes_written", 10)
+    m.setup(get_template_SQL(), sql_type="DDL")
+    assert prof.counters['bytes_written'] == 10
+
+
+def test_profile_report_on_every_output(tmp_path):
+    yaml_file = tmp_path / "model.yaml"
+    for txt, exit_code in ((model_txt, None), (model_txt.replace("hub:  *h2", "hub:  "), 1)):
+        yaml_file.write_text(txt)
+        report = tmp_path / "profile_{}.json".format(exit_code)
+        model.DV_MODEL = None
+        try:
+            if exit_code is None:
+                model.main(["-y", str(yaml_file), "--profile", str(report), "validate"])
+            else:
+                with pytest.raises(SystemExit):
+                    model.main(["-y", str(yaml_file), "--profile", str(report), "validate"])
+        finally:
+            model.DV_MODEL = None
+        assert "load_model" in json.loads(report.read_text())['phases']
+    assert profiler.ACTIVE is None
@@ -0,0 +1,290 @@
+# coding: utf-8
+import hashlib
+import os
+import pickle
+import re
+import textwrap
+from dvh.model import DVModel, DefinitionError, new_yaml_loader
+
+
+####################################################################################################################
+# Sharded model: a DVModel split across many yaml files (ex. one per source system), each one being a
+# '!DVModel' document with its own 'tables:' (and optionally 'defaults:').  Tables of other files are
+# referred by name (ex. hubs: [rcent_organisation, rcent_location], hub: rcent_location) while yaml
+# aliases still work within a file.
+# In selective mode, only the files defining the requested tables and their dependency closure (Hubs
+# of a Link, Hub of a Sat..) are parsed, and only these tables are validated.  The 'defaults:' of every
+# file are still read (only their block is parsed), so generated code does not depend on the selection.
+# A single-file model can be split the same way into one section per table (see split_table_sections), so
+# that a long-running process (watch mode) only parses again the tables whose text changed.
+####################################################################################################################
+
+
+# table definition line, ex. "    rcent_location: !Hub &rcent_location" or "    l1: &l1 !Link"
+rx_table_def = re.compile(r'^\s+(\w+)\s*:\s*(?:&\S+\s+)?!(Hub|Link|Sat|SatLink)\b', re.MULTILINE)
+
+
+def shard_files(paths):
+    """Expand paths (yaml files or directories of *.yaml/*.yml files) into the sorted list of shard files"""
+    if isinstance(paths, str):
+        paths = [paths]
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files += sorted(os.path.join(p, f) for f in os.listdir(p) if f.endswith(('.yaml', '.yml')))
+        else:
+            files.append(p)
+    return files
+
+
+# top level 'defaults:' of a '!DVModel' document, its block being the following lines indented deeper
+rx_defaults = re.compile(r'^([ \t]*)defaults\s*:.*(?:\n(?:\1[ \t]+\S.*|[ \t]*(?:#.*)?))*', re.MULTILINE)
+
+
+def scan_table_index(files):
+    """Return {table_name: file} found by a textual scan of files (no yaml parsing)"""
+    index = {}
+    for path in files:
+        with open(path) as f:
+            for name, _ in rx_table_def.findall(f.read()):
+                index.setdefault(name, path)
+    return index
+
+
+class ShardLoader(object):
+    """Parse shard files on demand and merge their tables and defaults.
+    With doc_cache (dict kept by caller across loads, ex. watch mode), unchanged files are unpickled
+    from their previous parse instead of being parsed again."""
+    def __init__(self, files, doc_cache=None):
+        self.files = files
+        self.parsed = []
+        self.tables = {}
+        self.defaults = {}
+        self.defaults_read = []
+        self.doc_cache = doc_cache
+        self._yaml = new_yaml_loader()
+
+    def _load_doc(self, path):
+        with open(path, 'rb') as f:
+            return self.load_text(path, f.read())
+
+    def load_text(self, key, content):
+        """Parse yaml content, or unpickle its previous parse cached under key when content is unchanged"""
+        if self.doc_cache is None:
+            return self._yaml.load(content)
+        digest = hashlib.sha1(content if isinstance(content, bytes) else content.encode()).hexdigest()
+        cached = self.doc_cache.get(key)
+        if cached is not None and cached[0] == digest:
+            return pickle.loads(cached[1])
+        doc = self._yaml.load(content)
+        self.doc_cache[key] = (digest, pickle.dumps(doc, protocol=pickle.HIGHEST_PROTOCOL))
+        return doc
+
+    def parse(self, path):
+        if path in self.parsed:
+            return
+        self.parsed.append(path)
+        doc = self._load_doc(path)
+        if doc is None:
+            return
+        tables = getattr(doc, 'tables', None) if isinstance(doc, DVModel) else doc.get('tables')
+        defaults = getattr(doc, 'defaults', None) if isinstance(doc, DVModel) else doc.get('defaults')
+        for name, table_obj in (tables or {}).items():
+            if name in self.tables:
+                raise DefinitionError(path, "Table '{}' is defined in more than one shard".format(name))
+            self.tables[name] = table_obj
+        if path not in self.defaults_read:
+            self.merge_defaults(path, defaults)
+
+    def parse_defaults(self, path):
+        """Merge the defaults of path not parsed, reading only its 'defaults:' block"""
+        if path in self.parsed or path in self.defaults_read:
+            return
+        with open(path) as f:
+            match = rx_defaults.search(f.read())
+        if match is not None:
+            doc = self._yaml.load(textwrap.dedent(match.group(0)))
+            self.merge_defaults(path, doc.get('defaults') if doc else None)
+        self.defaults_read.append(path)
+
+    def merge_defaults(self, path, defaults):
+        for table_type, type_defaults in (defaults or {}).items():
+            merged = self.defaults.setdefault(table_type, {})
+            for k, v in type_defaults.items():
+                if k in merged and merged[k] != v:
+                    raise DefinitionError(path, "Conflicting defaults '{0}.{1}' between shards".format(table_type, k))
+                merged[k] = v
+
+    def parse_all(self):
+        for path in self.files:
+            self.parse(path)
+
+
+def _referred_names(table_obj, names_by_id):
+    """Names of tables referred by table_obj, either by name or through yaml alias"""
+    names = []
+    for ref in table_obj.references():
+        names.append(ref if isinstance(ref, str) else names_by_id[id(ref)])
+    return names
+
+
+def _resolve_references(table_obj, tables):
+    """Replace references by name with table objects"""
+    def lookup(ref):
+        if not isinstance(ref, str):
+            return ref
+        if ref not in tables:
+            raise DefinitionError(table_obj, "Reference to unknown table '{}'".format(ref))
+        return tables[ref]
+
+    for att in table_obj.ref_atts:
+        ref = getattr(table_obj, att, None)
+        if isinstance(ref, list):
+            setattr(table_obj, att, [lookup(r) for r in ref])
+        elif ref is not None:
+            setattr(table_obj, att, lookup(ref))
+
+
+def load_sharded_model(paths, tables=None, doc_cache=None):
+    """Load and init a DVModel from shard files (or directories). When tables is given, only these tables
+    and their dependency closure are loaded (and only required files parsed).
+    The returned model has the list of parsed files in 'shard_files'."""
+    files = shard_files(paths)
+    loader = ShardLoader(files, doc_cache)
+    if tables is None:
+        loader.parse_all()
+        selected = list(loader.tables)
+    else:
+        index = scan_table_index(files)
+        for path in files:
+            loader.parse_defaults(path)
+        selected = []
+        pending = list(tables)
+        while pending:
+            name = pending.pop(0)
+            if name in selected:
+                continue
+            if name not in loader.tables and index.get(name) is not None:
+                loader.parse(index[name])
+            if name not in loader.tables:
+                # not found by the textual scan (unusual layout), fall back on parsing all files
+                loader.parse_all()
+            if name not in loader.tables:
+                raise DefinitionError(name, "Table not found in any shard")
+            selected.append(name)
+            names_by_id = {id(t): n for n, t in loader.tables.items()}
+            pending += _referred_names(loader.tables[name], names_by_id)
+
+    dv_model = DVModel()
+    dv_model.tables = {name: loader.tables[name] for name in loader.tables if name in selected}
+    if loader.defaults:
+        dv_model.defaults = loader.defaults
+    dv_model.shard_files = loader.parsed
+    for table_obj in dv_model.tables.values():
+        _resolve_references(table_obj, dv_model.tables)
+    dv_model.init_model()
+    return dv_model
+
+
+rx_alias = re.compile(r'(?<=[\s\[,])\*([^\s,\[\]{}]+)')
+rx_anchor = re.compile(r'(?<=[\s\[,])&([^\s,\[\]{}]+)')
+
+
+def _indent(line):
+    return len(line) - len(line.lstrip())
+
+
+def split_table_sections(text):
+    """Split the text of a single-file model into (head, {table_name: section}): head being the document
+    with an empty 'tables:', each section a yaml document of one table where aliases of other tables are
+    replaced by the string '*<table_name>' (see load_sectioned_model).  Return None when the layout is not understood (a table not defined on its own
+    line, an alias to an anchor not set on a table definition..), the file being then parsed as a whole."""
+    lines = text.split("\n")
+    start = next((i for i, line in enumerate(lines) if line.strip() == "tables:"), None)
+    if start is None:
+        return None
+    tables_indent = _indent(lines[start])
+    end = len(lines)
+    table_indent = None
+    starts = []
+    for i in range(start + 1, len(lines)):
+        line = lines[i]
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        if _indent(line) <= tables_indent:
+            end = i
+            break
+        if table_indent is None:
+            table_indent = _indent(line)
+        if _indent(line) == table_indent:
+            match = rx_table_def.match(line)
+            if match is None:
+                return None
+            starts.append((i, match.group(1)))
+    if not starts:
+        return None
+
+    sections = {}
+    anchors = {}
+    for no, (i, name) in enumerate(starts):
+        section = "\n".join(lines[i:starts[no + 1][0] if no + 1 < len(starts) else end])
+        if name in sections:
+            return None
+        sections[name] = section
+        own = rx_anchor.search(lines[i][lines[i].index(":"):])
+        if own is not None:
+            anchors[own.group(1)] = name
+
+    def by_name(section):
+        local = set(rx_anchor.findall(section))
+        def replace(match):
+            if match.group(1) in local:
+                return match.group(0)
+            if match.group(1) not in anchors:
+                raise KeyError(match.group(1))
+            return "'*{}'".format(anchors[match.group(1)])
+        return "tables:\n" + rx_alias.sub(replace, section)
+
+    try:
+        sections = {name: by_name(section) for name, section in sections.items()}
+    except KeyError:
+        return None
+    head = "\n".join(lines[:start] + [lines[start].rstrip() + " {}"] + lines[end:])
+    return head, sections
+
+
+def load_sectioned_model(path, doc_cache):
+    """Load and init the DVModel of single-file model path, split into table sections (see
+    split_table_sections) parsed again only when their text changed (previous parses kept in doc_cache).
+    Fall back on parsing the file as a whole when it cannot be split."""
+    with open(path) as f:
+        text = f.read()
+    split = split_table_sections(text)
+    loader = ShardLoader([path], doc_cache)
+    if split is None:
+        dv_model = loader.load_text(path, text)
+        dv_model.init_model()
+        return dv_model
+    head, sections = split
+    dv_model = loader.load_text((path, None), head)
+    dv_model.tables = {}
+    for name, section in sections.items():
+        dv_model.tables[name] = loader.load_text((path, name), section)['tables'][name]
+    # forget sections of removed tables
+    for key in [k for k in doc_cache if isinstance(k, tuple) and k[0] == path and k[1] is not None]:
+        if key[1] not in sections:
+            del doc_cache[key]
+
+    def lookup(ref):
+        # only aliases replaced by split_table_sections, other names being left to model validation
+        return dv_model.tables[ref[1:]] if isinstance(ref, str) and ref.startswith("*") else ref
+
+    for table_obj in dv_model.tables.values():
+        for att in table_obj.ref_atts:
+            ref = getattr(table_obj, att, None)
+            if isinstance(ref, list):
+                setattr(table_obj, att, [lookup(r) for r in ref])
+            elif ref is not None:
+                setattr(table_obj, att, lookup(ref))
+    dv_model.init_model()
+    return dv_model
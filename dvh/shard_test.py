@@ -0,0 +1,151 @@
+# coding: utf-8
+import os
+import pytest
+from dvh.model import *
+from dvh.shard import *
+
+hubs_txt = """
+!DVModel
+       defaults:
+            Hub: {sur_key: {name: "<name>_sk", format: "number(12)", seq: "<name>_seq"}}
+       tables:
+            h1: !Hub &h1
+                sur_key: {}
+                nat_key:
+                    - {name: h1_id, format: number(9), src: h1_src}
+            h2: !Hub
+                nat_key:
+                    - {name: h2_id, format: number(9), src: h2_src}
+"""
+
+feed_txt = """
+!DVModel
+       tables:
+            l12: &l12 !Link
+                hubs: [h1, h2]
+            s1: !Sat
+                hub: h1
+                atts:
+                    - {name: att1, format: number, src: att1_src}
+"""
+
+other_txt = """
+!DVModel
+       tables:
+            h3: !Hub &h3
+                nat_key:
+                    - {name: h3_id, format: number(9), src: h3_src}
+            s3: !Sat
+                hub: *h3
+"""
+
+def write_shards(dir_path, shards):
+    for name, txt in shards.items():
+        with open(os.path.join(dir_path, name), 'w') as f:
+            f.write(txt)
+
+
+def test_load_all_shards(tmp_path):
+    d = str(tmp_path)
+    write_shards(d, {'a_hubs.yaml': hubs_txt, 'b_feed.yaml': feed_txt, 'c_other.yaml': other_txt})
+    m = load_sharded_model(d)
+    assert [t.name for t in m.tables_in_create_order] == ['h1', 'h2', 'h3', 'l12', 's1', 's3']
+    assert m.tables['l12'].hubs[0] is m.tables['h1']
+    assert m.tables['s1'].hub is m.tables['h1']
+    assert m.tables['s3'].hub is m.tables['h3']
+    assert len(m.shard_files) == 3
+    m.setup(get_template_SQL(), sql_type="DDL")
+    assert "h1_sk number(12)," in m.tables['h1'].DDL
+
+
+def test_load_selected_tables(tmp_path):
+    d = str(tmp_path)
+    write_shards(d, {'a_hubs.yaml': hubs_txt, 'b_feed.yaml': feed_txt, 'c_other.yaml': other_txt})
+    m = load_sharded_model(d, tables=['s1'])
+    assert sorted(m.tables) == ['h1', 's1']
+    assert [os.path.basename(f) for f in m.shard_files] == ['b_feed.yaml', 'a_hubs.yaml']
+
+    m = load_sharded_model(d, tables=['l12', 's3'])
+    assert sorted(m.tables) == ['h1', 'h2', 'h3', 'l12', 's3']
+
+
+def test_shard_errors(tmp_path):
+    d = str(tmp_path)
+    write_shards(d, {'a_hubs.yaml': hubs_txt, 'b_dup.yaml': hubs_txt})
+    with pytest.raises(DefinitionError):
+        load_sharded_model(d)
+
+    os.remove(os.path.join(d, 'b_dup.yaml'))
+    write_shards(d, {'b_feed.yaml': feed_txt.replace("hub: h1", "hub: h_unknown")})
+    with pytest.raises(DefinitionError):
+        load_sharded_model(d)
+    with pytest.raises(DefinitionError):
+        load_sharded_model(d, tables=['s1'])
+    assert sorted(load_sharded_model(d, tables=['l12']).tables) == ['h1', 'h2', 'l12']
+
+
+defaults_txt = """
+!DVModel
+       # shared defaults, in their own shard
+       defaults:
+            Hub: {sur_key: {name: "<name>_sk", format: "number(12)", seq: "<name>_seq"}}
+
+            Sat:
+                physical: {compress: true}
+"""
+
+
+def test_selected_tables_read_all_defaults(tmp_path):
+    d = str(tmp_path)
+    write_shards(d, {'a_hubs.yaml': hubs_txt.split("       tables:")[0].split("       defaults:")[0] + "       tables:" +
+                     hubs_txt.split("       tables:")[1], 'b_feed.yaml': feed_txt, 'z_defaults.yaml': defaults_txt})
+    full = load_sharded_model(d)
+    selected = load_sharded_model(d, tables=['s1'])
+    assert [os.path.basename(f) for f in selected.shard_files] == ['b_feed.yaml', 'a_hubs.yaml']
+    for m in (full, selected):
+        m.setup(get_template_SQL(), sql_type="DDL")
+        assert "h1_sk number(12)," in m.tables['h1'].DDL
+        assert m.tables['s1'].DDL.rstrip(";\n").endswith("COMPRESS")
+
+
+def test_tables_arg():
+    args = get_args(["-t", "h1", "-t", "s1,l12", "refresh_ddl"])
+    assert args.tables == ['h1', 's1', 'l12'] and args.output == "refresh_ddl"
+
+
+def test_sectioned_model(tmp_path):
+    from dvh.build_test import model_txt
+    path = str(tmp_path / "model.yaml")
+    with open(path, "w") as f:
+        f.write(model_txt.replace("       tables:", "       defaults:\n            Sat: {physical: {compress: true}}\n       tables:"))
+    head, sections = split_table_sections(open(path).read())
+    assert sorted(sections) == ['h1', 'h2', 'l12', 's1', 's2']
+    assert "hubs: ['*h1', '*h2']" in sections['l12']
+    assert "tables: {}" in head and "compress" in head
+
+    doc_cache = {}
+    templates = get_template_SQL()
+    m = load_sectioned_model(path, doc_cache)
+    full = load_dv_model(path)
+    for model in (m, full):
+        model.setup(templates, "DDL")
+    assert [(t.name, t.DDL) for t in m.tables_in_create_order] == [(t.name, t.DDL) for t in full.tables_in_create_order]
+    assert m.tables['l12'].hubs[0] is m.tables['h1']
+
+    # only the changed section is parsed again
+    cached = dict(doc_cache)
+    with open(path, "w") as f:
+        f.write(model_txt.replace("att2, format: number", "att2, format: date"))
+    m = load_sectioned_model(path, doc_cache)
+    assert [k[1] for k in doc_cache if doc_cache[k] is not cached.get(k)] == [None, 's2']
+
+    # aliases of anything else than a table: parsed as a whole
+    assert split_table_sections(model_txt.replace("- {name: att1, format: number, src: att1_src}",
+                                                  "- &a1 {name: att1, format: number, src: att1_src}")
+                                .replace("- {name: att2, format: number, src: att2_src}", "- *a1")) is None
+    # a table referred by name (instead of alias) is still reported by validation
+    with open(path, "w") as f:
+        f.write(model_txt.replace("hub:  *h2", "hub:  h2"))
+    with pytest.raises(ValidationError) as e:
+        load_sectioned_model(path, doc_cache)
+    assert [(v.table, v.rule) for v in e.value.violations] == [('s2', 'missing_reference')]
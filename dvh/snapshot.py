@@ -0,0 +1,65 @@
+# coding: utf-8
+import hashlib
+import os
+import pickle
+
+
+####################################################################################################################
+# Model snapshot: the loaded and validated DVModel is pickled (anchors/aliases between Hubs, Links and Sats
+# are kept as object references), keyed by a content hash of its yaml file. Later runs unpickle it
+# instead of parsing yaml again, as long as the yaml content is unchanged.
+####################################################################################################################
+
+
+# to bump whenever model classes change in a way incompatible with existing snapshots
+SNAPSHOT_VERSION = 3
+
+
+def yaml_digest(yaml_model_file):
+    h = hashlib.sha1("v{}:".format(SNAPSHOT_VERSION).encode('utf-8'))
+    with open(yaml_model_file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def snapshot_path(yaml_model_file, snapshot_dir, digest):
+    return os.path.join(snapshot_dir, "{0}.{1}.pickle".format(os.path.basename(yaml_model_file), digest))
+
+
+def save_snapshot(dv_model, yaml_model_file, snapshot_dir, digest=None):
+    """Pickle dv_model under snapshot_dir, replacing any previous snapshot of the same yaml file"""
+    digest = digest or yaml_digest(yaml_model_file)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = snapshot_path(yaml_model_file, snapshot_dir, digest)
+    prefix = os.path.basename(yaml_model_file) + "."
+    for f in os.listdir(snapshot_dir):
+        if f.startswith(prefix) and f.endswith(".pickle") and f != os.path.basename(path):
+            os.remove(os.path.join(snapshot_dir, f))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(dv_model, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_snapshot(yaml_model_file, snapshot_dir, digest=None):
+    """Return DVModel snapshot matching current content of yaml_model_file, or None when not found"""
+    digest = digest or yaml_digest(yaml_model_file)
+    try:
+        with open(snapshot_path(yaml_model_file, snapshot_dir, digest), 'rb') as f:
+            dv_model = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+    dv_model.reset_keyword_cache()
+    return dv_model
+
+
+def load_with_snapshot(yaml_model_file, snapshot_dir, loader):
+    """Return DVModel from its snapshot, or from loader(yaml_model_file) when yaml changed (snapshot then refreshed)"""
+    digest = yaml_digest(yaml_model_file)
+    dv_model = load_snapshot(yaml_model_file, snapshot_dir, digest)
+    if dv_model is None:
+        dv_model = loader(yaml_model_file)
+        save_snapshot(dv_model, yaml_model_file, snapshot_dir, digest)
+    return dv_model
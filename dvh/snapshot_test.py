@@ -0,0 +1,39 @@
+# coding: utf-8
+import os
+import pytest
+from dvh.model import *
+from dvh.snapshot import *
+from dvh.build_test import model_txt
+
+
+def test_load_with_snapshot(tmp_path):
+    yaml_file = os.path.join(str(tmp_path), "model.yaml")
+    snapshot_dir = os.path.join(str(tmp_path), "snapshots")
+    with open(yaml_file, 'w') as f:
+        f.write(model_txt)
+    loaded = []
+    def loader(path):
+        loaded.append(path)
+        return load_dv_model(path)
+
+    m = load_with_snapshot(yaml_file, snapshot_dir, loader)
+    assert len(loaded) == 1
+    assert len(os.listdir(snapshot_dir)) == 1
+
+    m = load_with_snapshot(yaml_file, snapshot_dir, loader)
+    assert len(loaded) == 1
+    # yaml aliases are still the same objects
+    assert m.tables['s1'].hub is m.tables['h1']
+    assert m.tables['l12'].hubs[1] is m.tables['h2']
+    assert [t.name for t in m.tables_in_create_order] == ['h1', 'h2', 'l12', 's1', 's2']
+    assert m.tables['l12']._keyword_cache is m.keyword_cache
+    m.setup(get_template_SQL(), sql_type="DDL")
+    assert m.tables['s1'].DDL.startswith("CREATE TABLE s1_s")
+
+    # changed yaml is parsed again and replaces previous snapshot
+    with open(yaml_file, 'w') as f:
+        f.write(model_txt.replace("att2_src", "att2b_src"))
+    m = load_with_snapshot(yaml_file, snapshot_dir, loader)
+    assert len(loaded) == 2
+    assert m.tables['s2'].atts[0]['src'] == 'att2b_src'
+    assert os.listdir(snapshot_dir) == [os.path.basename(snapshot_path(yaml_file, snapshot_dir, yaml_digest(yaml_file)))]
@@ -0,0 +1,120 @@
+# coding: utf-8
+import re
+
+
+####################################################################################################################
+# Compiled templates: each DDL/DML section is parsed once into literal and keyword slots,
+# then rendered per table in a single pass (no more regex scanning of every line for every table)
+####################################################################################################################
+
+
+# keyword regexes: <obj.prop> (DDL), and with its pre/suffix ex. s.<obj.prop> (DML)
+rx_keyword = re.compile(r'(<[^>]+>)')
+rx_kw_presuffix = re.compile(r'([\w\.]*<[^>]+>[\w\.]*)')
+
+
+class CompiledLine(object):
+    """One template line split into parts: even index are literal text, odd index are keyword slots
+    """
+    __slots__ = ('text', 'parts', 'keywords')
+
+    def __init__(self, text, rx):
+        self.text = text
+        self.parts = rx.split(text)
+        # distinct keywords, in order of appearance
+        self.keywords = list(dict.fromkeys(self.parts[1::2]))
+
+
+class CompiledTemplate(object):
+    """Template section (ex. 'DDL_Hub' or one step of 'DML_Hub') compiled once and rendered for any table.
+        - DDL mode: a line having any keyword resolved to None is removed, and a line with multi-value
+          keywords is expanded into as many lines as there are values (ex. <nat_keys.name> <nat_keys.format>)
+        - DML mode: keywords (including prefix/suffix, 'prefix<objs.prop>suffix') are resolved and their
+          values joined with ", " on the same line, a keyword resolved to None being removed with its list
+          separator (ex. 'insert(<sur_key.name>, <nat_key.name>' of a Hub without sur_key)
+    """
+    def __init__(self, text, sql_type="DDL"):
+        assert sql_type in ('DDL', 'DML')
+        self.text = text
+        self.sql_type = sql_type
+        rx = rx_keyword if sql_type == "DDL" else rx_kw_presuffix
+        self.lines = [CompiledLine(line, rx) for line in text.split("\n")]
+        self.keywords = list(dict.fromkeys(k for line in self.lines for k in line.keywords))
+
+    def render(self, table):
+        """Return the text of this template resolved from table"""
+        # each keyword is resolved only once per table, even when used on many lines
+        values = {k: table.resolve(k, scalar=False, mandatory=False) for k in self.keywords}
+        render_line = self._render_ddl_line if self.sql_type == "DDL" else self._render_dml_line
+        new_lines = []
+        for line in self.lines:
+            new_lines += render_line(line, values)
+        return "\n".join(new_lines)
+
+    @staticmethod
+    def _render_ddl_line(line, values):
+        if not line.keywords:
+            return [line.text]
+        nb_values = 0
+        for k in line.keywords:
+            if not values[k]:
+                return []
+            nb_values = max(nb_values, len(values[k]))
+        parts = list(line.parts)
+        new_lines = []
+        for no_line in range(nb_values):
+            for i in range(1, len(parts), 2):
+                kw_values = values[line.parts[i]]
+                parts[i] = kw_values[no_line] if len(kw_values) > no_line else kw_values[0]
+            new_lines.append("".join(parts))
+        return new_lines
+
+    @staticmethod
+    def _render_dml_line(line, values):
+        if not line.keywords:
+            return [line.text]
+        parts = list(line.parts)
+        for i in range(1, len(parts), 2):
+            kw_values = values[line.parts[i]]
+            if kw_values:
+                parts[i] = ", ".join(kw_values)
+                continue
+            parts[i] = ""
+            parts[i - 1], parts[i + 1] = _drop_separator(parts[i - 1], parts[i + 1])
+        return ["".join(parts)]
+
+    def __repr__(self):
+        return "CompiledTemplate(sql_type={0}, nb_lines={1})".format(self.sql_type, len(self.lines))
+
+
+rx_sep_after = re.compile(r'^\s*,\s*')
+rx_sep_before = re.compile(r',\s*$')
+
+
+def _drop_separator(before, after):
+    """Remove the list separator around a removed keyword: the one following it, else the one preceding it"""
+    if rx_sep_after.match(after):
+        return before, rx_sep_after.sub("", after, count=1)
+    return rx_sep_before.sub("", before, count=1), after
+
+
+# compiled templates cached by (sql_type, text), so identical sections are only parsed once per process
+_compiled_cache = {}
+def compile_template(template, sql_type="DDL"):
+    """Return the CompiledTemplate for template (or list of CompiledTemplate for a list of DML steps).
+    Already compiled templates are returned as is."""
+    if isinstance(template, CompiledTemplate):
+        return template
+    if isinstance(template, list):
+        return [compile_template(t, sql_type) for t in template]
+    key = (sql_type, template)
+    compiled = _compiled_cache.get(key)
+    if compiled is None:
+        compiled = _compiled_cache[key] = CompiledTemplate(template, sql_type)
+    return compiled
+
+
+def compile_templates(template_dic):
+    """Compile every section of a template dict (as returned by get_template_SQL()),
+    using the section key prefix ('DDL_' or 'DML_') to select the mode"""
+    return {k: compile_template(v, k[:3]) for k, v in template_dic.items()}
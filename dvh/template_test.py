@@ -0,0 +1,144 @@
+# coding: utf-8
+import pytest
+from dvh.model import *
+from dvh.template import *
+from dvh.template import _drop_separator
+import ruamel.yaml
+
+yaml = ruamel.yaml.YAML()
+yaml.register_class(DVModel)
+yaml.register_class(Hub)
+yaml.register_class(Sat)
+yaml.register_class(Link)
+
+model_txt = """
+!DVModel
+       tables:
+            h1: !Hub &h1
+                sur_key: {}
+                nat_keys:
+                    - {name: h11_id, format: number(3), src: h11_src}
+                    - {name: h12_id, format: char(10), src: h12_src}
+                nat_key:
+                    - {name: h11_id, format: number(3), src: h11_src}
+                    - {name: h12_id, format: char(10), src: h12_src}
+                src: stg.h1
+            h2: !Hub &h2
+                nat_key:
+                    - {name: h2_id, format: number(9), src: h2_src}
+                src: stg.h2
+            l12: !Link
+                hubs: [*h1, *h2]
+                for_keys:
+                    - {name: f1}
+                    - {name: f2}
+                src: stg.l12
+            s1: !Sat
+                hub:  *h1
+                atts:
+                    - {name: att1, format: number, src: att1_src}
+                    - {name: att2, format: varchar2(10), src: att2_src}
+                lfc: {name: valid_from, format: date, src: lfc_src}
+"""
+
+def load_model():
+    m = yaml.load(model_txt)
+    m.init_model()
+    for t in m.tables_in_create_order:
+        t._setup_atts_for_DDL()
+    return m
+
+
+def resolve_ddl_line(table_obj, ddl_line):
+    """Reference (line by line) rendering of a DDL line: list of lines (None if any keyword resolved to None)"""
+    kw_items = table_obj.rx_keyword.findall(ddl_line)
+    values_per_item = [table_obj.resolve(k, scalar=False, mandatory=False) for k in kw_items]
+    if not all(values_per_item):
+        return None
+    new_lines = []
+    for no_line in range(max([len(values) for values in values_per_item] or [1])):
+        new_line = ddl_line
+        for kw, values in zip(kw_items, values_per_item):
+            new_line = new_line.replace(kw, values[no_line] if len(values) > no_line else values[0])
+        new_lines.append(new_line)
+    return new_lines
+
+
+def resolve_dml_line(table_obj, dml_line):
+    """Reference (line by line) rendering of a DML line: values joined using ", " """
+    new_line = dml_line
+    for kw in table_obj.rx_kw_presuffix.findall(dml_line):
+        values = table_obj.resolve(kw, scalar=False, mandatory=False)
+        if values:
+            new_line = new_line.replace(kw, ", ".join(values))
+        else:
+            # keyword removed with its list separator
+            while kw in new_line:
+                before, after = new_line.split(kw, 1)
+                before, after = _drop_separator(before, after)
+                new_line = before + after
+    return new_line
+
+
+def test_compile_splits_literals_and_keywords():
+    ct = compile_template("CREATE TABLE <name>_h (\n<nat_keys.name> <nat_keys.format> NOT NULL,\n);", "DDL")
+    assert len(ct.lines) == 3
+    assert ct.lines[0].parts == ["CREATE TABLE ", "<name>", "_h ("]
+    assert ct.lines[1].keywords == ["<nat_keys.name>", "<nat_keys.format>"]
+    assert ct.lines[2].keywords == []
+    assert ct.keywords == ["<name>", "<nat_keys.name>", "<nat_keys.format>"]
+
+    dml = compile_template("select s.<nat_keys.src> from <src> s", "DML")
+    assert dml.keywords == ["s.<nat_keys.src>", "<src>"]
+
+
+def test_compile_is_cached():
+    txt = "CREATE TABLE <name>_s ();"
+    assert compile_template(txt, "DDL") is compile_template(txt, "DDL")
+    assert compile_template(txt, "DML") is not compile_template(txt, "DDL")
+    ct = compile_template(txt)
+    assert compile_template(ct) is ct
+    steps = compile_template(["a <name>;", "b <name>;"], "DML")
+    assert [s.sql_type for s in steps] == ["DML", "DML"]
+
+
+def test_render_ddl_multi_value_expansion():
+    h1 = load_model().tables['h1']
+    ct = compile_template("CREATE TABLE <name>_h (\n<nat_keys.name> <nat_keys.format> NOT NULL,\n<extras.name> <extras.format>,\n);", "DDL")
+    assert ct.render(h1).splitlines() == ["CREATE TABLE h1_h (",
+                                          "h11_id number(3) NOT NULL,",
+                                          "h12_id char(10) NOT NULL,",
+                                          ");"]
+    l12 = load_model().tables['l12']
+    ct = compile_template("CONSTRAINT <name>_<hubs.name>_fk FOREIGN KEY (<for_keys.name>) REFERENCE <hubs.name>_h,", "DDL")
+    assert ct.render(l12).splitlines() == ["CONSTRAINT l12_h1_fk FOREIGN KEY (f1) REFERENCE h1_h,",
+                                           "CONSTRAINT l12_h2_fk FOREIGN KEY (f2) REFERENCE h2_h,"]
+
+
+def test_render_dml_joins_values():
+    h1 = load_model().tables['h1']
+    ct = compile_template("select s.<nat_keys.src>, <lfc.src>\nfrom <src> s", "DML")
+    assert ct.render(h1) == "select s.h11_src, s.h12_src\nfrom stg.h1 s"
+    # keyword resolved to None removed with its separator
+    h2 = load_model().tables['h2']
+    ct = compile_template("insert(<sur_key.name>, <nat_key.name>) values (<sur_key.seq>.nextval, s.<nat_key.src>)", "DML")
+    assert ct.render(h2) == "insert(h2_id) values (s.h2_src)"
+    assert resolve_dml_line(h2, ct.lines[0].text) == "insert(h2_id) values (s.h2_src)"
+
+
+def test_render_same_as_line_resolution():
+    m = load_model()
+    template_dic = get_template_SQL()
+    for t in m.tables_in_create_order:
+        for key, tmpl in template_dic.items():
+            if key[4:].split("-")[0] != t.__class__.__name__:
+                continue
+            if key.startswith("DDL"):
+                expected = []
+                for line in tmpl.split("\n"):
+                    expected += resolve_ddl_line(t, line) or []
+                assert compile_template(tmpl, "DDL").render(t) == "\n".join(expected)
+            else:
+                for step in tmpl:
+                    expected = "\n".join(resolve_dml_line(t, line) for line in step.split("\n"))
+                    assert compile_template(step, "DML").render(t) == expected
@@ -0,0 +1,138 @@
+# coding: utf-8
+from dvh.model import ModelRuleError, DefinitionError
+
+
+####################################################################################################################
+# Model validation in one pass: every table is initialized (Table.init with its own rules), then model-wide
+# rules are checked using indexes built once (physical names, tables of the model), so the cost stays
+# linear in model size.  All violations are returned (not raised at the first one), so a CI run on a large
+# model reports the complete list.
+####################################################################################################################
+
+
+class Violation(object):
+    """One rule violated by table (its name), rule being the rule id (ex. 'duplicate_physical_name')"""
+    __slots__ = ('table', 'rule', 'message')
+
+    def __init__(self, table, rule, message):
+        self.table = table
+        self.rule = rule
+        self.message = message
+
+    def to_dict(self):
+        return {'table': self.table, 'rule': self.rule, 'message': self.message}
+
+    def __eq__(self, other):
+        return isinstance(other, Violation) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return "Violation({0}, {1}: {2})".format(self.table, self.rule, self.message)
+
+    def __str__(self):
+        return "{0}: [{1}] {2}".format(self.table, self.rule, self.message)
+
+
+class ModelValidator(object):
+    """Init all tables of dv_model and check model-wide rules, see validate()"""
+    def __init__(self, dv_model):
+        self.dv_model = dv_model
+        self.violations = []
+
+    def add(self, table_obj, rule, message):
+        self.violations.append(Violation(getattr(table_obj, 'name', None), rule, message))
+
+    def validate(self):
+        """Return list of Violation found"""
+        self.violations = []
+        defaults = getattr(self.dv_model, 'defaults', None) or {}
+        valid = []
+        for table_name, table_obj in self.dv_model.tables.items():
+            try:
+                table_obj.init(table_name, yaml_defaults=defaults.get(table_obj.__class__.__name__))
+                valid.append(table_obj)
+            except (ModelRuleError, DefinitionError) as err:
+                table_obj.name = table_name
+                self.add(table_obj, 'table_rule', err.msg)
+
+        # indexes
+        model_tables = {id(t) for t in self.dv_model.tables.values()}
+        tables_by_physical_name = {}
+        for table_obj in self.dv_model.tables.values():
+            tables_by_physical_name.setdefault(table_obj.physical_name().lower(), []).append(table_obj)
+
+        for name, tables in tables_by_physical_name.items():
+            if len(tables) > 1:
+                for table_obj in tables:
+                    others = ", ".join(t.name for t in tables if t is not table_obj)
+                    self.add(table_obj, 'duplicate_physical_name',
+                             "Physical name '{0}' also used by: {1}".format(name, others))
+        nb_violations = len(self.violations)
+        valid_tables = set(valid)
+        for table_obj in valid:
+            self._check_references(table_obj, model_tables)
+            if table_obj.table_type == 'Link':
+                self._check_link_roles(table_obj)
+                self._check_link_key_type(table_obj, valid_tables)
+        if not any(v.rule == 'missing_reference' for v in self.violations[nb_violations:]):
+            self._check_cycles(valid)
+        return self.violations
+
+    def _check_references(self, table_obj, model_tables):
+        for ref in table_obj.references():
+            if isinstance(ref, str):
+                self.add(table_obj, 'missing_reference', "Refers to '{}' by name instead of yaml alias".format(ref))
+            elif id(ref) not in model_tables:
+                # table outside model was never init, so only known by its yaml anchor (if any)
+                anchor = getattr(ref, '_yaml_anchor', None)
+                label = getattr(ref, 'name', None) or getattr(anchor, 'value', None) or '?'
+                self.add(table_obj, 'missing_reference',
+                         "Refers to {0} '{1}' not part of model 'tables'".format(ref.__class__.__name__, label))
+
+    def _check_link_roles(self, link):
+        """A Hub referred more than once needs role names: for_keys with distinct 'name'"""
+        positions = {}
+        for i, h in enumerate(link.hubs):
+            positions.setdefault(id(h), []).append(i)
+        for_keys = getattr(link, 'for_keys', None) or []
+        for pos in positions.values():
+            if len(pos) < 2:
+                continue
+            roles = [for_keys[i].get('name') if i < len(for_keys) else None for i in pos]
+            if None in roles or len(set(roles)) < len(roles):
+                hub_name = getattr(link.hubs[pos[0]], 'name', '?')
+                self.add(link, 'duplicate_hub_without_role',
+                         "Hub '{}' referred more than once requires distinct role names in 'for_keys'".format(hub_name))
+
+    def _check_link_key_type(self, link, valid_tables):
+        """A Link with hash key computes its hubs' keys from staging, so they must be hash keys too.
+        Only hubs initialized as valid model tables are checked (others are reported by their own rules)"""
+        if link.uses_hash_key():
+            for h in link.hubs:
+                if h in valid_tables and not h.uses_hash_key():
+                    self.add(link, 'hash_key_mismatch',
+                             "Link with hash key must refer to Hubs with hash key, not '{}'".format(h.name))
+
+    def _check_cycles(self, tables):
+        """Tables are created/loaded after the tables they refer to, so references must not loop.
+        Only references between tables are followed (invalid ones being reported by their own rules)"""
+        selected = set(tables)
+        refs = {t: set(r for r in t.references() if r in selected) for t in tables}
+        nb_pending_refs = {t: len(refs[t]) for t in tables}
+        dependents = {}
+        for table_obj in tables:
+            for ref in refs[table_obj]:
+                dependents.setdefault(ref, []).append(table_obj)
+        ready = [t for t, n in nb_pending_refs.items() if n == 0]
+        while ready:
+            for d in dependents.get(ready.pop(), []):
+                nb_pending_refs[d] -= 1
+                if nb_pending_refs[d] == 0:
+                    ready.append(d)
+        for table_obj in tables:
+            if nb_pending_refs[table_obj] > 0:
+                self.add(table_obj, 'cyclic_reference', "Refers to tables referring back to it")
+
+
+def validate_model(dv_model):
+    """Init tables of dv_model and return list of all Violation found (empty when model is valid)"""
+    return ModelValidator(dv_model).validate()
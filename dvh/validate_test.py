@@ -0,0 +1,99 @@
+import pytest
+from dvh.validate import *
+from dvh.model import ValidationError, new_yaml_loader
+
+yaml = new_yaml_loader()
+
+model_txt = """
+!DVModel
+       tables:
+            h1: !Hub &h1
+                nat_key:
+                    - {name: h1_id, format: number(9), src: h1_src}
+                src: stg.a
+            h2: !Hub &h2
+                nat_key:
+                    - {name: h2_id, format: number(9), src: h2_src}
+                src: stg.b
+            l12: !Link
+                hubs: [*h1, *h2]
+                src: stg.l
+            s1: !Sat
+                hub: *h1
+                src: stg.a
+"""
+
+
+def test_valid_model():
+    m = yaml.load(model_txt)
+    assert validate_model(m) == []
+    m.init_model()
+
+
+def test_all_violations_reported():
+    txt = model_txt + """
+            H1: !Hub
+                src: stg.c
+            l11: !Link
+                hubs: [*h1, *h1, *h2]
+                src: stg.l
+            l11_roles: !Link
+                hubs: [*h1, *h1]
+                for_keys: [{name: from_key}, {name: to_key}]
+                src: stg.l
+            s2: !Sat
+                hub: !Hub &h9
+                    nat_key:
+                        - {name: h9_id, format: number(9), src: h9_src}
+                src: stg.a
+            s3: !Sat
+                hub: h2
+                src: stg.a
+"""
+    m = yaml.load(txt)
+    violations = validate_model(m)
+    assert [(v.table, v.rule) for v in violations] == [
+        ('H1', 'table_rule'),
+        ('h1', 'duplicate_physical_name'),
+        ('H1', 'duplicate_physical_name'),
+        ('l11', 'duplicate_hub_without_role'),
+        ('s2', 'missing_reference'),
+        ('s3', 'missing_reference')]
+    assert violations[1].message == "Physical name 'h1_h' also used by: H1"
+    assert violations[4].to_dict() == {'table': 's2', 'rule': 'missing_reference',
+                                       'message': "Refers to Hub 'h9' not part of model 'tables'"}
+
+    with pytest.raises(ValidationError) as e:
+        m.init_model()
+    assert e.value.violations == violations
+    assert "6 violation(s) found" in str(e.value)
+
+
+def test_setup_rules_reported():
+    txt = model_txt.replace("src: stg.l", "src: stg.l\n                key_type: hash")
+    m = yaml.load(txt)
+    assert [(v.table, v.rule) for v in validate_model(m)] == [('l12', 'hash_key_mismatch'), ('l12', 'hash_key_mismatch')]
+
+    m = yaml.load(txt.replace("       tables:", "       defaults:\n            Hub: {key_type: hash}\n       tables:"))
+    assert validate_model(m) == []
+
+    # hub outside model 'tables' is never initialized: only reported as missing reference
+    m = yaml.load(txt.replace("hubs: [*h1, *h2]", "hubs: [*h1, !Hub {nat_key: [{name: h9_id, format: number(9), src: h9_src}]}]"))
+    assert [(v.table, v.rule) for v in validate_model(m)] == [('l12', 'missing_reference'), ('l12', 'hash_key_mismatch')]
+
+    # a Sat referring to a Sat referring back to it
+    m = yaml.load(model_txt + """
+            s2: !Sat
+                hub: *h1
+                src: stg.a
+""")
+    m.tables['s1'].hub, m.tables['s2'].hub = m.tables['s2'], m.tables['s1']
+    assert [(v.table, v.rule) for v in validate_model(m)] == [('s1', 'cyclic_reference'), ('s2', 'cyclic_reference')]
+
+
+def test_invalid_hub_not_reported_as_cycle():
+    # h1 fails its own rule: tables referring to it are not flagged as cyclic
+    m = yaml.load(model_txt.replace("""                nat_key:
+                    - {name: h1_id, format: number(9), src: h1_src}
+""", "", 1))
+    assert [(v.table, v.rule) for v in validate_model(m)] == [('h1', 'table_rule')]
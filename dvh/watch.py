@@ -0,0 +1,161 @@
+# coding: utf-8
+import argparse
+import os
+import sys
+import time
+from dvh.build import IncrementalBuild
+from dvh.library import TemplateLibrary
+from dvh.model import BaseError, TEMPLATE_SQL_FILE
+from dvh.shard import load_sectioned_model, load_sharded_model, shard_files
+from dvh.writer import SQLWriter
+
+
+####################################################################################################################
+# Watch mode: a long-running process keeping model and templates loaded, which polls the yaml model
+# (file, or directory of shards) and the template file, and on change re-validates the model and renders
+# again only the tables whose fingerprint changed (own definition, template or referred tables, see
+# IncrementalBuild.fingerprints).  Output is one file per table and sql type (<out>/<sql_type>/<name>.sql),
+# so unchanged tables are not written again.  With a directory of shards, only changed shard files are
+# parsed again (others are unpickled from their previous parse), and a single-file model is split into
+# one section per table, only changed sections being parsed again.
+# An invalid model is reported and previous output kept, until the next change.
+####################################################################################################################
+
+
+class WatchReport(object):
+    """Outcome of one refresh: changed files, tables rendered or removed per sql type, errors"""
+    def __init__(self, changed_files):
+        self.changed_files = changed_files
+        self.rendered = {}
+        self.removed = {}
+        self.errors = []
+        self.elapsed = 0.0
+
+    def __str__(self):
+        rendered = sum(len(v) for v in self.rendered.values())
+        lines = ["{0} file(s) changed, {1} table SQL rendered, {2} removed in {3:.3f}s".format(
+            len(self.changed_files), rendered, sum(len(v) for v in self.removed.values()), self.elapsed)]
+        lines += ["  {}".format(e) for e in self.errors]
+        return "\n".join(lines)
+
+
+class Watcher(object):
+    """Keep the model of yaml_path warm, regenerating SQL of sql_types into out_dir when files change"""
+    def __init__(self, yaml_path, out_dir, sql_types=("DDL", "DML"), template_file=TEMPLATE_SQL_FILE, compress=False):
+        self.yaml_path = yaml_path
+        self.template_file = template_file
+        self.sql_types = sql_types
+        self.writer = SQLWriter(out_dir, per_table=True, compress=compress)
+        self.dv_model = None
+        self.template_dic = None
+        # rendered fingerprint per sql_type and table name
+        self.rendered = {sql_type: {} for sql_type in sql_types}
+        self._mtimes = {}
+        self._doc_cache = {}
+        self._build = IncrementalBuild(cache_dir=None)
+
+    def watched_files(self):
+        files = shard_files(self.yaml_path) if os.path.isdir(self.yaml_path) else [self.yaml_path]
+        return files + [self.template_file]
+
+    def changed_files(self):
+        """Return files changed (or added/removed) since previous call"""
+        mtimes = {}
+        for path in self.watched_files():
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                pass
+        changed = sorted(p for p in set(mtimes) | set(self._mtimes) if mtimes.get(p) != self._mtimes.get(p))
+        self._mtimes = mtimes
+        return changed
+
+    def _load_model(self):
+        if os.path.isdir(self.yaml_path):
+            return load_sharded_model(self.yaml_path, doc_cache=self._doc_cache)
+        return load_sectioned_model(self.yaml_path, doc_cache=self._doc_cache)
+
+    def refresh(self, force=False):
+        """Reload what changed and render changed tables, return WatchReport (None when nothing changed)"""
+        changed = self.changed_files()
+        if not changed and not force:
+            return None
+        report = WatchReport(changed)
+        start = time.perf_counter()
+        try:
+            if self.template_dic is None:
+                self.template_dic = TemplateLibrary(files=[self.template_file])
+            if self.template_file in changed:
+                self.template_dic.refresh()
+            if self.dv_model is None or any(p != self.template_file for p in changed):
+                self.dv_model = self._load_model()
+        except Exception as err:
+            # invalid yaml or model: keep previous output
+            report.errors.append(err)
+            report.elapsed = time.perf_counter() - start
+            return report
+
+        for sql_type in self.sql_types:
+            self._render(sql_type, report)
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    def _render(self, sql_type, report):
+        fingerprints = self._build.fingerprints(self.dv_model, self.template_dic, sql_type)
+        previous = self.rendered[sql_type]
+        current = {}
+        rendered = report.rendered.setdefault(sql_type, [])
+        for table_obj in self.dv_model.tables_in_create_order:
+            fingerprint = fingerprints[table_obj]['fingerprint']
+            if previous.get(table_obj.name) == fingerprint:
+                current[table_obj.name] = fingerprint
+                continue
+            try:
+                for ref in table_obj.references():
+                    ref.prepare_DDL_atts()
+                self.dv_model.setup_table(table_obj, self.template_dic, sql_type)
+            except (BaseError, KeyError) as err:
+                report.errors.append("{0} {1}: {2!r}".format(sql_type, table_obj.name, err))
+                continue
+            self.writer.write_table(table_obj, sql_type, release=False)
+            current[table_obj.name] = fingerprint
+            rendered.append(table_obj.name)
+        report.removed[sql_type] = sorted(set(previous) - set(t.name for t in self.dv_model.tables_in_create_order))
+        for name in report.removed[sql_type]:
+            path = os.path.join(self.writer.path, sql_type, name + ".sql" + (".gz" if self.writer.compress else ""))
+            if os.path.exists(path):
+                os.remove(path)
+        self.rendered[sql_type] = current
+
+    def run(self, interval=0.5, max_refreshes=None, out=sys.stderr):
+        """Poll files every interval seconds (forever, or until max_refreshes refreshes were done)"""
+        nb_refreshes = 0
+        while max_refreshes is None or nb_refreshes < max_refreshes:
+            report = self.refresh()
+            if report is not None:
+                nb_refreshes += 1
+                print(report, file=out)
+            else:
+                time.sleep(interval)
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser(description="Watch a Data Vault model and regenerate its SQL on change")
+    parser.add_argument("-y", "--yaml", required=True, help="YAML file defining model (or directory of model shards)")
+    parser.add_argument("-o", "--out", required=True, help="Output directory (one file per table and sql type)")
+    parser.add_argument("--template", default=TEMPLATE_SQL_FILE, help="Template SQL file")
+    parser.add_argument("--sql-types", nargs="+", default=["DDL", "DML"], choices=["DDL", "DML"])
+    parser.add_argument("-i", "--interval", type=float, default=0.5, help="Polling interval in seconds")
+    parser.add_argument("-z", "--gzip", action="store_true", help="Compress output files with gzip")
+    parser.add_argument("--once", action="store_true", help="Generate once and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = get_args(argv)
+    watcher = Watcher(args.yaml, args.out, tuple(args.sql_types), args.template, compress=args.gzip)
+    watcher.run(args.interval, max_refreshes=1 if args.once else None)
+
+
+if __name__ == '__main__':
+    main()
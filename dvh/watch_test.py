@@ -0,0 +1,76 @@
+import os
+from dvh.watch import *
+from dvh.build_test import model_txt
+
+
+def touch(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+    # make sure mtime changes even on coarse grained file systems
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+
+def test_watch_regenerates_changed_tables(tmp_path):
+    yaml_file = str(tmp_path / "model.yaml")
+    template_file = str(tmp_path / "Template_SQL.sql")
+    out = tmp_path / "out"
+    touch(yaml_file, model_txt)
+    with open(TEMPLATE_SQL_FILE) as f:
+        template_txt = f.read()
+    touch(template_file, template_txt)
+
+    watcher = Watcher(yaml_file, str(out), sql_types=("DDL",), template_file=template_file)
+    report = watcher.refresh()
+    assert sorted(report.rendered['DDL']) == ['h1', 'h2', 'l12', 's1', 's2']
+    assert report.errors == []
+    assert "att2 number" in (out / "DDL" / "s2.sql").read_text()
+    assert watcher.refresh() is None
+
+    # changed Sat only, the other table sections are not parsed again
+    cached_h1 = watcher._doc_cache[(yaml_file, 'h1')]
+    touch(yaml_file, model_txt.replace("{name: att2, format: number, src: att2_src}",
+                                       "{name: att2, format: varchar2(5), src: att2_src}"))
+    report = watcher.refresh()
+    assert report.rendered['DDL'] == ['s2']
+    assert watcher._doc_cache[(yaml_file, 'h1')] is cached_h1
+    assert "att2 varchar2(5)" in (out / "DDL" / "s2.sql").read_text()
+
+    # changed Hub: its Link and Sat follow
+    touch(yaml_file, model_txt.replace("format: number(3)", "format: number(4)"))
+    report = watcher.refresh()
+    assert report.rendered['DDL'] == ['h1', 'l12', 's1', 's2']
+
+    # invalid model: reported, output kept
+    touch(yaml_file, model_txt.replace("hub:  *h2", "hub:  "))
+    report = watcher.refresh()
+    assert report.errors and report.rendered == {}
+    assert (out / "DDL" / "s2.sql").exists()
+
+    # removed table, and template change of Sats only
+    touch(yaml_file, model_txt.split("            s2: !Sat")[0])
+    touch(template_file, template_txt.replace("--DDL_Sat:\n", "--DDL_Sat:\n-- sat\n"))
+    report = watcher.refresh()
+    assert report.removed['DDL'] == ['s2']
+    assert not (out / "DDL" / "s2.sql").exists()
+    touch(template_file, template_txt)
+    report = watcher.refresh()
+    assert report.rendered['DDL'] == ['s1']
+
+
+def test_watch_shards(tmp_path):
+    shard_dir = tmp_path / "model"
+    shard_dir.mkdir()
+    hubs, others = model_txt.split("            l12: !Link")
+    touch(str(shard_dir / "a.yaml"), hubs)
+    touch(str(shard_dir / "b.yaml"), "!DVModel\n       tables:\n            l12: !Link" +
+          others.replace("*h1", "h1").replace("*h2", "h2"))
+    watcher = Watcher(str(shard_dir), str(tmp_path / "out"), sql_types=("DDL",))
+    report = watcher.refresh()
+    assert len(report.rendered['DDL']) == 5
+    cached_a = watcher._doc_cache[str(shard_dir / "a.yaml")]
+    touch(str(shard_dir / "b.yaml"), (shard_dir / "b.yaml").read_text().replace("att1, format: number", "att1, format: date"))
+    report = watcher.refresh()
+    assert report.rendered['DDL'] == ['s1']
+    # a.yaml not parsed again
+    assert watcher._doc_cache[str(shard_dir / "a.yaml")] is cached_a
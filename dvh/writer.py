@@ -0,0 +1,79 @@
+# coding: utf-8
+import gzip
+import os
+import sys
+
+
+####################################################################################################################
+# Streaming output: statements are written as soon as a table is rendered, and the table then releases
+# its text, so memory does not grow with the total size of generated SQL
+####################################################################################################################
+
+
+class SQLWriter(object):
+    """Write generated DDL/DML either:
+        - into one concatenated script (path is a file, or None for stdout)
+        - into one file per table and sql type (per_table=True, path is a directory: <path>/<sql_type>/<name>.sql)
+    With compress=True, files are written gzip'ed ('.gz' suffix added).
+    With sequences=True, the DDL of a table having a sequence key starts with its CREATE SEQUENCE.
+    """
+    def __init__(self, path=None, per_table=False, compress=False, sequences=True):
+        if per_table and path is None:
+            raise ValueError("per_table output requires a directory path")
+        self.path = path
+        self.per_table = per_table
+        self.compress = compress
+        self.sequences = sequences
+        self.nb_tables = 0
+        self.bytes_written = 0
+        self._script = None
+
+    def _open(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if self.compress:
+            return gzip.open(path if path.endswith(".gz") else path + ".gz", "wt")
+        return open(path, "w")
+
+    def _script_file(self):
+        if self._script is None:
+            self._script = sys.stdout if self.path is None else self._open(self.path)
+        return self._script
+
+    def write_table(self, table_obj, sql_type="DDL", release=True):
+        """Write table_obj's generated DDL (or DML steps), and release it from table_obj"""
+        if sql_type == "DDL":
+            stmts = [table_obj.DDL] + [stmt + ";" for stmt in table_obj.index_stmts()]
+            if self.sequences and table_obj.sequence_stmt() is not None:
+                stmts.insert(0, table_obj.sequence_stmt() + ";")
+        else:
+            from dvh.chunk import script_stmts
+            stmts = script_stmts(table_obj.DMLs, getattr(table_obj, 'commit_points', None))
+        self.write_stmts(table_obj.name, stmts, sql_type)
+        if release:
+            delattr(table_obj, sql_type if sql_type == "DDL" else "DMLs")
+
+    def write_stmts(self, name, stmts, sql_type="DML"):
+        """Write stmts generated for name (table, or load unit such as a shared src)"""
+        text = "\n\n".join(stmts) + "\n\n"
+        if self.per_table:
+            with self._open(os.path.join(self.path, sql_type, name + ".sql")) as f:
+                f.write(text)
+        else:
+            self._script_file().write(text)
+        self.nb_tables += 1
+        self.bytes_written += len(text.encode('utf-8'))
+
+    def write_tables(self, tables, sql_type="DDL", release=True):
+        for table_obj in tables:
+            self.write_table(table_obj, sql_type, release)
+
+    def close(self):
+        if self._script is not None and self._script is not sys.stdout:
+            self._script.close()
+        self._script = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
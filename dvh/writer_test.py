@@ -0,0 +1,54 @@
+# coding: utf-8
+import gzip
+import os
+import pytest
+from dvh.model import *
+from dvh.writer import *
+from dvh.build_test import load_model
+
+
+def test_per_table_files(tmp_path):
+    expected = load_model()
+    expected.setup(get_template_SQL(), sql_type="DDL")
+
+    m = load_model()
+    with SQLWriter(str(tmp_path), per_table=True) as writer:
+        m.generate(get_template_SQL(), writer, sql_type="DDL")
+    assert writer.nb_tables == 5
+    for t in expected.tables_in_create_order:
+        with open(os.path.join(str(tmp_path), "DDL", t.name + ".sql")) as f:
+            # sequence keys are created with their table
+            seq = t.sequence_stmt() + ";\n\n" if t.sequence_stmt() else ""
+            assert f.read() == seq + t.DDL + "\n\n"
+        # text is released once written
+        assert getattr(m.tables[t.name], 'DDL', None) is None
+
+
+def test_script_gzip(tmp_path):
+    expected = load_model()
+    expected.setup(get_template_SQL(), sql_type="DDL")
+
+    path = os.path.join(str(tmp_path), "deploy.sql")
+    m = load_model()
+    with SQLWriter(path, compress=True, sequences=False) as writer:
+        m.generate(get_template_SQL(), writer, sql_type="DDL")
+    with gzip.open(path + ".gz", "rt") as f:
+        content = f.read()
+    assert content == "".join(t.DDL + "\n\n" for t in expected.tables_in_create_order)
+    assert writer.bytes_written == len(content.encode('utf-8'))
+
+
+def test_write_without_release(tmp_path):
+    m = load_model()
+    m.setup(get_template_SQL(), sql_type="DDL")
+    writer = SQLWriter(os.path.join(str(tmp_path), "deploy.sql"))
+    writer.write_tables(m.tables_in_create_order, release=False)
+    writer.close()
+    assert m.tables['h1'].DDL.startswith("CREATE TABLE h1_h")
+    with open(os.path.join(str(tmp_path), "deploy.sql")) as f:
+        stmts = f.read().split("\n\n")
+    assert stmts[:2] == ["CREATE SEQUENCE h1_seq;", m.tables['h1'].DDL]
+    assert "CREATE SEQUENCE l12_seq;" in stmts
+
+    with pytest.raises(ValueError):
+        SQLWriter(per_table=True)
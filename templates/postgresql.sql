@@ -0,0 +1,109 @@
+/* PostgreSQL templates, same sections and keywords as Template_SQL.sql.
+ * Column formats of the yaml model must be PostgreSQL types (ex. numeric(9), varchar(30)), and for hash
+ * keys set PostgreSQL functions in yaml defaults (ex. hash_fct: "decode(md5({}), 'hex')", hash_key format bytea).
+ * Sats need an lfc (current version has lfc.exp = '4000-01-01').
+ */
+
+--DDL_Hub:
+CREATE TABLE <name>_h (
+<sur_key.name> <sur_key.format>,
+<nat_key.name> <nat_key.format> NOT NULL,
+<extras.name> <extras.format>,
+load_dts timestamp NOT NULL,
+last_seen_date timestamp,
+process_id integer,
+rec_src varchar(200),
+UNIQUE (<unique_key>),
+CONSTRAINT <name>_pk PRIMARY KEY (<primary_key.name>)
+);
+
+--DDL_Link:
+CREATE TABLE <name>_l (
+<sur_key.name> <sur_key.format>,
+<for_keys.name> <for_keys.format> NOT NULL,
+<extras.name> <extras.format>,
+load_dts timestamp NOT NULL,
+last_seen_date timestamp,
+process_id integer,
+rec_src varchar(200),
+UNIQUE (<unique_key>),
+CONSTRAINT <name>_<hubs.name>_fk FOREIGN KEY (<for_keys.name>) REFERENCES <hubs.name>_h,
+CONSTRAINT <name>_pk PRIMARY KEY (<sur_key.name>)
+);
+
+--DDL_Sat:
+CREATE TABLE <name>_s (
+<for_key.name> <for_key.format>,
+<lfc.name> <lfc.format>,
+<lfc.exp> <lfc.format> NOT NULL DEFAULT '4000-01-01',
+<atts.name> <atts.format>,
+<hashdiff.name> <hashdiff.format>,
+load_dts timestamp NOT NULL,
+process_id integer,
+update_process_id integer,
+rec_src varchar(200),
+CONSTRAINT <name>_pk PRIMARY KEY (<primary_key>),
+CONSTRAINT <name>_<hub.name>_fk FOREIGN KEY (<for_key.name>) REFERENCES <hub.name>_h
+);
+
+
+--DML_Hub(1):
+insert into <name>_h as t (<sur_key.name>, <nat_key.name>, load_dts, last_seen_date, process_id, rec_src)
+select nextval('<sur_key.seq>'), s.*, now(), now(), -111111, '<src>'
+from (select distinct <nat_key.src> from <src>) s
+on conflict (<nat_key.name>) do update set last_seen_date = now()
+;
+
+--DML_Hub-hashkey(1):
+insert into <name>_h as t (<sur_key.name>, <nat_key.name>, load_dts, last_seen_date, process_id, rec_src)
+select distinct <keys_select>, now(), now(), -111111, '<src>'
+from <src> s
+on conflict (<sur_key.name>) do update set last_seen_date = now()
+;
+
+--DML_Link(1):
+insert into <name>_l as t (<sur_key.name>, <for_keys.name>, load_dts, last_seen_date, process_id, rec_src)
+select nextval('<sur_key.seq>'), s.*, now(), now(), -111111, '<src>'
+from (select distinct <hubs_keys> from <src> s <hubs_join>) s
+on conflict (<for_keys.name>) do update set last_seen_date = now()
+;
+
+--DML_Link-hashkey(1):
+insert into <name>_l as t (<sur_key.name>, <for_keys.name>, load_dts, last_seen_date, process_id, rec_src)
+select distinct <keys_select>, now(), now(), -111111, '<src>'
+from <src> s
+on conflict (<sur_key.name>) do update set last_seen_date = now()
+;
+
+-- current version expired when any att changed, then new version inserted for keys without current version
+--DML_Sat(1):
+update <name>_s as t set <lfc.exp> = s.<lfc.src>, update_process_id = -111111
+from (select <key_exp> as <for_key.name>, s.* from <src> s <hub_join>) s
+where t.<for_key.name> = s.<for_key.name> and t.<lfc.exp> = '4000-01-01'
+  and (t.<atts.name>) is distinct from (s.<atts.src>)
+;
+
+--DML_Sat(2):
+insert into <name>_s (<for_key.name>, <lfc.name>, <lfc.exp>, <atts.name>, load_dts, process_id, rec_src)
+select distinct <key_exp>, s.<lfc.src>, '4000-01-01', s.<atts.src>, now(), -111111, '<src>'
+from <src> s
+<hub_join>
+left join <name>_s t on (<keys_join> and t.<lfc.exp> = '4000-01-01')
+where <key_null>
+;
+
+--DML_Sat-hashdiff(1):
+update <name>_s as t set <lfc.exp> = s.<lfc.src>, update_process_id = -111111
+from (select <key_exp> as <for_key.name>, <hashdiff.exp> as <hashdiff.name>, s.<lfc.src> from <src> s <hub_join>) s
+where t.<for_key.name> = s.<for_key.name> and t.<lfc.exp> = '4000-01-01'
+  and t.<hashdiff.name> <> s.<hashdiff.name>
+;
+
+--DML_Sat-hashdiff(2):
+insert into <name>_s (<for_key.name>, <lfc.name>, <atts.name>, <hashdiff.name>, load_dts, process_id, rec_src)
+select distinct <key_exp>, s.<lfc.src>, s.<atts.src>, <hashdiff.exp>, now(), -111111, '<src>'
+from <src> s
+<hub_join>
+left join <name>_s t on (<keys_join> and t.<lfc.exp> = '4000-01-01')
+where <key_null>
+;
@@ -0,0 +1,86 @@
+/* SQLite templates (local testing and benchmarks), same sections and keywords as Template_SQL.sql.
+ * Keys are sequence-like (max + row_number), hash key and hashdiff variants are not available.
+ * Hubs need a sur_key, and Sats an lfc (current version has lfc.exp = '4000-01-01').
+ */
+
+--DDL_Hub:
+CREATE TABLE <name>_h (
+<sur_key.name> <sur_key.format>,
+<nat_key.name> <nat_key.format> NOT NULL,
+<extras.name> <extras.format>,
+load_dts DATE NOT NULL,
+last_seen_date DATE,
+process_id INTEGER,
+rec_src VARCHAR(200),
+UNIQUE (<unique_key>),
+CONSTRAINT <name>_pk PRIMARY KEY (<primary_key.name>)
+);
+
+--DDL_Link:
+CREATE TABLE <name>_l (
+<sur_key.name> <sur_key.format>,
+<for_keys.name> <for_keys.format> NOT NULL,
+<extras.name> <extras.format>,
+load_dts DATE NOT NULL,
+last_seen_date DATE,
+process_id INTEGER,
+rec_src VARCHAR(200),
+UNIQUE (<unique_key>),
+CONSTRAINT <name>_<hubs.name>_fk FOREIGN KEY (<for_keys.name>) REFERENCES <hubs.name>_h,
+CONSTRAINT <name>_pk PRIMARY KEY (<sur_key.name>)
+);
+
+--DDL_Sat:
+CREATE TABLE <name>_s (
+<for_key.name> <for_key.format>,
+<lfc.name> <lfc.format>,
+<lfc.exp> <lfc.format> NOT NULL DEFAULT '4000-01-01',
+<atts.name> <atts.format>,
+load_dts DATE NOT NULL,
+process_id INTEGER,
+update_process_id INTEGER,
+rec_src VARCHAR(200),
+CONSTRAINT <name>_pk PRIMARY KEY (<primary_key>),
+CONSTRAINT <name>_<hub.name>_fk FOREIGN KEY (<for_key.name>) REFERENCES <hub.name>_h
+);
+
+
+--DML_Hub(1):
+update <name>_h as t set last_seen_date = date('now')
+where exists (select 1 from <src> s where <keys_join>)
+;
+
+--DML_Hub(2):
+insert into <name>_h (<sur_key.name>, <nat_key.name>, load_dts, last_seen_date, process_id, rec_src)
+select (select coalesce(max(<sur_key.name>), 0) from <name>_h) + row_number() over (), s.*, date('now'), date('now'), -111111, '<src>'
+from (select distinct <nat_key.src> from <src>) s
+where not exists (select 1 from <name>_h t where <keys_join>)
+;
+
+--DML_Link(1):
+update <name>_l as t set last_seen_date = date('now')
+where exists (select 1 from (select <hubs_keys> from <src> s <hubs_join>) s where <keys_join>)
+;
+
+--DML_Link(2):
+insert into <name>_l (<sur_key.name>, <for_keys.name>, load_dts, last_seen_date, process_id, rec_src)
+select (select coalesce(max(<sur_key.name>), 0) from <name>_l) + row_number() over (), s.*, date('now'), date('now'), -111111, '<src>'
+from (select distinct <hubs_keys> from <src> s <hubs_join>) s
+where not exists (select 1 from <name>_l t where <keys_join>)
+;
+
+-- current version expired when any att changed, then new version inserted for keys without current version
+--DML_Sat(1):
+update <name>_s as t set <lfc.exp> = (select max(s.<lfc.src>) from <src> s <hub_join> where <keys_join>), update_process_id = -111111
+where t.<lfc.exp> = '4000-01-01'
+  and exists (select 1 from <src> s <hub_join> where <keys_join> and (t.<atts.name>) is not (s.<atts.src>))
+;
+
+--DML_Sat(2):
+insert into <name>_s (<for_key.name>, <lfc.name>, <lfc.exp>, <atts.name>, load_dts, process_id, rec_src)
+select distinct <key_exp>, s.<lfc.src>, '4000-01-01', s.<atts.src>, date('now'), -111111, '<src>'
+from <src> s
+<hub_join>
+left join <name>_s t on (<keys_join> and t.<lfc.exp> = '4000-01-01')
+where <key_null>
+;